@@ -0,0 +1,18 @@
+#!/bin/bash
+
+# the beat scheduler sends the periodic tasks of conf/celery.yaml, exactly one of it may run
+CELERY_OPTS="-A primming beat --schedule /tmp/celerybeat-schedule"
+
+# activate virutalenv
+source bin/activate
+
+if [ ${PRIMMING_ENV} == "dev" ]; then
+    CELERY_OPTS="${CELERY_OPTS} --loglevel=DEBUG"
+    # update requirements without needing to rebuild the image in dev mode
+    pip install -r conf/requirements.txt
+elif [ ${PRIMMING_ENV} == "prod" ]; then
+    CELERY_OPTS="${CELERY_OPTS} --loglevel=INFO"
+fi
+
+echo "Running 'celery ${CELERY_OPTS}'"
+su primming -c "celery ${CELERY_OPTS}"
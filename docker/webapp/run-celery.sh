@@ -18,6 +18,11 @@ sh -c './wait-for.sh database:3306'
 
 python src/manage.py migrate --noinput
 python src/manage.py collectstatic --noinput
+# the worker publishes the page lists and scrapers whenever they change, start with the current ones
+chown primming:primming ${PRIMMING_PUBLISH_ROOT}
+su primming -c "python src/manage.py publish_static"
+# the daily snapshots of the sample export are written by the worker
+chown primming:primming ${PRIMMING_EXPORT_SNAPSHOT_ROOT}
 echo "Running 'celery ${CELERY_OPTS}'"
 su primming -c "celery ${CELERY_OPTS}"
 
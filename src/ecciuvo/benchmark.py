@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Benchmark the price parsing over a corpus of scraped price strings, and the time it takes to
+import it in a fresh interpreter (every web and celery process pays for it).
+
+The corpus (``data/price_corpus.json``) holds the expected outcome of every entry as well, so it
+is the correctness oracle for optimisations of :mod:`ecciuvo.price`: the benchmark refuses to
+time a parser that doesn't reproduce it. The oracle records the current behaviour, quirks
+included, so any change to it has to be deliberate.
+
+.. code-block:: shell
+
+    # store the results of the unchanged code as the baseline
+    PYTHONPATH=src python -m ecciuvo.benchmark --save
+    # compare the changed code against it, fails if the throughput regressed
+    PYTHONPATH=src python -m ecciuvo.benchmark
+
+Throughput depends on the machine, so the baseline is not part of the repository and has to be
+taken on the machine the comparison runs on. To dampen the noise of other load on the machine the
+results are compared relative to a fixed pure python calibration loop.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from ecciuvo import price
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CORPUS_PATH = os.path.join(DATA_DIR, "price_corpus.json")
+BASELINE_PATH = os.path.join(DATA_DIR, "benchmark_baseline.json")
+
+# fail if the relative throughput dropped by more than this share
+DEFAULT_THRESHOLD = 0.2
+
+
+def outcome(func, *args):
+    """the result of the call, or the name of the exception it raised"""
+    try:
+        result = func(*args)
+    except Exception as e:
+        return {"error": type(e).__name__}
+    return list(result) if isinstance(result, tuple) else result
+
+
+def outcomes(scraped_price, scraped_currency):
+    """the expected outcomes of a corpus entry"""
+    return {
+        "amount": outcome(price.parse_amount_from, scraped_price),
+        "code": outcome(price.parse_currency, scraped_currency) if scraped_currency else None,
+        "clean": outcome(price.clean_price, scraped_price, scraped_currency),
+    }
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify(corpus):
+    """
+    :returns: the entries of the corpus whose outcomes differ from the expected ones
+    """
+    failures = []
+    for entry in corpus:
+        expected = {key: entry[key] for key in ("amount", "code", "clean")}
+        actual = outcomes(entry["price"], entry["currency"])
+        if actual != expected:
+            failures.append((entry, actual))
+    return failures
+
+
+def _calibrate(loops=100000):
+    """a fixed pure python workload, the unit of the relative throughput"""
+    start = time.perf_counter()
+    total = 0
+    for i in range(loops):
+        total += i % 7
+    return loops / (time.perf_counter() - start)
+
+
+def _parse_currency(corpus):
+    for entry in corpus:
+        if entry["currency"]:
+            price.parse_currency(entry["currency"])
+
+
+def _parse_amount_from(corpus):
+    for entry in corpus:
+        try:
+            price.parse_amount_from(entry["price"])
+        except Exception:
+            pass
+
+
+def _clean_price(corpus):
+    for entry in corpus:
+        try:
+            price.clean_price(entry["price"], entry["currency"])
+        except Exception:
+            pass
+
+
+BENCHMARKS = {
+    "parse_currency": _parse_currency,
+    "parse_amount_from": _parse_amount_from,
+    "clean_price": _clean_price,
+}
+
+# the module whose import time is measured
+STARTUP_MODULE = "ecciuvo.price"
+
+_STARTUP_SCRIPT = """
+import json, sys, time, tracemalloc
+if sys.argv[2] == "trace":
+    tracemalloc.start()
+start = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, *tracemalloc.get_traced_memory()]))
+"""
+
+
+def _time(func, corpus, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        func(corpus)
+    return time.perf_counter() - start
+
+
+def measure(func, corpus, repeat=9, min_time=0.2):
+    """time func over the corpus and trace its allocations
+
+    Every round is followed by a calibration run, the best of both is taken to leave out the
+    rounds slowed down by other load on the machine.
+
+    :returns: a dict with the best ops/sec (one op is one corpus entry), the best throughput
+        relative to the calibration and the peak memory and allocated bytes of a single pass
+    """
+    func(corpus)
+
+    loops = 1
+    while _time(func, corpus, loops) < min_time:
+        loops *= 2
+
+    best = calibration = 0
+    for _ in range(repeat):
+        best = max(best, loops * len(corpus) / _time(func, corpus, loops))
+        calibration = max(calibration, _calibrate())
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        func(corpus)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    allocated = sum(
+        stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0
+    )
+
+    return {
+        "ops_per_sec": best,
+        "relative": best / calibration,
+        "peak_bytes": peak,
+        "allocated_bytes": allocated,
+    }
+
+
+def _import(module, trace=False):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run(
+        [sys.executable, "-c", _STARTUP_SCRIPT, module, "trace" if trace else ""],
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    return json.loads(output)
+
+
+def measure_import(module=STARTUP_MODULE, repeat=9):
+    """time the import of the module in fresh interpreters and trace its allocations
+
+    :returns: a dict like :py:func:`measure`, one op is one import
+    """
+    best = calibration = 0
+    for _ in range(repeat):
+        best = max(best, 1 / _import(module)[0])
+        calibration = max(calibration, _calibrate())
+    _, allocated, peak = _import(module, trace=True)
+
+    return {
+        "ops_per_sec": best,
+        "relative": best / calibration,
+        "peak_bytes": peak,
+        "allocated_bytes": allocated,
+    }
+
+
+def run(corpus):
+    """run all benchmarks
+
+    :returns: the results by benchmark name
+    """
+    results = {"import %s" % STARTUP_MODULE: measure_import()}
+    results.update((name, measure(func, corpus)) for name, func in BENCHMARKS.items())
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    :returns: the names of the benchmarks whose relative throughput regressed by more than
+        threshold compared to the baseline
+    """
+    return [
+        name
+        for name, result in results.items()
+        if name in baseline and result["relative"] < baseline[name]["relative"] * (1 - threshold)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed relative throughput regression (default: %(default)s)",
+    )
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    failures = verify(corpus)
+    for entry, actual in failures:
+        print("MISMATCH %r: expected %r, got %r" % (entry["price"], entry, actual))
+    if failures:
+        return 1
+
+    results = run(corpus)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif not args.save:
+        print("No baseline at %s, run with --save first" % args.baseline)
+
+    print("%-22s %14s %10s %12s %12s" % ("", "ops/sec", "vs base", "peak", "allocated"))
+    for name, result in results.items():
+        change = ""
+        if name in baseline:
+            change = "%+.1f%%" % ((result["relative"] / baseline[name]["relative"] - 1) * 100)
+        print(
+            "%-22s %14.0f %10s %10d B %10d B"
+            % (
+                name,
+                result["ops_per_sec"],
+                change,
+                result["peak_bytes"],
+                result["allocated_bytes"],
+            )
+        )
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name in regressions:
+        print(
+            "REGRESSION %s: more than %d%% slower than the baseline" % (name, args.threshold * 100)
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
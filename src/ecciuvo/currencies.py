@@ -23,7 +23,8 @@ class Currency(object):
     __slots__ = (
         "code",
         "label",
-        "match",
+        "pattern",
+        "_match",
         "symbol",
         "decimal",
         "grouping",
@@ -31,7 +32,7 @@ class Currency(object):
         "csp",
         "additional_symbols",
         "translator",
-        "html_format",
+        "_html_format",
         "separator",
     )
 
@@ -71,7 +72,9 @@ class Currency(object):
 
         self.code = code
         self.label = label or code
-        self.match = re.compile(match, re.I | re.M | re.U)
+        # the regexes are compiled on first use, most processes only ever need a few of them
+        self.pattern = match
+        self._match = None
         self.symbol = symbol
         self.decimal = decimal
         self.grouping = grouping
@@ -79,9 +82,23 @@ class Currency(object):
         self.csp = csp
         self.additional_symbols = additional_symbols
         self.translator = {ord("."): self.decimal, ord(","): self.grouping}
-        self.html_format = re.compile(r"(\%s)(\d{%d})" % (self.decimal, self.places))
+        self._html_format = None
         self.separator = separator
 
+    @property
+    def match(self):
+        """the compiled regex matching the currency in a string"""
+        if self._match is None:
+            self._match = re.compile(self.pattern, re.I | re.M | re.U)
+        return self._match
+
+    @property
+    def html_format(self):
+        """the compiled regex matching the fractional digits of a formatted value"""
+        if self._html_format is None:
+            self._html_format = re.compile(r"(\%s)(\d{%d})" % (self.decimal, self.places))
+        return self._html_format
+
     def format(self, value, places=None, html=False):
         if places is None:
             places = self.places
@@ -429,3 +446,32 @@ SUPPORTED_CURRENCIES = set([c.code for c in CURRENCIES])
 # A dictionary of currency codes plus some aliases:
 CURRENCY_INDEX = {c.code: c for c in CURRENCIES}
 CURRENCY_INDEX["РУБ"] = CURRENCY_INDEX["RUB"]
+
+
+def _symbol_index():
+    index = {}
+    for currency in CURRENCIES:
+        for symbol in [currency.symbol] + currency.additional_symbols:
+            # currencies sharing a symbol: the first (most important) one wins
+            index.setdefault(symbol.lower(), currency)
+    return index
+
+
+# A dictionary of the lowercased currency symbols
+SYMBOL_INDEX = _symbol_index()
+
+
+def get_currency(code):
+    """
+    :param code: the currency code or one of its aliases, case insensitive
+    :returns: the :py:class:`Currency`, None if the code is unknown
+    """
+    return CURRENCY_INDEX.get(code.upper())
+
+
+def get_currency_by_symbol(symbol):
+    """
+    :param symbol: the symbol of the currency (e.g. "€" or "kr."), case insensitive
+    :returns: the :py:class:`Currency`, None if the symbol is unknown
+    """
+    return SYMBOL_INDEX.get(symbol.lower())
@@ -6,9 +6,12 @@
 import logging
 import re
 from decimal import Decimal
+from functools import lru_cache
 from functools import reduce
+from typing import NamedTuple
 
 from .currencies import CURRENCIES
+from .currencies import CURRENCY_INDEX
 
 log = logging.getLogger(__name__)
 
@@ -16,16 +19,109 @@ AMOUNT_FILTER = re.compile(
     r"(\d+\u20ac\d{1,2}|\d[\s\d\xa0\uffa0\ufeff\u202f,.]+|\d)", re.I | re.M | re.U
 )
 
+# the number of distinct scraped prices memoised by clean_prices
+CLEAN_PRICES_CACHE_SIZE = 65536
+
+# the legacy amount parser passes re.U as count/maxsplit, so it replaces and splits at most 32 times
+_MAX_REPLACE = int(re.U)
+# the legacy amount parser rounds to the 28 significant digits of the default decimal context
+_MAX_DIGITS = 25
+
+_UNKNOWN = object()
+
+
+class CurrencyMatcher(object):
+    """Find the currency of a string: the first currency of the registry whose pattern matches
+    anywhere in the string wins, so the order of the registry is the priority.
+
+    Scraped currency strings mostly are just a code or a symbol. The results for those are computed
+    once from the registry, so they resolve with a single dict lookup. Any other string is matched
+    against the currencies in priority order, stopping at the first match.
+
+    A single alternation of all patterns was considered too, but with re.I the re module can't
+    use a literal prefix scan for it and tries every alternative at every position of the string,
+    which is several times slower than the ordered scan.
+    """
+
+    def __init__(self, currencies):
+        self.currencies = currencies
+        self._table = None
+
+    def scan(self, value):
+        """match the value against the currencies in priority order"""
+        for currency in self.currencies:
+            if currency.match.search(value):
+                return currency.code
+        return None
+
+    @property
+    def table(self):
+        """the precomputed results for the codes and symbols of the registry"""
+        if self._table is None:
+            tokens = set()
+            for currency in self.currencies:
+                for token in [currency.code, currency.symbol] + currency.additional_symbols:
+                    tokens.update((token, token.lower(), token.upper()))
+            self._table = {token: self.scan(token) for token in tokens}
+        return self._table
+
+    def match(self, value):
+        """
+        :returns: the code of the currency found in value, None if there is none
+        """
+        code = self.table.get(value, _UNKNOWN)
+        if code is _UNKNOWN:
+            return self.scan(value)
+        return code
+
+
+CURRENCY_MATCHER = CurrencyMatcher(CURRENCIES)
+
 
 def parse_currency(value):
-    for c in [c.code for c in CURRENCIES if c.match.search(value)]:
+    c = CURRENCY_MATCHER.match(value)
+    if c:
         log.debug("Parsed currency <%s> from <%s>", c, value)
         return c
     log.debug("Could not parse currency from string: <%s>", value)
     return None
 
 
-def parse_amount_from(value):
+def _is_decimal_places(separator, frac, currency):
+    """a three digit tail is a thousand group, unless it follows the decimal separator of a
+    currency with three decimal places"""
+    currency = CURRENCY_INDEX.get(currency)
+    return (
+        currency is not None
+        and currency.places == 3
+        and len(frac) == 3
+        and separator == currency.decimal
+    )
+
+
+def _parse_amount_legacy(digits):
+    """the original split & Decimal based heuristic, kept for inputs the integer parser of
+    :func:`parse_amount_from` doesn't reproduce exactly"""
+    digits = re.sub(r"\s|\xa0|\uffa0|\ufeff|\u202f", "", digits, re.U)
+
+    # split price string at "," and "." - last part
+    # are the fractional digits
+    vsplit = re.split(r"[,\.\u20ac]", digits, re.U)
+    if len(vsplit) == 1:
+        vv = vsplit[0]
+    # TODO: prove that this heuristic applies to all currencies
+    elif len(vsplit[-1]) > 2 and len(vsplit[-1]) < 6:
+        vv = "".join(vsplit)
+    else:
+        dec = reduce(lambda x, y: x + y, vsplit[:-1])
+        frac = vsplit[-1]
+        vv = dec + "." + frac
+
+    price = int(Decimal(vv) * 100)
+    return price
+
+
+def parse_amount_from(value, currency=None):
     """Tries to parse an amount (digits w/ optional decimal comma and thousand
     seperator). The amount is represented as an integer (the actual value times
     100).
@@ -35,6 +131,10 @@ def parse_amount_from(value):
     ----------
     value : str
         The string that might contain a price that should be extracted.
+    currency : str, optional
+        The code of the currency of the price, if it is known. Only used to tell
+        the fractional digits of currencies with three decimal places from a
+        thousand separator.
 
     Returns
     -------
@@ -59,23 +159,29 @@ def parse_amount_from(value):
     13220
     """
     digits = AMOUNT_FILTER.search(value).group()
-    digits = re.sub(r"\s|\xa0|\uffa0|\ufeff|\u202f", "", digits, re.U)
+    if digits.isdigit() and len(digits) <= _MAX_DIGITS:
+        return int(digits) * 100
+
+    stripped = "".join(digits.split()).replace("\uffa0", "").replace("\ufeff", "")
+    separators = stripped.count(",") + stripped.count(".") + stripped.count("\u20ac")
+    if (
+        len(digits) - len(stripped) > _MAX_REPLACE
+        or separators > _MAX_REPLACE
+        or len(stripped) > _MAX_DIGITS
+    ):
+        return _parse_amount_legacy(digits)
+
+    # split price string at "," and "." - last part are the fractional digits
+    last = max(stripped.rfind(","), stripped.rfind("."), stripped.rfind("\u20ac"))
+    if last < 0:
+        return int(stripped) * 100
+    whole = stripped[:last].replace(",", "").replace(".", "").replace("\u20ac", "")
+    frac = stripped[last + 1 :]
 
-    # split price string at "," and "." - last part
-    # are the fractional digits
-    vsplit = re.split(r"[,\.\u20ac]", digits, re.U)
-    if len(vsplit) == 1:
-        vv = vsplit[0]
     # TODO: prove that this heuristic applies to all currencies
-    elif len(vsplit[-1]) > 2 and len(vsplit[-1]) < 6:
-        vv = "".join(vsplit)
-    else:
-        dec = reduce(lambda x, y: x + y, vsplit[:-1])
-        frac = vsplit[-1]
-        vv = dec + "." + frac
-
-    price = int(Decimal(vv) * 100)
-    return price
+    if 2 < len(frac) < 6 and not _is_decimal_places(stripped[last], frac, currency):
+        return int(whole + frac) * 100
+    return int(whole) * 100 + int(frac[:2].ljust(2, "0"))
 
 
 def clean_price(scraped_price, scraped_currency=None, default_currency="EUR"):
@@ -90,8 +196,58 @@ def clean_price(scraped_price, scraped_currency=None, default_currency="EUR"):
     else:
         currency = default_currency
 
-    price = parse_amount_from(scraped_price)
+    price = parse_amount_from(scraped_price, currency)
     if not price or price > 2147483647 or price < 0:
         raise ValueError("Price out of range: %s" % scraped_price)
 
     return price, currency
+
+
+class _Failure(NamedTuple):
+    """the type and the arguments of the exception raised by :func:`clean_price`
+
+    The memo keeps these rather than the exception, which would hold on to its traceback and be
+    shared by every caller.
+    """
+
+    exc_type: type
+    args: tuple
+
+    def exception(self) -> Exception:
+        """a new exception for the caller"""
+        return self.exc_type(*self.args)
+
+
+def _clean_price_or_error(scraped_price, scraped_currency, default_currency):
+    """like :func:`clean_price`, but returns a :class:`_Failure` instead of raising"""
+    try:
+        return clean_price(scraped_price, scraped_currency, default_currency)
+    except (ValueError, TypeError, AttributeError, ArithmeticError) as e:
+        return _Failure(type(e), e.args)
+
+
+_clean_price_memo = lru_cache(maxsize=CLEAN_PRICES_CACHE_SIZE, typed=True)(_clean_price_or_error)
+
+
+def clean_prices(scraped, default_currency="EUR"):
+    """clean many prices as scraped from the websites in one call
+
+    The same price strings are scraped over and over again, so the results are memoised in a
+    bounded LRU and every distinct (price, currency) pair is only parsed once.
+
+    :param scraped: iterable of (scraped_price, scraped_currency) tuples
+    :param default_currency: the currency of the prices scraped without one
+    :returns: a list with the (price in cents, currency) tuple for each item, or the exception
+        which prevented cleaning it. Nothing is raised for invalid items.
+    """
+    results = []
+    for scraped_price, scraped_currency in scraped:
+        try:
+            result = _clean_price_memo(scraped_price, scraped_currency, default_currency)
+        except TypeError:
+            # unhashable garbage, can't be memoised
+            result = _clean_price_or_error(scraped_price, scraped_currency, default_currency)
+        if isinstance(result, _Failure):
+            result = result.exception()
+        results.append(result)
+    return results
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from unittest import TestCase
+
+from ecciuvo.price import _clean_price_memo
+from ecciuvo.price import clean_price
+from ecciuvo.price import clean_prices
+
+
+class CleanPricesTestCase(TestCase):
+    """tests for :func:`ecciuvo.price.clean_prices`"""
+
+    def setUp(self):
+        _clean_price_memo.cache_clear()
+
+    def test_same_as_clean_price(self):
+        scraped = [("12,99 €", "€"), ("$1,000", "USD"), ("132,20", None), ("€ 2.74", "Ft")]
+        self.assertEqual(
+            clean_prices(scraped), [clean_price(price, curr) for price, curr in scraped]
+        )
+
+    def test_default_currency(self):
+        self.assertEqual(clean_prices([("1,00", None)], default_currency="HUF"), [(100, "HUF")])
+
+    def test_errors(self):
+        results = clean_prices(
+            [("no price", "EUR"), ("0,00", "EUR"), (None, None), (["1,00"], None), ("1,00", "€")]
+        )
+
+        self.assertIsInstance(results[0], AttributeError)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertIsInstance(results[2], TypeError)
+        self.assertIsInstance(results[3], TypeError)
+        self.assertEqual(results[4], (100, "EUR"))
+
+    def test_memoised(self):
+        clean_prices([("12,99", "EUR")] * 10 + [("12,99", "USD")])
+        clean_prices([("12,99", "EUR")])
+
+        info = _clean_price_memo.cache_info()
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.hits, 10)
+
+    def test_errors_not_shared(self):
+        first, second = clean_prices([("0,00", "EUR")] * 2)
+        self.assertIsNot(first, second)
+        self.assertEqual(str(first), str(second))
+        self.assertIsNone(second.__traceback__)
+        self.assertEqual(_clean_price_memo.cache_info().hits, 1)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from unittest import TestCase
+
+from ecciuvo.currencies import Currency
+from ecciuvo.currencies import get_currency
+from ecciuvo.currencies import get_currency_by_symbol
+
+
+class CurrencyTestCase(TestCase):
+    """tests for :py:class:`ecciuvo.currencies.Currency`"""
+
+    def test_lazy_regexes(self):
+        currency = Currency("XTS", "¤", decimal=",", match=r"XTS|¤")
+        self.assertIsNone(currency._match)
+        self.assertIsNone(currency._html_format)
+
+        self.assertTrue(currency.match.search("12 xts"))
+        self.assertIs(currency.match, currency.match)
+        self.assertEqual(currency.format(12.5, html=True), "¤ 12,<sup>50</sup>")
+
+    def test_get_currency(self):
+        self.assertEqual(get_currency("EUR").code, "EUR")
+        self.assertEqual(get_currency("huf").code, "HUF")
+        self.assertEqual(get_currency("РУБ").code, "RUB")
+        self.assertIsNone(get_currency("XYZ"))
+
+    def test_get_currency_by_symbol(self):
+        self.assertEqual(get_currency_by_symbol("€").code, "EUR")
+        self.assertEqual(get_currency_by_symbol("&EURO;").code, "EUR")
+        self.assertEqual(get_currency_by_symbol("Kč").code, "CZK")
+        self.assertIsNone(get_currency_by_symbol("XYZ"))
+
+        # a shared symbol resolves to the first currency of the registry
+        self.assertEqual(get_currency_by_symbol("$").code, "USD")
+        self.assertIn("$", get_currency("CUP").additional_symbols)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import itertools
+import random
+from unittest import TestCase
+
+from ecciuvo.currencies import CURRENCIES
+from ecciuvo.price import parse_currency
+
+
+def reference_parse_currency(value):
+    """the original implementation of :func:`ecciuvo.price.parse_currency`"""
+    for c in [c.code for c in CURRENCIES if c.match.search(value)]:
+        return c
+    return None
+
+
+def corpus(size=20000, seed=4711):
+    """currency strings as they are scraped plus random noise built from the same characters"""
+    tokens = set()
+    for currency in CURRENCIES:
+        for token in [currency.code, currency.symbol] + currency.additional_symbols:
+            tokens.update((token, token.lower(), token.upper(), token.title()))
+    tokens = sorted(tokens)
+
+    yield from tokens
+    for token in tokens:
+        yield "12,99 %s" % token
+        yield "%s 1.299,00" % token
+        yield "%s1299" % token
+        yield " %s\n" % token
+    for first, second in itertools.combinations(tokens[:60], 2):
+        yield "%s %s" % (first, second)
+        yield first + second
+
+    rnd = random.Random(seed)
+    alphabet = "".join(sorted(set("".join(tokens)))) + "0123456789 .,\n\t$R"
+    for _ in range(size):
+        yield "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 12)))
+
+
+class ParseCurrencyTestCase(TestCase):
+    """tests for :func:`ecciuvo.price.parse_currency`"""
+
+    def test_examples(self):
+        self.assertEqual(parse_currency("EUR"), "EUR")
+        self.assertEqual(parse_currency("12,99 €"), "EUR")
+        self.assertEqual(parse_currency("$ 5 EUR"), "EUR")
+        self.assertEqual(parse_currency("$5"), "USD")
+        self.assertEqual(parse_currency("R$ 5"), "BRL")
+        self.assertEqual(parse_currency("kr"), "SEK")
+        self.assertIsNone(parse_currency("12.99"))
+        self.assertIsNone(parse_currency(""))
+
+    def test_differential(self):
+        """the matcher must give the same result as the original implementation"""
+        for value in corpus():
+            self.assertEqual(parse_currency(value), reference_parse_currency(value), repr(value))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import random
+from unittest import TestCase
+
+from ecciuvo.price import AMOUNT_FILTER
+from ecciuvo.price import _parse_amount_legacy
+from ecciuvo.price import clean_price
+from ecciuvo.price import parse_amount_from
+
+
+def reference_parse_amount_from(value):
+    """the original implementation of :func:`ecciuvo.price.parse_amount_from`"""
+    return _parse_amount_legacy(AMOUNT_FILTER.search(value).group())
+
+
+def outcome(func, *args):
+    """the result of the call or the type of the exception it raised"""
+    try:
+        return func(*args)
+    except Exception as e:
+        return type(e)
+
+
+def corpus(size=50000, seed=4711):
+    """scraped price strings plus random noise built from the characters the parser cares about"""
+    yield from [
+        "$10 off",
+        "$1,00",
+        "$1,000",
+        "129,90000001",
+        "574€83",
+        "€ 2.74",
+        "132,20 €",
+        "1.299,-",
+        "1 299,00 Kč",
+        "1\xa0299,00",
+        "1 299.5",
+        "﻿12,5",
+        "5,",
+        "5,,3",
+        "1.2.3.4.5.6",
+        "1" * 30 + ",99",
+        "1" + ",1" * 40,
+        "1" + " " * 40 + "2,5",
+        "١٢٣,٤٥",
+    ]
+
+    rnd = random.Random(seed)
+    alphabet = "0123456789" * 3 + ",.€ \xa0 ﻿ﾠ\t-$EUR"
+    for _ in range(size):
+        yield "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 16)))
+
+
+class ParseAmountFromTestCase(TestCase):
+    """tests for :func:`ecciuvo.price.parse_amount_from`"""
+
+    def test_differential(self):
+        """without a currency the parser must give the same result as the original implementation"""
+        for value in corpus():
+            self.assertEqual(
+                outcome(parse_amount_from, value),
+                outcome(reference_parse_amount_from, value),
+                repr(value),
+            )
+
+    def test_currency(self):
+        """the currency only matters for three digit tails of currencies with three places"""
+        for value in corpus(size=5000):
+            for currency in ("EUR", "USD", "HUF", "XYZ"):
+                self.assertEqual(
+                    outcome(parse_amount_from, value, currency),
+                    outcome(parse_amount_from, value),
+                    repr(value),
+                )
+
+        self.assertEqual(parse_amount_from("12,500", "TND"), 1250)
+        self.assertEqual(parse_amount_from("1.012,500 DT", "TND"), 101250)
+        self.assertEqual(parse_amount_from("1.012", "TND"), 101200)
+        self.assertEqual(parse_amount_from("12,500", "EUR"), 1250000)
+
+    def test_clean_price(self):
+        self.assertEqual(clean_price("12,500", default_currency="TND"), (1250, "TND"))
+        self.assertEqual(clean_price("12,500", "€"), (1250000, "EUR"))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from unittest import TestCase
+
+from ecciuvo.benchmark import compare
+from ecciuvo.benchmark import load_corpus
+from ecciuvo.benchmark import verify
+
+
+class PriceCorpusTestCase(TestCase):
+    """the benchmark corpus is the correctness oracle of :mod:`ecciuvo.price`"""
+
+    def test_corpus(self):
+        failures = verify(load_corpus())
+        self.assertEqual(failures, [], "\n".join(repr(failure) for failure in failures))
+
+    def test_compare(self):
+        baseline = {"a": {"relative": 1.0}, "b": {"relative": 1.0}}
+        results = {"a": {"relative": 0.85}, "b": {"relative": 0.75}, "c": {"relative": 0.1}}
+
+        self.assertEqual(compare(results, baseline, threshold=0.2), ["b"])
+        self.assertEqual(compare(results, baseline, threshold=0.1), ["a", "b"])
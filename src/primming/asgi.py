@@ -14,8 +14,16 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from django.conf import settings
+
+from primming.utils.asgi import Lifespan
+from primming.utils.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "primming.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# after the setup of django, the warm-up needs the models
+from primming.pricewatcher.warmup import warm_up  # noqa: E402
+
+application = Lifespan(django_application, [warm_up] if settings.WARM_UP_ON_STARTUP else [])
@@ -74,7 +74,12 @@ def get_schedule(*paths: List[str]) -> dict:
     return schedules
 
 
-app.conf.update(beat_schedule=get_schedule())
+app.conf.update(
+    beat_schedule=get_schedule(
+        os.path.join("conf", "celery.yaml"),
+        os.path.join("conf", os.environ.get("PRIMMING_ENV", "dev"), "celery.yaml"),
+    )
+)
 
 
 @signals.setup_logging.connect
@@ -1,9 +1,14 @@
 import csv
+import io
 import json
 import logging
+import math
+import time
 from datetime import date
 from datetime import datetime
 from datetime import timedelta
+from itertools import chain
+from itertools import islice
 from typing import Any
 from typing import Generator
 from typing import Iterable
@@ -13,15 +18,30 @@ from typing import Sequence
 from typing import Tuple
 
 from django.conf import settings
+from django.db.models import Max
 from django.db.models import QuerySet
+from django.urls import reverse
+from django_redis import get_redis_connection
 
+from primming.pricewatcher.ingest import PriceReport
+from primming.pricewatcher.ingest import store_raw_reports
+from primming.pricewatcher.models import Page
 from primming.pricewatcher.models import PageList
+from primming.pricewatcher.models import PageListChange
 from primming.pricewatcher.models import PriceSample
+from primming.pricewatcher.streams import PriceReportStream
 from primming.pricewatcher.tasks import PriceLoggerTask
 from primming.registration.models import Person
 from primming.registration.models import PersonalAttribute
 from primming.utils.api.exceptions import BadRequestException
 from primming.utils.api.exceptions import NotFoundException
+from primming.utils.api.exceptions import ServiceUnavailableException
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 
 class StreamingEchoBuffer:
@@ -36,12 +56,46 @@ class StreamingEchoBuffer:
         return value
 
 
+class StreamingParquetBuffer(io.RawIOBase):
+    """The file the parquet writer writes to, which hands out what was written so far.
+
+    The writer needs the position in the file for the offsets in the footer, so the position
+    doesn't start again when the written data is taken out.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        """the data written since the last call"""
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
 class PageListViewApiMixin:
     """Mixin for the list of observed pages endpoint"""
 
     @staticmethod
-    def serialize_list(name: str = None) -> Mapping:
-        """TODO: document + tests"""
+    def get_list(name: str = None) -> PageList:
+        """the list by name, the default list if name is None
+
+        :raises NotFoundException: if there is no such list
+        """
         if name is None:
             lst = PageList.objects.filter(default=True).first()
         else:
@@ -49,11 +103,120 @@ class PageListViewApiMixin:
 
         if not lst:
             raise NotFoundException
+        return lst
+
+    @classmethod
+    def serialize_list(cls, name: str = None) -> Mapping:
+        """the enabled pages of the list by name, of the default list if name is None
+
+        :raises NotFoundException: if there is no such list
+        """
+        return cls._serialize_pages(cls.get_list(name))
+
+    @staticmethod
+    def _scraper_hash(page: Page) -> str:
+        """the hash of the scraper of the page
+
+        Pages created or changed without :py:meth:`Page.save` (bulk_create, update, loaddata) have
+        no hash yet, it is stored for the scraper url to resolve.
+        """
+        if not page.scraper_hash:
+            page.scraper_hash = Page.hash_scraper(page.scraper)
+            Page.objects.filter(id=page.id, scraper_hash="").update(scraper_hash=page.scraper_hash)
+        return page.scraper_hash
+
+    @classmethod
+    def _serialize_page(cls, page: Page) -> Mapping:
+        """the page with the immutable url of its current scraper"""
+        return {
+            "id": page.id,
+            "url": page.url,
+            "scraper": reverse(
+                "scraper-version", kwargs={"scraper_hash": cls._scraper_hash(page)}
+            ),
+        }
+
+    @classmethod
+    def _serialize_pages(cls, lst: PageList) -> Mapping:
+        pages = lst.pages.filter(enabled=True).only("id", "url", "scraper_hash")
+        return {
+            "version": settings.VERSION,
+            "list": lst.id,
+            "revision": lst.revision,
+            "pages": [cls._serialize_page(p) for p in pages],
+        }
+
+    @classmethod
+    def serialize_changes(cls, name: str = None, since: int = None) -> Mapping:
+        """the changes of the list since the revision the client has
+
+        Pages which were added or changed are sent with their url and scraper (for the client to
+        insert or update them), pages which were removed or disabled with their id only. The full
+        list is sent instead, if the changes since the revision aren't known (anymore) or if they
+        are more than the pages of the list.
+
+        :raises NotFoundException: if there is no such list
+        """
+        lst = cls.get_list(name)
+        revision = lst.revision
+        if since is None or since <= 0 or since < lst.pruned_revision or since > revision:
+            return cls._serialize_pages(lst)
+
+        # the first change of a page since the revision tells whether the client knows it
+        first_change = {}
+        changes = lst.changes.filter(id__gt=since, id__lte=revision).order_by("id")
+        for page_id, action in changes.values_list("page_id", "action"):
+            first_change.setdefault(page_id, action)
+
+        if len(first_change) > lst.pages.filter(enabled=True).count():
+            return cls._serialize_pages(lst)
+
+        pages = lst.pages.filter(enabled=True, id__in=first_change)
+        pages = {p.id: p for p in pages.only("id", "url", "scraper_hash")}
+
+        added, changed, removed = [], [], []
+        for page_id, action in sorted(first_change.items()):
+            page = pages.get(page_id)
+            if page is None:
+                removed.append(page_id)
+            elif action == PageListChange.Action.ADDED:
+                added.append(cls._serialize_page(page))
+            else:
+                changed.append(cls._serialize_page(page))
+
+        return {
+            "version": settings.VERSION,
+            "list": lst.id,
+            "revision": revision,
+            "since": since,
+            "added": added,
+            "changed": changed,
+            "removed": removed,
+        }
+
+
+class ScraperBundleApiMixin:
+    """Mixin for the scraper bundle endpoint"""
+
+    @staticmethod
+    def serialize_bundle(name: str = None) -> Mapping:
+        """the minified scrapers of all enabled pages of the list by page id
+
+        :raises NotFoundException: if there is no such list
+        """
+        lst = PageListViewApiMixin.get_list(name)
+        pages = lst.pages.filter(enabled=True).order_by("id")
+        scrapers = dict(pages.values_list("id", "scraper_minified"))
+
+        # pages stored without Page.save have no minified scraper yet
+        missing = [pk for pk, scraper in scrapers.items() if not scraper]
+        for pk, scraper in pages.filter(id__in=missing).values_list("id", "scraper"):
+            scrapers[pk] = Page.minify_scraper(scraper)
 
         return {
             "version": settings.VERSION,
             "list": lst.id,
-            "pages": [{"id": p.id, "url": p.url} for p in lst.pages.filter(enabled=True)],
+            "scrapers": {str(pk): scraper for pk, scraper in scrapers.items()},
         }
 
 
@@ -127,7 +290,8 @@ class SubmitPriceReportApiMixin:
     def delay_pricelogger(
         self, uuid: str, body: Sequence[Mapping], user_agent: str, remote_ip: str
     ):
-        """hand the info over to the celery task
+        """hand the info over to the celery task, the report stream or store it as raw reports,
+        depending on settings.PRICE_REPORT_INGEST_MODE
 
         :param uuid: the uuid
         :param body: the extracted prices, url <-> price tuples
@@ -135,7 +299,12 @@ class SubmitPriceReportApiMixin:
         :param remote_ip: the ip to determine the location
 
         """
-        PriceLoggerTask().delay(uuid, body, user_agent, remote_ip)
+        if settings.PRICE_REPORT_INGEST_MODE == "stream":
+            PriceReportStream().append(uuid, body, user_agent, remote_ip)
+        elif settings.PRICE_REPORT_INGEST_MODE == "raw":
+            store_raw_reports([PriceReport(uuid, body, user_agent, remote_ip)])
+        else:
+            PriceLoggerTask().delay(uuid, body, user_agent, remote_ip)
 
 
 class UserRegistrationAPIMixin:
@@ -164,10 +333,14 @@ class SimpleRestAPISupport:
     DATE_FORMAT = "%Y-%m-%d"
     MIME_TYPES_JSON = ("application/json",)
     MIME_TYPES_CSV = ("text/csv",)
+    MIME_TYPES_PARQUET = ("application/vnd.apache.parquet",)
 
     model = None
     prefetch_related = []
     date_column = "timestamp"
+    # the types of the columns in the parquet export, the other columns are strings:
+    # "int", "timestamp" (from an isoformat string) and "dictionary" (a dictionary encoded string)
+    parquet_types = {}
 
     def _validate_date_range(self, start_date: str, end_date: str) -> Tuple[datetime, date]:
         """validate the submitted date ranges"""
@@ -187,12 +360,15 @@ class SimpleRestAPISupport:
         return start, end
 
     def _queryset(self, start: date, end: date) -> QuerySet:
-        """generate a queryset for the date range"""
+        """generate a queryset for the date range, the days start at midnight in PYTZ_ZONE"""
+        midnight = datetime.min.time()
+        start = settings.PYTZ_ZONE.localize(datetime.combine(start, midnight))
+        end = settings.PYTZ_ZONE.localize(datetime.combine(end + timedelta(days=1), midnight))
 
         return self.model.objects.filter(
             **{
                 "%s__gte" % self.date_column: start,
-                "%s__lt" % self.date_column: end + timedelta(days=1),
+                "%s__lt" % self.date_column: end,
             }
         ).prefetch_related(*self.prefetch_related)
 
@@ -225,18 +401,94 @@ class SimpleRestAPISupport:
                 yield ","
             yield json.dumps(row)
 
+        if first:
+            # no rows at all
+            yield "["
         yield "]"
 
+    def parquet_schema(self, columns: Sequence[str]) -> "pyarrow.Schema":
+        """the schema of the parquet export, see :py:attr:`parquet_types`"""
+        types = {
+            "int": pyarrow.int64(),
+            "timestamp": pyarrow.timestamp("us", tz="UTC"),
+            "dictionary": pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+        }
+        return pyarrow.schema(
+            [(name, types.get(self.parquet_types.get(name), pyarrow.string())) for name in columns]
+        )
+
+    def parquet_table(
+        self, rows: Sequence[Mapping[str, Any]], schema: "pyarrow.Schema"
+    ) -> "pyarrow.Table":
+        """the rows as a table with the schema, the columns are converted one at a time"""
+        arrays = []
+        for field in schema:
+            values = [row.get(field.name) for row in rows]
+            kind = self.parquet_types.get(field.name)
+            if kind == "timestamp":
+                values = [value and datetime.fromisoformat(value) for value in values]
+            elif kind == "dictionary":
+                arrays.append(pyarrow.array(values, pyarrow.string()).dictionary_encode())
+                continue
+            elif kind is None:
+                # e.g. the attributes of a person with several values
+                values = [
+                    value if value is None or isinstance(value, str) else json.dumps(value)
+                    for value in values
+                ]
+            arrays.append(pyarrow.array(values, field.type))
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def to_parquet(
+        self, rows: Generator[Mapping[str, Any], Any, Any]
+    ) -> Generator[bytes, None, None]:
+        """serialize the given objects into a parquet file, one row group at a time"""
+        rows = iter(rows)
+        columns = self.csv_columns()
+        if columns is None:
+            first_row = next(rows, None)
+            columns = [] if first_row is None else list(first_row.keys())
+            rows = rows if first_row is None else chain([first_row], rows)
+
+        schema = self.parquet_schema(columns)
+        buffer = StreamingParquetBuffer()
+        writer = pyarrow.parquet.ParquetWriter(
+            buffer, schema, compression=settings.EXPORT_PARQUET_COMPRESSION
+        )
+        row_group_size = settings.EXPORT_PARQUET_ROW_GROUP_SIZE
+        while True:
+            row_group = list(islice(rows, row_group_size))
+            if row_group:
+                writer.write_table(self.parquet_table(row_group, schema), len(row_group))
+                yield buffer.take()
+            if len(row_group) < row_group_size:
+                break
+
+        writer.close()
+        yield buffer.take()
+
+    def content_type(self, accept: str = "text/csv") -> str:
+        """the content type of the export as indicated by the client via the ACCEPT header, the
+        parquet export is only available if pyarrow is installed"""
+        if accept in self.MIME_TYPES_CSV:
+            return self.MIME_TYPES_CSV[0]
+        if accept in self.MIME_TYPES_PARQUET and pyarrow is not None:
+            return self.MIME_TYPES_PARQUET[0]
+
+        return self.MIME_TYPES_JSON[0]
+
     def negotiate(self, samples, accept: str = "text/csv") -> Generator[str, None, None]:
         """negotiate the correct content type as indicated by the client via the ACCEPT header.
 
-        right now we only support "text/csv".
+        right now we support "text/csv", "application/json" and "application/vnd.apache.parquet".
         """
+        content_type = self.content_type(accept)
+        if content_type in self.MIME_TYPES_CSV:
+            return content_type, self.to_csv(samples)
+        if content_type in self.MIME_TYPES_PARQUET:
+            return content_type, self.to_parquet(samples)
 
-        if accept in self.MIME_TYPES_CSV:
-            return self.MIME_TYPES_CSV[0], self.to_csv(samples)
-
-        return self.MIME_TYPES_JSON[0], self.to_json(samples)
+        return content_type, self.to_json(samples)
 
 
 class SampleExportApiMixin(SimpleRestAPISupport):
@@ -255,8 +507,40 @@ class SampleExportApiMixin(SimpleRestAPISupport):
         "location__city__country",
     ]
 
+    # the columns of the export by the fields they are read from, see :py:meth:`rows`
+    columns = (
+        ("id", "id"),
+        ("timestamp", "timestamp"),
+        ("url", "page__url"),
+        ("price", "price"),
+        ("currency", "currency"),
+        ("uuid", "uuid"),
+        ("browser", "agent__browser__name"),
+        ("browser_version", "agent__browser__version"),
+        ("device", "agent__device__name"),
+        ("device_brand", "agent__device__brand"),
+        ("device_version", "agent__device__version"),
+        ("os", "agent__os__name"),
+        ("postal_code", "location__postal_code"),
+        ("geonames_city_id", "location__city__geonameid"),
+        ("country", "location__city__country__iso_code"),
+    )
+    parquet_types = {
+        "id": "int",
+        "timestamp": "timestamp",
+        "price": "int",
+        "currency": "dictionary",
+        "browser": "dictionary",
+        "browser_version": "dictionary",
+        "device": "dictionary",
+        "device_brand": "dictionary",
+        "os": "dictionary",
+        "geonames_city_id": "int",
+        "country": "dictionary",
+    }
+
     def serialize(self, sample: PriceSample) -> Mapping[str, str]:
-        """serialize the object"""
+        """serialize the object, the same as a row of :py:meth:`rows`"""
         return {
             "id": sample.id,
             "timestamp": sample.timestamp.isoformat(),
@@ -275,15 +559,141 @@ class SampleExportApiMixin(SimpleRestAPISupport):
             "country": sample.location.city.country.iso_code,
         }
 
+    def csv_columns(self) -> Optional[Sequence[str]]:
+        """the names of the :py:attr:`columns`, also without a first row"""
+        return [name for name, _ in self.columns]
+
+    def _rows(
+        self, qs: QuerySet, since_id: int = 0, limit: int = None
+    ) -> Generator[Tuple, None, None]:
+        """the values of the :py:attr:`columns` of the samples of the queryset after the id, in
+        the order of their ids
+
+        The samples are read with a single joined query per chunk instead of model instances and
+        prefetches. The chunks are selected by id (keyset pagination), so each query only reads
+        its chunk and memory use doesn't grow with the number of samples. The mysql client
+        buffers the whole result of a query, even with ``QuerySet.iterator``.
+        """
+        qs = qs.prefetch_related(None).order_by("id")
+        qs = qs.values_list(*(lookup for _, lookup in self.columns))
+        chunk_size = settings.SAMPLE_EXPORT_CHUNK_SIZE
+
+        while limit is None or limit > 0:
+            size = chunk_size if limit is None else min(chunk_size, limit)
+            chunk = list(qs.filter(id__gt=since_id)[:size])
+            for row in chunk:
+                # the id and the timestamp come first
+                yield (row[0], row[1].isoformat(), *row[2:])
+            if len(chunk) < size:
+                return
+            since_id = chunk[-1][0]
+            if limit is not None:
+                limit -= size
+
+    def rows(self, start: date, end: date) -> Generator[Tuple, None, None]:
+        """the values of the :py:attr:`columns` of the samples in the date range"""
+        return self._rows(self._queryset(start, end))
+
+    def _as_mappings(self, rows: Iterable[Tuple]) -> Generator[Mapping[str, Any], None, None]:
+        names = [name for name, _ in self.columns]
+        for row in rows:
+            yield dict(zip(names, row))
+
     def samples(
         self, start_date: str = None, end_date: str = None
-    ) -> Generator[PriceSample, None, None]:
+    ) -> Generator[Mapping[str, Any], None, None]:
         """stream a list of samples in the given daterange"""
         start, end = self._validate_date_range(start_date, end_date)
-        qs = self._queryset(start, end)
+        return self._as_mappings(self.rows(start, end))
+
+    @staticmethod
+    def _validate_cursor(since_id: Optional[str], limit: Optional[str]) -> Tuple[int, int]:
+        """validate the submitted cursor and page size"""
+        try:
+            since_id = int(since_id or 0)
+            limit = int(limit or settings.SAMPLE_EXPORT_PAGE_SIZE)
+        except ValueError as e:
+            raise BadRequestException(str(e))
+
+        if since_id < 0:
+            raise BadRequestException("since_id must not be negative.")
+        if not 0 < limit <= settings.SAMPLE_EXPORT_MAX_PAGE_SIZE:
+            raise BadRequestException(
+                "limit must be between 1 and %d." % settings.SAMPLE_EXPORT_MAX_PAGE_SIZE
+            )
+        return since_id, limit
+
+    # sorted set of the highest sample ids seen so far by the time they were first seen, see
+    # high_water_mark
+    id_observations_key = "pricewatcher:export:sample-ids"
 
-        for sample in qs:
-            yield self.serialize(sample)
+    def high_water_mark(self) -> int:
+        """the highest id up to which all samples are committed
+
+        Ids are taken when the samples are inserted, but the transactions commit in any order:
+        while the one which took id 100 is still open, the sample with id 101 may be visible
+        already, and a cursor past 101 would skip 100 for good. Hence the highest id is noted
+        along with the time it was first seen, only ids which were seen at least
+        settings.SAMPLE_EXPORT_CURSOR_GRACE seconds ago are exported. The transactions which took
+        them have committed by then. The mark only advances when the export is requested, a
+        client polling every few minutes gets the samples up to its previous poll.
+
+        The observations are kept in a redis sorted set, so concurrent requests add to it
+        atomically instead of overwriting each other's observations.
+
+        :raises ServiceUnavailableException: if no id was seen long enough ago yet, e.g. after a
+            cold start, with the seconds until one will have been
+        """
+        now = time.time()
+        grace = settings.SAMPLE_EXPORT_CURSOR_GRACE
+        current = self.model.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+        key = self.id_observations_key
+
+        redis = get_redis_connection("default")
+        pipe = redis.pipeline()
+        # an id seen again keeps the time it was first seen
+        pipe.zadd(key, {current: now}, nx=True)
+        # the newest observation which is old enough
+        pipe.zrevrangebyscore(key, now - grace, "-inf", start=0, num=1, withscores=True)
+        pipe.zrange(key, 0, 0, withscores=True)
+        _, safe, oldest = pipe.execute()
+
+        if not safe:
+            retry_after = max(math.ceil(oldest[0][1] + grace - now), 1)
+            raise ServiceUnavailableException(
+                "The samples are held back for %d seconds." % grace, retry_after
+            )
+        mark, seen = safe[0]
+        # the observations before it are not needed anymore
+        redis.zremrangebyscore(key, "-inf", "(%r" % seen)
+        return int(mark)
+
+    def samples_since(
+        self, since_id: Optional[str] = None, limit: Optional[str] = None
+    ) -> Tuple[Generator[Mapping[str, Any], None, None], int, bool]:
+        """a page of the samples after the id (the cursor), in the order of their ids
+
+        The cursor is sent in the headers, so the end of the page is looked up before the rows are
+        read: ``LIMIT 1 OFFSET limit - 1`` over the ids of the page. That is not a seek, the
+        database walks the primary key index for the whole page, but it reads the ids only and
+        the rows are read once they are sent. The cursor keeps the start of the next page a seek,
+        a client which saved it never reads older samples again. The page ends at the
+        :py:meth:`high_water_mark` at most, so no sample is committed behind the cursor.
+
+        :returns: the samples, the cursor for the next page (the id of the last sample of the
+            page) and whether there might be more samples after the page
+        """
+        since_id, limit = self._validate_cursor(since_id, limit)
+
+        qs = self.model.objects.filter(id__gt=since_id, id__lte=self.high_water_mark())
+        ids = qs.order_by("id").values_list("id", flat=True)
+        last_id = ids[limit - 1 : limit].first()
+        more = last_id is not None
+        if last_id is None:
+            last_id = qs.aggregate(last_id=Max("id"))["last_id"] or since_id
+
+        samples = self._rows(qs.filter(id__lte=last_id), since_id)
+        return self._as_mappings(samples), last_id, more
 
 
 class PersonsExportApiMixin(SimpleRestAPISupport):
@@ -292,6 +702,7 @@ class PersonsExportApiMixin(SimpleRestAPISupport):
     model = Person
     date_column = "created"
     prefetch_related = ["attributes"]
+    parquet_types = {"created": "timestamp", "updated": "timestamp"}
 
     def csv_columns(self) -> Optional[Sequence[str]]:
         """if the csv columns cannot be determined from the first row"""
@@ -328,10 +739,7 @@ class PersonsExportApiMixin(SimpleRestAPISupport):
 
     def samples(
         self, start_date: str = None, end_date: str = None
-    ) -> Generator[PriceSample, None, None]:
-        """stream a list of samples in the given daterange"""
+    ) -> Generator[Mapping[str, Any], None, None]:
+        """stream a list of persons in the given daterange"""
         start, end = self._validate_date_range(start_date, end_date)
-        qs = self._queryset(start, end)
-
-        for sample in qs:
-            yield self.serialize(sample)
+        return (self.serialize(person) for person in self._queryset(start, end))
@@ -8,3 +8,7 @@ from django.apps import AppConfig
 
 class PricewatcherConfig(AppConfig):
     name = "primming.pricewatcher"
+
+    def ready(self):
+        # connect the cache invalidation
+        from primming.pricewatcher import signals  # noqa: F401
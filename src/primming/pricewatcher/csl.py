@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Check and minify the scrapers (written in the ciuvo scraper language) when a page is saved. The
+extension gets the minified scraper, the original one is kept for editing in the admin.
+
+The scanner only knows the lexical structure of the language: one statement per line, ``//``
+comments, quoted strings and ``/regex/`` literals. Minifying drops the comments, blank lines and
+whitespace that can't separate two tokens, but never joins lines.
+"""
+import re
+from typing import Iterator
+from typing import Tuple
+
+# the tokens of a scraper, regex literals are scanned separately where an operand is expected
+_TOKEN = re.compile(
+    r"""
+      (?P<newline>\r\n?|\n)
+    | (?P<space>[ \t\f\v]+)
+    | (?P<comment>//[^\r\n]*)
+    | (?P<string>'(?:[^'\\\r\n]|\\[^\r\n])*'|"(?:[^"\\\r\n]|\\[^\r\n])*")
+    | (?P<word>[\w$]+)
+    | (?P<other>.)
+    """,
+    re.VERBOSE,
+)
+_REGEX = re.compile(r"/(?:[^/\\\r\n\[]|\\[^\r\n]|\[(?:[^\]\\\r\n]|\\[^\r\n])*\])+/[a-z]*")
+
+_CLOSING = {")": "(", "]": "[", "}": "{"}
+
+# words after which an operand follows, a slash after them starts a regex literal
+_KEYWORDS = set(
+    "and await case delete do else in instanceof new not of or require return throw typeof void "
+    "yield".split()
+)
+# a slash after the closing parenthesis of their condition starts a regex literal
+_CONDITIONS = {"if", "while", "for", "with"}
+
+# whitespace next to these is never needed, unlike in "if (" or "a - -b"
+_DELIMITERS = set(",;)]}")
+_OPENING = set("([{")
+_OPERATORS = set("=!<>+-*/%&|^~?:")
+
+
+class CslSyntaxError(ValueError):
+    """the scraper can't be tokenized, e.g. a string isn't terminated"""
+
+    def __init__(self, message: str, line: int):
+        super().__init__("%s on line %d" % (message, line))
+        self.line = line
+
+
+def tokenize(source: str) -> Iterator[Tuple[str, str]]:
+    """the kinds and texts of the tokens of the scraper
+
+    A slash is a division after an operand and starts a regex literal anywhere else. After a
+    keyword, the condition of an if or a ``}`` it is taken for a regex literal if there is one,
+    such a regex literal is kept as it is even if it was meant as a division.
+
+    :raises CslSyntaxError: on unterminated strings and regex literals, or unbalanced brackets
+    """
+    line = 1
+    # the opening brackets, whether a parenthesis holds a condition and their lines
+    brackets = []
+    # whether the last token ends an operand, a slash after it is a division
+    operand = False
+    # whether a slash can't be a division, otherwise it is only tried as a regex literal
+    regex_certain = True
+    last = ""
+    pos = 0
+    while pos < len(source):
+        match = None
+        if source[pos] == "/" and not operand and not source.startswith("//", pos):
+            match = _REGEX.match(source, pos)
+            if match is None and regex_certain:
+                raise CslSyntaxError("unterminated regex", line)
+            kind = "regex"
+        if match is None:
+            match = _TOKEN.match(source, pos)
+            kind = match.lastgroup
+        text = match.group()
+
+        condition = False
+        if kind == "other":
+            if text in "'\"":
+                raise CslSyntaxError("unterminated string", line)
+            if text in _OPENING:
+                brackets.append((text, text == "(" and last in _CONDITIONS, line))
+            elif text in _CLOSING:
+                if not brackets or brackets[-1][0] != _CLOSING[text]:
+                    raise CslSyntaxError("unbalanced '%s'" % text, line)
+                condition = brackets.pop()[1]
+
+        yield kind, text
+        if kind == "newline":
+            line += 1
+        if kind not in ("space", "comment"):
+            if kind == "word":
+                operand = text not in _KEYWORDS
+            else:
+                operand = (
+                    kind in ("string", "regex") or text == "]" or text == ")" and not condition
+                )
+            regex_certain = kind not in ("word", "regex") and text not in ")}"
+            last = text
+        pos = match.end()
+
+    if brackets:
+        text, _, line = brackets[-1]
+        raise CslSyntaxError("unclosed '%s'" % text, line)
+
+
+def _space_needed(left: str, right: str) -> bool:
+    """whether the whitespace between the two tokens has to be kept"""
+    if left[-1] in _DELIMITERS or left[-1] in _OPENING or right[0] in _DELIMITERS:
+        return False
+    if left == "=" or right == "=":
+        # "a = b" becomes "a=b", but "a = -1" keeps the space
+        return left[-1] in _OPERATORS and right[0] in _OPERATORS
+    return True
+
+
+def minify(source: str) -> str:
+    """the scraper without comments, blank lines and needless whitespace
+
+    :raises CslSyntaxError: if the scraper can't be tokenized
+    """
+    lines = []
+    tokens = []
+    spaced = False
+    for kind, text in tokenize(source + "\n"):
+        if kind == "newline":
+            if tokens:
+                lines.append("".join(tokens))
+            tokens = []
+            spaced = False
+        elif kind in ("space", "comment"):
+            spaced = bool(tokens)
+        else:
+            if spaced and _space_needed(tokens[-1], text):
+                tokens.append(" ")
+            tokens.append(text)
+            spaced = False
+    return "\n".join(lines)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Persist the price reports submitted by the extension. Shared by the celery task and the stream
+consumer, both hand over one or more reports which are stored together.
+
+The "raw" ingest mode splits this in two phases: the reports are stored as they are and turned
+into price samples in batches later on.
+"""
+import logging
+from datetime import datetime
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+
+import geoip2.errors
+from django.conf import settings
+from django.db import transaction
+
+from ecciuvo.price import clean_prices
+from primming.pricewatcher.models import PriceSample
+from primming.pricewatcher.models import RawPriceReport
+from primming.pricewatcher.resolvers import location_resolver
+from primming.pricewatcher.resolvers import user_agent_resolver
+from primming.pricewatcher.urlindex import url_index
+
+log = logging.getLogger(__name__)
+
+
+class PriceReport(NamedTuple):
+    """A price report as submitted by the extension"""
+
+    uuid: str
+    data: Sequence[Mapping]
+    user_agent: str
+    remote_ip: str
+    # when the report was received, defaults to the time it is stored
+    timestamp: Optional[datetime] = None
+
+
+def price_ok(price: Optional[Mapping], scraped_page: Mapping) -> bool:
+    """check if the price makes sense"""
+    if not price or not isinstance(price, dict):
+        log.warning("Price is missing for: %s", scraped_page)
+        price_value = None
+    else:
+        price_value = price.get("value")
+
+    if not price_value:
+        log.warning("Price on %s could not be parsed: %s", scraped_page["url"], price)
+        return False
+    return True
+
+
+def resolve_location(remote_ip: str) -> Optional[int]:
+    """the id of the location of the ip address, None if it cannot be located"""
+    try:
+        return location_resolver.resolve(remote_ip)
+    except (geoip2.errors.GeoIP2Error, KeyError, AttributeError, ValueError):
+        return None
+
+
+def build_samples(reports: Iterable[PriceReport]) -> List[PriceSample]:
+    """build the price samples of the reports, invalid rows are skipped
+
+    The pages are resolved with the in-process url index, each distinct user agent and ip
+    address is resolved once and all prices are cleaned with one call.
+    """
+    reports = list(reports)
+    trie = url_index.get()
+    urls = {scraped_page["url"] for report in reports for scraped_page in report.data}
+    pages = {url: trie.resolve(url) for url in urls}
+    agents = {ua: user_agent_resolver.resolve(ua) for ua in {r.user_agent for r in reports}}
+    locations = {ip: resolve_location(ip) for ip in {r.remote_ip for r in reports}}
+    now = datetime.now(tz=settings.PYTZ_ZONE)
+
+    scraped = []
+    for report in reports:
+        for scraped_page in report.data:
+            page_id = pages.get(scraped_page["url"])
+            if page_id is None:
+                log.error("Got event for unknown page: %s", scraped_page["url"])
+                continue
+
+            price = scraped_page.get("price")
+            if not price_ok(price, scraped_page):
+                continue
+
+            scraped.append((report, page_id, scraped_page["url"], price))
+
+    cleaned = clean_prices((price.get("value"), price.get("curr")) for *_, price in scraped)
+
+    samples = []
+    for (report, page_id, url, _), result in zip(scraped, cleaned):
+        if isinstance(result, Exception):
+            log.warning("Price on %s is invalid: %s", url, result)
+            continue
+
+        price, currency = result
+        samples.append(
+            PriceSample(
+                timestamp=report.timestamp or now,
+                uuid=report.uuid,
+                agent_id=agents[report.user_agent],
+                page_id=page_id,
+                currency=currency,
+                price=price,
+                location_id=locations[report.remote_ip],
+            )
+        )
+
+    return samples
+
+
+def store_reports(reports: Iterable[PriceReport]) -> int:
+    """store the samples of the reports with one multi-row insert in one transaction
+
+    :returns: the number of stored samples
+    """
+    samples = build_samples(reports)
+    if not samples:
+        return 0
+
+    with transaction.atomic():
+        PriceSample.objects.bulk_create(samples)
+
+    return len(samples)
+
+
+def store_raw_reports(reports: Iterable[PriceReport]) -> int:
+    """store the scraped prices of the reports without any processing, see
+    :py:func:`enrich_raw_reports`
+
+    :returns: the number of stored rows
+    """
+    rows = [
+        RawPriceReport(
+            timestamp=report.timestamp or datetime.now(tz=settings.PYTZ_ZONE),
+            uuid=report.uuid,
+            user_agent=report.user_agent,
+            ip=report.remote_ip,
+            url=scraped_page["url"],
+            price=(scraped_page.get("price") or {}).get("value") or "",
+            currency=(scraped_page.get("price") or {}).get("curr") or "",
+        )
+        for report in reports
+        for scraped_page in report.data
+    ]
+    RawPriceReport.objects.bulk_create(rows)
+    return len(rows)
+
+
+def enrich_raw_reports(batch_size: int) -> int:
+    """turn a batch of raw reports into price samples
+
+    The raw rows are locked while they're processed, so several workers can enrich in parallel.
+    Rows which cannot be turned into a sample are dropped, the same way they would be skipped when
+    storing a report directly.
+    The user agents and locations created along with the samples are only cached by the
+    resolvers once the transaction commits.
+
+    :returns: the number of processed raw rows
+    """
+    with transaction.atomic():
+        rows = list(
+            RawPriceReport.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        samples = build_samples(
+            PriceReport(
+                row.uuid,
+                [{"url": row.url, "price": {"value": row.price, "curr": row.currency or None}}],
+                row.user_agent,
+                row.ip,
+                row.timestamp,
+            )
+            for row in rows
+        )
+        PriceSample.objects.bulk_create(samples)
+        RawPriceReport.objects.filter(id__in=[row.id for row in rows]).delete()
+
+    log.info("Enriched %d raw reports into %d samples", len(rows), len(samples))
+    return len(rows)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from primming.pricewatcher.streams import PriceReportStream
+
+
+class Command(BaseCommand):
+    """
+    Consume the price reports appended to the redis stream by the submission endpoint when
+    settings.PRICE_REPORT_INGEST_MODE is "stream". Run as many consumers as needed, each one
+    needs a unique name within the consumer group.
+    """
+
+    help = "Store the price reports of the redis stream in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--consumer",
+            default="%s-%d" % (socket.gethostname(), os.getpid()),
+            help="name of the consumer within the group, defaults to <hostname>-<pid>",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.PRICE_REPORT_STREAM_BATCH_SIZE,
+            help="maximum number of reports stored together",
+        )
+        parser.add_argument(
+            "--block",
+            type=int,
+            default=settings.PRICE_REPORT_STREAM_BLOCK,
+            help="milliseconds to wait for new reports",
+        )
+        parser.add_argument(
+            "--reclaim-idle",
+            type=int,
+            default=settings.PRICE_REPORT_STREAM_RECLAIM_IDLE,
+            help="milliseconds after which reports of crashed consumers are reclaimed",
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+
+        def _stop(signum, frame):
+            self.stdout.write("Stopping after the current batch..")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        self.stdout.write("Consuming price reports as '%s'" % options["consumer"])
+        PriceReportStream().consume(
+            options["consumer"],
+            batch_size=options["batch_size"],
+            block=options["block"],
+            min_idle=options["reclaim_idle"],
+            stop=stop,
+        )
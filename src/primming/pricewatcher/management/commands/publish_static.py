@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from primming.pricewatcher.publisher import StaticPublisher
+
+
+class Command(BaseCommand):
+    """
+    Publish the page lists and scraper bundles as static files for the nginx proxy. Runs on its
+    own whenever a page or list changes, use it to publish the current state initially.
+    """
+
+    help = "Write the page lists and scraper bundles to the directory served by nginx"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--root",
+            default=settings.STATIC_PUBLISH_ROOT,
+            help="directory to publish to, defaults to settings.STATIC_PUBLISH_ROOT",
+        )
+
+    def handle(self, *args, **options):
+        if not options["root"]:
+            raise CommandError("No directory to publish to, set PRIMMING_PUBLISH_ROOT or --root")
+
+        written = StaticPublisher(options["root"], settings.STATIC_PUBLISH_DELAY).publish()
+        self.stdout.write("Published to %s, %d files changed" % (options["root"], written))
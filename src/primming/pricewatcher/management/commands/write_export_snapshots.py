@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from primming.pricewatcher.api import SampleExportApiMixin
+from primming.pricewatcher.snapshots import ExportSnapshots
+
+
+class Command(BaseCommand):
+    """
+    Write the daily snapshots of the sample export. The celery task only writes those of the last
+    few days, use it to write the snapshots of the older days initially.
+    """
+
+    help = "Write the missing daily snapshots of the sample export"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--root",
+            default=settings.EXPORT_SNAPSHOT_ROOT,
+            help="directory of the snapshots, defaults to settings.EXPORT_SNAPSHOT_ROOT",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.EXPORT_SNAPSHOT_DAYS,
+            help="number of past days to write the missing snapshots for",
+        )
+
+    def handle(self, *args, **options):
+        if not options["root"]:
+            raise CommandError(
+                "No directory for the snapshots, set PRIMMING_EXPORT_SNAPSHOT_ROOT or --root"
+            )
+
+        snapshots = ExportSnapshots(SampleExportApiMixin(), "samples", options["root"])
+        written = snapshots.write_missing(options["days"])
+        self.stdout.write("Wrote %d snapshots to %s" % (written, options["root"]))
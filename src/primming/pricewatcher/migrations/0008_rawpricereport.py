@@ -0,0 +1,33 @@
+# Generated by Django 3.2.13 on 2026-10-17 20:48
+
+import django.utils.timezone
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pricewatcher", "0007_page_scraper"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RawPriceReport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("timestamp", models.DateTimeField(default=django.utils.timezone.now)),
+                ("uuid", models.CharField(max_length=40)),
+                ("user_agent", models.TextField()),
+                ("ip", models.CharField(max_length=45)),
+                ("url", models.TextField()),
+                ("price", models.CharField(blank=True, max_length=255)),
+                ("currency", models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.13 on 2026-10-17 21:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pricewatcher", "0008_rawpricereport"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pagelist",
+            name="pruned_revision",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="PageListChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("page_id", models.BigIntegerField()),
+                (
+                    "action",
+                    models.IntegerField(choices=[(1, "Added"), (2, "Removed"), (3, "Changed")]),
+                ),
+                (
+                    "timestamp",
+                    models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+                ),
+                (
+                    "page_list",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="changes",
+                        to="pricewatcher.pagelist",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.13 on 2026-10-17 21:17
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pricewatcher", "0009_pagelistchange"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="page",
+            name="url",
+            field=models.URLField(db_index=True),
+        ),
+    ]
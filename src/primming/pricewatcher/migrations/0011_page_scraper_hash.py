@@ -0,0 +1,33 @@
+# Generated by Django 3.2.13 on 2026-10-17 21:25
+
+import hashlib
+
+from django.db import migrations
+from django.db import models
+
+
+def forwards_func(apps, schema_editor):
+    """hash the scrapers of the existing pages"""
+    Page = apps.get_model("pricewatcher", "Page")
+    db_alias = schema_editor.connection.alias
+
+    for page in Page.objects.using(db_alias).only("scraper"):
+        page.scraper_hash = hashlib.sha1(page.scraper.encode("utf-8")).hexdigest()
+        page.save(update_fields=["scraper_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pricewatcher", "0010_page_url_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="scraper_hash",
+            field=models.CharField(db_index=True, default="", editable=False, max_length=40),
+            preserve_default=False,
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,159 @@
+# Generated by Django 3.2.13 on 2026-10-17 23:40
+
+import gzip
+import json
+import re
+
+from django.db import migrations
+from django.db import models
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# a frozen copy of primming.pricewatcher.csl.minify and primming.utils.compression.compress, the
+# migration must not change with the app code
+
+_TOKEN = re.compile(
+    r"""
+      (?P<newline>\r\n?|\n)
+    | (?P<space>[ \t\f\v]+)
+    | (?P<comment>//[^\r\n]*)
+    | (?P<string>'(?:[^'\\\r\n]|\\[^\r\n])*'|"(?:[^"\\\r\n]|\\[^\r\n])*")
+    | (?P<word>[\w$]+)
+    | (?P<other>.)
+    """,
+    re.VERBOSE,
+)
+_REGEX = re.compile(r"/(?:[^/\\\r\n\[]|\\[^\r\n]|\[(?:[^\]\\\r\n]|\\[^\r\n])*\])+/[a-z]*")
+_CLOSING = {")": "(", "]": "[", "}": "{"}
+_KEYWORDS = set(
+    "and await case delete do else in instanceof new not of or require return throw typeof void "
+    "yield".split()
+)
+_CONDITIONS = {"if", "while", "for", "with"}
+_DELIMITERS = set(",;)]}")
+_OPENING = set("([{")
+_OPERATORS = set("=!<>+-*/%&|^~?:")
+
+
+def tokenize(source):
+    """the kinds and texts of the tokens of the scraper, raises ValueError on syntax errors"""
+    brackets = []
+    operand = False
+    regex_certain = True
+    last = ""
+    pos = 0
+    while pos < len(source):
+        match = None
+        if source[pos] == "/" and not operand and not source.startswith("//", pos):
+            match = _REGEX.match(source, pos)
+            if match is None and regex_certain:
+                raise ValueError("unterminated regex")
+            kind = "regex"
+        if match is None:
+            match = _TOKEN.match(source, pos)
+            kind = match.lastgroup
+        text = match.group()
+
+        condition = False
+        if kind == "other":
+            if text in "'\"":
+                raise ValueError("unterminated string")
+            if text in _OPENING:
+                brackets.append((text, text == "(" and last in _CONDITIONS))
+            elif text in _CLOSING:
+                if not brackets or brackets[-1][0] != _CLOSING[text]:
+                    raise ValueError("unbalanced '%s'" % text)
+                condition = brackets.pop()[1]
+
+        yield kind, text
+        if kind not in ("space", "comment"):
+            if kind == "word":
+                operand = text not in _KEYWORDS
+            else:
+                operand = (
+                    kind in ("string", "regex") or text == "]" or text == ")" and not condition
+                )
+            regex_certain = kind not in ("word", "regex") and text not in ")}"
+            last = text
+        pos = match.end()
+
+    if brackets:
+        raise ValueError("unclosed '%s'" % brackets[-1][0])
+
+
+def _space_needed(left, right):
+    if left[-1] in _DELIMITERS or left[-1] in _OPENING or right[0] in _DELIMITERS:
+        return False
+    if left == "=" or right == "=":
+        return left[-1] in _OPERATORS and right[0] in _OPERATORS
+    return True
+
+
+def minify(source):
+    """the scraper without comments, blank lines and needless whitespace"""
+    lines = []
+    tokens = []
+    spaced = False
+    for kind, text in tokenize(source + "\n"):
+        if kind == "newline":
+            if tokens:
+                lines.append("".join(tokens))
+            tokens = []
+            spaced = False
+        elif kind in ("space", "comment"):
+            spaced = bool(tokens)
+        else:
+            if spaced and _space_needed(tokens[-1], text):
+                tokens.append(" ")
+            tokens.append(text)
+            spaced = False
+    return "\n".join(lines)
+
+
+def forwards_func(apps, schema_editor):
+    """minify the scrapers of the existing pages and compress their response bodies"""
+    Page = apps.get_model("pricewatcher", "Page")
+    db_alias = schema_editor.connection.alias
+
+    for page in Page.objects.using(db_alias).only("scraper"):
+        try:
+            page.scraper_minified = minify(page.scraper)
+        except ValueError:
+            page.scraper_minified = page.scraper
+        body = json.dumps({"csl": page.scraper_minified}).encode("utf-8")
+        page.scraper_gzip = gzip.compress(body, mtime=0)
+        page.scraper_brotli = (
+            None if brotli is None else brotli.compress(body, mode=brotli.MODE_TEXT)
+        )
+        page.save(update_fields=["scraper_minified", "scraper_gzip", "scraper_brotli"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pricewatcher", "0011_page_scraper_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="scraper_brotli",
+            field=models.BinaryField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="page",
+            name="scraper_gzip",
+            field=models.BinaryField(default=b"", editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="page",
+            name="scraper_minified",
+            field=models.TextField(default="", editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
@@ -5,26 +5,87 @@
 # defined in file 'LICENSE', which is part of this source code package.
 from __future__ import annotations
 
+import hashlib
+from datetime import datetime
 from typing import Any
+from typing import Iterable
 from typing import Mapping
 from typing import Sequence
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db import transaction
+from django.db.models import Max
+from django.http import JsonResponse
 from django.utils.timezone import now as django_now
 from geoip2 import database as geodb
+from geoip2 import models as geomodels
 from user_agents import parse as uaparse
 
+from primming.pricewatcher.csl import CslSyntaxError
+from primming.pricewatcher.csl import minify
 from primming.registration.models import Person
+from primming.utils.compression import compress
 
 
 class Page(models.Model):
     """A single observed domain"""
 
     name = models.CharField(max_length=30, blank=False, unique=True)
-    url = models.URLField(blank=False)
+    url = models.URLField(blank=False, db_index=True)
     enabled = models.BooleanField(default=True, blank=False)
     scraper = models.TextField(max_length=20_000)
+    # the content hash of the scraper, its scraper/<hash> url never changes
+    scraper_hash = models.CharField(max_length=40, db_index=True, editable=False)
+    # the minified scraper the extension gets, and its JSON response body compressed
+    scraper_minified = models.TextField(editable=False)
+    scraper_gzip = models.BinaryField(editable=False)
+    scraper_brotli = models.BinaryField(null=True, editable=False)
+
+    # the fields derived from the scraper on save
+    SCRAPER_FIELDS = ("scraper_hash", "scraper_minified", "scraper_gzip", "scraper_brotli")
+
+    @staticmethod
+    def hash_scraper(scraper: str) -> str:
+        return hashlib.sha1(scraper.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def scraper_body(scraper: str) -> bytes:
+        """the JSON response body of the scraper endpoints"""
+        return JsonResponse({"csl": scraper}).content
+
+    @staticmethod
+    def minify_scraper(scraper: str) -> str:
+        """the minified scraper, scrapers which can't be minified are sent as they are"""
+        try:
+            return minify(scraper)
+        except CslSyntaxError:
+            return scraper
+
+    def clean(self):
+        try:
+            minify(self.scraper)
+        except CslSyntaxError as e:
+            raise ValidationError({"scraper": str(e)})
+
+    def prepare_scraper(self):
+        """minify the scraper and compress its response body, the admin doesn't save scrapers
+        which can't be minified"""
+        self.scraper_hash = self.hash_scraper(self.scraper)
+        self.scraper_minified = self.minify_scraper(self.scraper)
+        self.scraper_gzip, self.scraper_brotli = compress(self.scraper_body(self.scraper_minified))
+
+    def save(self, *args, **kwargs):
+
+        # keep the hash and the minified scraper in sync with the scraper
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "scraper" in update_fields:
+            self.prepare_scraper()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *self.SCRAPER_FIELDS}
+
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return "{}(name:{}, enabled:{})".format(self.__class__.__name__, self.name, self.enabled)
@@ -36,6 +97,8 @@ class PageList(models.Model):
     name = models.CharField(max_length=30, blank=False, unique=True)
     default = models.BooleanField(default=False, null=True, blank=True, unique=True)
     pages = models.ManyToManyField(to=Page, related_name="lists")
+    # the changes of the list up to this revision have been pruned, see PageListChange
+    pruned_revision = models.BigIntegerField(default=0)
 
     def save(self, *args, **kwargs):
 
@@ -48,10 +111,85 @@ class PageList(models.Model):
 
         super().save(*args, **kwargs)
 
+    @property
+    def revision(self) -> int:
+        """the revision of the list, the id of its latest change
+
+        Every access queries the index of the changes, read it once per response. The changes
+        which are not committed yet always get higher ids, see :py:meth:`PageListChange.record`.
+        """
+        return self.changes.aggregate(revision=Max("id"))["revision"] or self.pruned_revision
+
     def __str__(self):
         return "{}(name:{}, default:{})".format(self.__class__.__name__, self.name, self.default)
 
 
+class PageListChange(models.Model):
+    """A change of a page list as seen by the extension: a page was added to or removed from the
+    list (or enabled/disabled), or a page of the list changed its url or scraper.
+
+    The ids are the revisions of the lists, so the extension can fetch the changes since the
+    revision it has. They follow the order in which the changes of a list were committed, see
+    :py:meth:`record`. Recorded by the signal handlers in :py:mod:`primming.pricewatcher.signals`.
+    """
+
+    class Action(models.IntegerChoices):
+
+        ADDED = 1, "Added"
+        REMOVED = 2, "Removed"
+        CHANGED = 3, "Changed"
+
+    page_list = models.ForeignKey(to=PageList, on_delete=models.CASCADE, related_name="changes")
+    # no foreign key, the removal of a deleted page has to be kept
+    page_id = models.BigIntegerField()
+    action = models.IntegerField(choices=Action.choices)
+    timestamp = models.DateTimeField(default=django_now, db_index=True)
+
+    @classmethod
+    def record(cls, list_ids: Iterable[int], page_ids: Iterable[int], action: int):
+        """record the same change of all the pages in all the lists
+
+        The ids are taken on insert, but the transactions commit in any order. The lists are
+        locked until the transaction commits, so the changes of a list are inserted one
+        transaction after the other. Otherwise a client could get the revision of a change while
+        one with a lower id is still to be committed, and never get the latter.
+        """
+        list_ids = sorted(set(list_ids))
+        page_ids = list(page_ids)
+        if not list_ids or not page_ids:
+            return
+        with transaction.atomic():
+            # locked in the order of their ids, concurrent changes of several lists don't deadlock
+            locked = PageList.objects.select_for_update().filter(id__in=list_ids).order_by("id")
+            list(locked.values_list("id", flat=True))
+            cls.objects.bulk_create(
+                cls(page_list_id=list_id, page_id=page_id, action=action)
+                for list_id in list_ids
+                for page_id in page_ids
+            )
+
+    @classmethod
+    def prune(cls, before: datetime):
+        """delete the changes recorded before the timestamp
+
+        The lists remember the latest pruned revision, older revisions get the full list.
+        """
+        pruned = (
+            cls.objects.filter(timestamp__lt=before)
+            .values("page_list")
+            .annotate(revision=Max("id"))
+            .values_list("page_list", "revision")
+        )
+        for list_id, revision in list(pruned):
+            PageList.objects.filter(id=list_id).update(pruned_revision=revision)
+            cls.objects.filter(page_list_id=list_id, id__lte=revision).delete()
+
+    def __str__(self):
+        return "{}(list:{}, page:{}, action:{})".format(
+            self.__class__.__name__, self.page_list_id, self.page_id, self.get_action_display()
+        )
+
+
 class BrowserMake(models.Model):
     """Browser make
 
@@ -230,8 +368,25 @@ class GeoIPLocation(models.Model):
         :param ip_addr: the ip address
         :returns: a GeoIPLocation object
         :raises: geoip2.errors.AddressNotFoundError, KeyError, AttributeError"""
-        entry = cls._reader.city(ip_addr)
+        return cls.from_geoip_entry(ip_addr, cls.lookup(ip_addr))
 
+    @classmethod
+    def lookup(cls, ip_addr: str) -> geomodels.City:
+        """look up the ip address in the geoip database
+
+        :param ip_addr: the ip address
+        :returns: the city entry of the geoip database, its traits include the network
+        :raises: geoip2.errors.AddressNotFoundError"""
+        return cls._reader.city(ip_addr)
+
+    @classmethod
+    def from_geoip_entry(cls, ip_addr: str, entry: geomodels.City) -> GeoIPLocation:
+        """create the location from an entry of the geoip database
+
+        :param ip_addr: the ip address to store with the location
+        :param entry: the city entry as returned by :py:meth:`lookup`
+        :returns: a GeoIPLocation object
+        :raises: KeyError, AttributeError"""
         location, _ = GeoIPLocation.objects.get_or_create(
             ip=ip_addr,
             longitude=entry.location.longitude,
@@ -284,6 +439,27 @@ class PriceSample(models.Model):
         )
 
 
+class RawPriceReport(models.Model):
+    """A scraped price as submitted by the extension, stored without any processing.
+
+    Used by the "raw" ingest mode to accept reports quickly, the rows are turned into
+    :py:class:`PriceSample` objects in batches by the enrichment task.
+    """
+
+    timestamp = models.DateTimeField(default=django_now)
+    uuid = models.CharField(max_length=40)
+    user_agent = models.TextField()
+    ip = models.CharField(max_length=45)
+    url = models.TextField()
+    price = models.CharField(max_length=255, blank=True)
+    currency = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return "{}(ts:{}, url:{}, price:{}, uuid:{})".format(
+            self.__class__.__name__, self.timestamp, self.url, self.price, self.uuid
+        )
+
+
 class BrowserRedirect(models.Model):
     """Redirects based on browser make. E.g. redirect firefox users to the install page for the
     extension on addons.mozilla.org and chrome users to the chrome webstore.
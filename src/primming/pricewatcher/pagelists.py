@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Cache the responses of the page list and the scraper bundle endpoints, which every extension
+polls. The encoded response is stored along with its content hash, so an unchanged list is
+answered with a 304 without any query.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import NamedTuple
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from primming.pricewatcher.api import PageListViewApiMixin
+from primming.pricewatcher.api import ScraperBundleApiMixin
+from primming.utils.cache import LRUCache
+from primming.utils.compression import gzip_compress
+
+
+class EncodedResponse(NamedTuple):
+    """the response body of a page list, bundle or scraper and its content hash"""
+
+    version: str
+    body: bytes
+    # the gzip compressed body, if it is worth compressing
+    gzipped: Optional[bytes] = None
+    # the brotli compressed body, only stored for the scrapers
+    brotli: Optional[bytes] = None
+
+    @classmethod
+    def encode(cls, data, compress: bool = False) -> EncodedResponse:
+        body = JsonResponse(data).content
+        gzipped = gzip_compress(body) if compress else None
+        return cls(hashlib.sha1(body).hexdigest(), body, gzipped)
+
+    @property
+    def etag(self) -> str:
+        return '"%s"' % self.version
+
+
+class PageListCache:
+    """The encoded page lists by name, kept in an in-process LRU in front of the shared django
+    cache.
+
+    The entries of the shared cache are keyed with a generation, any change of a page or a list
+    starts a new generation (see :py:mod:`primming.pricewatcher.signals`). Since a single page can
+    be part of any number of lists, and a list can be renamed or become the default, this is
+    simpler and safer than tracking the affected lists. Other processes drop their in-process
+    entries once they expire, hence the short timeout of the LRU.
+    """
+
+    key_prefix = "pricewatcher:pagelist"
+
+    def __init__(self, maxsize: int, local_timeout: int, timeout: int):
+        """
+        :param maxsize: the number of lists in the in-process LRU
+        :param local_timeout: seconds an entry stays in the in-process LRU
+        :param timeout: seconds an entry stays in the shared cache
+        """
+        self.timeout = timeout
+        self._local = LRUCache(maxsize, local_timeout)
+
+    @property
+    def generation_key(self) -> str:
+        """the key of the current generation in the shared cache"""
+        return "%s:generation" % self.key_prefix
+
+    def cache_key(self, generation: int, name: Optional[str], since: Optional[int]) -> str:
+        """the key in the shared cache for the list, the default one if name is None"""
+        return "%s:%s:%s:%s" % (
+            self.key_prefix,
+            generation,
+            "default" if name is None else "=" + name,
+            "" if since is None else since,
+        )
+
+    @staticmethod
+    def load(name: Optional[str], since: Optional[int] = None) -> EncodedResponse:
+        """encode the list, or its changes since the revision, from the database
+
+        :raises NotFoundException: if there is no such list
+        """
+        if since is None:
+            return EncodedResponse.encode(PageListViewApiMixin.serialize_list(name))
+        return EncodedResponse.encode(PageListViewApiMixin.serialize_changes(name, since))
+
+    def get_local(self, name: Optional[str], since: int = None) -> Optional[EncodedResponse]:
+        """the list from the in-process LRU, None if it isn't cached there
+
+        Doesn't do any I/O, so it is safe to call from the event loop.
+        """
+        return self._local.get((name, since))
+
+    def fetch(self, name: Optional[str], since: int = None) -> EncodedResponse:
+        """the list from the shared cache or the database
+
+        :raises NotFoundException: if there is no such list
+        """
+        generation = cache.get_or_set(self.generation_key, time.time_ns, None)
+        cache_key = self.cache_key(generation, name, since)
+        entry = cache.get(cache_key)
+        if entry is None:
+            entry = self.load(name, since)
+            cache.set(cache_key, entry, self.timeout)
+
+        self._local.set((name, since), entry)
+        return entry
+
+    def get(self, name: Optional[str], since: int = None) -> EncodedResponse:
+        """the encoded list by name, the default list if name is None
+
+        :param since: encode only the changes since this revision of the list
+        :raises NotFoundException: if there is no such list
+        """
+        entry = self.get_local(name, since)
+        if entry is None:
+            entry = self.fetch(name, since)
+        return entry
+
+    def invalidate(self):
+        """drop all cached lists by starting a new generation"""
+        self._local.clear()
+        cache.set(self.generation_key, time.time_ns(), None)
+
+    def clear(self):
+        """drop the in-process cache"""
+        self._local.clear()
+
+
+class ScraperBundleCache(PageListCache):
+    """The gzip compressed scraper bundles by list name, see :py:class:`PageListCache`"""
+
+    key_prefix = "pricewatcher:bundle"
+
+    @staticmethod
+    def load(name: Optional[str], since: Optional[int] = None) -> EncodedResponse:
+        """encode and compress the bundle from the database, there are no partial bundles
+
+        :raises NotFoundException: if there is no such list
+        """
+        return EncodedResponse.encode(ScraperBundleApiMixin.serialize_bundle(name), compress=True)
+
+
+pagelist_cache = PageListCache(
+    settings.PAGELIST_CACHE_SIZE,
+    settings.PAGELIST_CACHE_LOCAL_TIMEOUT,
+    settings.PAGELIST_CACHE_TIMEOUT,
+)
+bundle_cache = ScraperBundleCache(
+    settings.PAGELIST_CACHE_SIZE,
+    settings.PAGELIST_CACHE_LOCAL_TIMEOUT,
+    settings.PAGELIST_CACHE_TIMEOUT,
+)
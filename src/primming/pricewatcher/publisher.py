@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Publish the page lists, scraper bundles and scrapers as static files for the nginx proxy, which
+then answers the polls of the extensions without passing them on to django (see
+``docker/proxy/primming.conf``).
+
+Every file is written along with its gzip compressed copy for nginx's ``gzip_static``. Anything
+that is not published, like the changes of a list or a list that was just created, falls through to
+the django views, so the files only need to be eventually consistent with the database.
+"""
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterator
+from typing import Optional
+from typing import Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from primming.pricewatcher.api import PageListViewApiMixin
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PageList
+from primming.pricewatcher.pagelists import EncodedResponse
+from primming.pricewatcher.pagelists import ScraperBundleCache
+from primming.pricewatcher.scrapers import encode_scraper
+from primming.pricewatcher.tasks import PublishStaticTask
+from primming.utils.api.exceptions import NotFoundException
+
+log = logging.getLogger(__name__)
+
+# the names the url patterns accept for lists, anything else can't be requested anyway
+LIST_NAME = re.compile(r"\w+")
+
+# the directories below the root which are managed by the publisher
+DIRECTORIES = ("urllist", "scrapers", "scraper")
+
+
+def filename(name: Optional[str]) -> str:
+    """the file name of the list, the default list has no name"""
+    return "default.json" if name is None else "list-%s.json" % name
+
+
+class StaticPublisher:
+    """Writes the encoded page lists and scraper bundles below the root directory:
+
+    * ``urllist/default.json``, ``urllist/list-<name>.json``
+    * ``scrapers/default.json``, ``scrapers/list-<name>.json``
+    * ``scrapers/<version>/default.json``, ``scrapers/<version>/list-<name>.json``
+    * ``scraper/<hash>.json`` for the scrapers of the enabled pages
+
+    Files are replaced atomically, so nginx never serves a partially written one, and files with
+    unchanged content are left alone to keep their ETag (which nginx derives from the mtime).
+    """
+
+    # the shared cache key marking a scheduled publish
+    pending_key = "pricewatcher:publish:pending"
+
+    def __init__(self, root: Optional[str], delay: int):
+        """
+        :param root: the directory served by nginx, publishing is disabled if it is None
+        :param delay: seconds to wait for further changes before publishing
+        """
+        self.root = None if root is None else Path(root)
+        self.delay = delay
+
+    def files(self) -> Iterator[Tuple[str, EncodedResponse]]:
+        """the relative paths and contents of all files to publish"""
+        names = PageList.objects.order_by("name").values_list("name", flat=True)
+        for name in [None, *(name for name in names if LIST_NAME.fullmatch(name))]:
+            try:
+                page_list = PageListViewApiMixin.serialize_list(name)
+                bundle = ScraperBundleCache.load(name)
+            except NotFoundException:
+                # there is no default list
+                continue
+            yield "urllist/%s" % filename(name), EncodedResponse.encode(page_list, compress=True)
+            yield "scrapers/%s" % filename(name), bundle
+            yield "scrapers/%s/%s" % (bundle.version, filename(name)), bundle
+
+        published = set()
+        for page in Page.objects.filter(enabled=True).only(*Page.SCRAPER_FIELDS):
+            if page.scraper_hash not in published:
+                published.add(page.scraper_hash)
+                yield "scraper/%s.json" % page.scraper_hash, encode_scraper(page)
+
+    @staticmethod
+    def write(path: Path, content: bytes) -> bool:
+        """atomically replace the file with the content, unless it has that content already
+
+        :returns: whether the file was written
+        """
+        try:
+            if path.read_bytes() == content:
+                return False
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
+
+    def prune(self, published: set):
+        """delete the files which are not published anymore, e.g. outdated bundle versions"""
+        for directory in DIRECTORIES:
+            for dir_path, dir_names, file_names in os.walk(self.root / directory, topdown=False):
+                for file_name in file_names:
+                    path = Path(dir_path, file_name)
+                    if path not in published:
+                        path.unlink()
+                if not os.listdir(dir_path):
+                    os.rmdir(dir_path)
+
+    def publish(self) -> int:
+        """write all files and delete the outdated ones
+
+        :returns: the number of files written
+        """
+        # changes from now on are published by the next run
+        cache.delete(self.pending_key)
+
+        written = 0
+        published = set()
+        for name, encoded in self.files():
+            path = self.root / name
+            gzipped = path.with_name(path.name + ".gz")
+            # the compressed copy first, it is what nearly all clients get
+            written += self.write(gzipped, encoded.gzipped)
+            written += self.write(path, encoded.body)
+            published.update((gzipped, path))
+
+        self.prune(published)
+        log.info("Published %d files, %d of them changed", len(published), written)
+        return written
+
+    def schedule(self):
+        """publish after the delay in a celery task, unless a publish is pending already"""
+        if self.root is not None and cache.add(self.pending_key, True, self.delay):
+            PublishStaticTask().apply_async(countdown=self.delay)
+
+
+publisher = StaticPublisher(settings.STATIC_PUBLISH_ROOT, settings.STATIC_PUBLISH_DELAY)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Redirect the users to the extension store of their browser. The webstore link is what campaigns
+point to, so it is answered from an in-process table of the redirects, and the browser family is
+told from the user agent by a single precompiled pattern instead of the full user agent parser.
+"""
+import re
+import threading
+import time
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from user_agents import parse as uaparse
+
+from primming.pricewatcher.models import BrowserRedirect
+from primming.utils.cache import LRUCache
+
+_DESKTOP = r"Mozilla/5\.0 \((?:Windows|Macintosh|X11)[^()]*\) "
+_BLINK = _DESKTOP + r"AppleWebKit/[\d.]+ \(KHTML, like Gecko\) Chrome/[\d.]+ Safari/[\d.]+"
+
+# the unmodified user agents of the common desktop browsers by the family the user agent parser
+# reports for them, anything else (mobile browsers, forks adding their own token, ..) is left to
+# the parser
+BROWSER_FAMILIES = re.compile(
+    "|".join(
+        "(?P<%s>%s)" % family
+        for family in (
+            ("Edge", _BLINK + r" Edg/[\d.]+"),
+            ("Opera", _BLINK + r" OPR/[\d.]+(?: \(Edition [^()]*\))?"),
+            ("Chrome", _BLINK),
+            ("Firefox", _DESKTOP + r"Gecko/\d+ Firefox/[\d.]+"),
+            (
+                "Safari",
+                r"Mozilla/5\.0 \(Macintosh[^()]*\) AppleWebKit/[\d.]+ \(KHTML, like Gecko\) "
+                r"Version/[\d.]+ Safari/[\d.]+",
+            ),
+        )
+    )
+)
+
+_families = LRUCache(settings.BROWSER_FAMILY_CACHE_SIZE)
+
+
+def local_browser_family(user_agent: str) -> Optional[str]:
+    """the browser family of the user agent if it is cached or matched by
+    :py:data:`BROWSER_FAMILIES`, None if it has to be parsed
+
+    Doesn't do any I/O and never runs the parser, so it is safe to call from the event loop.
+    """
+    family = _families.get(user_agent)
+    if family is None:
+        match = BROWSER_FAMILIES.fullmatch(user_agent)
+        if match:
+            family = match.lastgroup
+            _families.set(user_agent, family)
+    return family
+
+
+def browser_family(user_agent: str) -> str:
+    """the browser family of the user agent, as the user agent parser names it"""
+    family = local_browser_family(user_agent)
+    if family is None:
+        family = uaparse(user_agent).browser.family
+        _families.set(user_agent, family)
+    return family
+
+
+class RedirectTable(NamedTuple):
+    """the webstore urls by browser make name and the url for all other browsers"""
+
+    urls: Mapping[str, str]
+    default: Optional[str]
+
+    def url_for(self, user_agent: str) -> Optional[str]:
+        """the webstore url for the browser of the user agent, None if there is none"""
+        return self.url_for_family(browser_family(user_agent))
+
+    def url_for_family(self, family: str) -> Optional[str]:
+        """the webstore url for the browser family, None if there is none"""
+        return self.urls.get(family, self.default)
+
+
+class WebstoreRedirects:
+    """The redirect table, loaded from the database on first use.
+
+    Any change of a redirect or browser make starts a new generation in the shared cache (see
+    :py:mod:`primming.pricewatcher.signals`). Every process checks the generation every
+    check_interval seconds and loads the table again if it changed.
+    """
+
+    generation_key = "pricewatcher:webstore:generation"
+
+    def __init__(self, check_interval: float):
+        """
+        :param check_interval: seconds between the checks of the generation
+        """
+        self.check_interval = check_interval
+        self._table = None
+        self._generation = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load() -> RedirectTable:
+        """the table of the webstore redirects in the database, the first one of a make wins"""
+        urls = {}
+        default = None
+        redirects = BrowserRedirect.objects.filter(
+            type=BrowserRedirect.RedirectPurpose.ADDON_WEBSTORE
+        ).order_by("id")
+        for name, url, is_default in redirects.values_list("browser_make__name", "url", "default"):
+            urls.setdefault(name, url)
+            if is_default and default is None:
+                default = url
+        return RedirectTable(urls, default)
+
+    def get_local(self) -> Optional[RedirectTable]:
+        """the table if it is loaded and up to date, None otherwise
+
+        Doesn't do any I/O, so it is safe to call from the event loop.
+        """
+        if self._table is not None and time.monotonic() - self._checked < self.check_interval:
+            return self._table
+        return None
+
+    def get(self) -> RedirectTable:
+        """the up to date table, loaded from the database if needed"""
+        table = self.get_local()
+        if table is not None:
+            return table
+
+        generation = cache.get_or_set(self.generation_key, time.time_ns, None)
+        with self._lock:
+            if self._table is None or self._generation != generation:
+                self._table = self.load()
+                self._generation = generation
+            self._checked = time.monotonic()
+            return self._table
+
+    def invalidate(self):
+        """drop the table of all processes by starting a new generation"""
+        cache.set(self.generation_key, time.time_ns(), None)
+        self.clear()
+
+    def clear(self):
+        """drop the table of the process"""
+        with self._lock:
+            self._table = None
+            self._generation = None
+
+
+webstore_redirects = WebstoreRedirects(settings.WEBSTORE_REDIRECT_CHECK_INTERVAL)
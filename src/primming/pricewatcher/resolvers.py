@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Resolve the raw values of a price report (user agent string, ip address) to the ids of their
+dimension rows without hitting the database for values we have seen before.
+"""
+import functools
+import hashlib
+import threading
+from typing import Callable
+from typing import Hashable
+from typing import Mapping
+from typing import Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from primming.pricewatcher.models import GeoIPLocation
+from primming.pricewatcher.models import UserAgent
+from primming.utils.cache import LRUCache
+
+
+class CachedResolver:
+    """Resolve a value to a database id via an in-process LRU, the shared django cache and
+    finally the database.
+
+    Concurrent misses for the same value within a process are serialized, so only one thread
+    does the database work while the others wait for its result. Misses racing in different
+    processes are settled by the unique constraints behind the ``get_or_create`` calls.
+    """
+
+    key_prefix = None
+    lock_stripes = 64
+
+    def __init__(self, maxsize: int, timeout: int):
+        self.timeout = timeout
+        self.shared_hits = 0
+        self.misses = 0
+        self._local = LRUCache(maxsize, timeout)
+        self._locks = [threading.Lock() for _ in range(self.lock_stripes)]
+
+    def cache_key(self, key: str) -> str:
+        """the key in the shared cache, hashed since raw values can be long"""
+        return "%s:%s" % (self.key_prefix, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def _resolve(self, key: Hashable, load: Callable[[], int]) -> int:
+        """get the id for the key from one of the caches or call load to get it from the db"""
+        pk = self._local.get(key)
+        if pk is not None:
+            return pk
+
+        with self._locks[hash(key) % self.lock_stripes]:
+            # another thread might have resolved the key while we were waiting for the lock
+            pk = self._local.peek(key)
+            if pk is not None:
+                return pk
+
+            cache_key = self.cache_key(str(key))
+            pk = cache.get(cache_key)
+            if pk is not None:
+                self.shared_hits += 1
+                self._local.set(key, pk)
+            else:
+                self.misses += 1
+                pk = load()
+                # the row might have been created in a transaction which is rolled back yet, it is
+                # only cached once it is committed (right away outside of a transaction)
+                transaction.on_commit(functools.partial(self._store, key, cache_key, pk))
+            return pk
+
+    def _store(self, key: Hashable, cache_key: str, pk: int):
+        """cache the id of a committed row in both caches"""
+        cache.set(cache_key, pk, self.timeout)
+        self._local.set(key, pk)
+
+    def clear(self):
+        """drop the in-process cache and reset the counters"""
+        self._local.clear()
+        self.shared_hits = 0
+        self.misses = 0
+
+    def stats(self) -> Mapping[str, Union[int, float]]:
+        """hit/miss counters of the resolver
+
+        - local_hits: resolved from the in-process LRU
+        - shared_hits: resolved from the shared django cache
+        - misses: resolved from the database
+        - hit_rate: share of the lookups that did not need the database
+        """
+        local = self._local.stats()
+        lookups = local["hits"] + self.shared_hits + self.misses
+        return {
+            "local_hits": local["hits"],
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            "size": local["size"],
+        }
+
+
+class UserAgentResolver(CachedResolver):
+    """Map a raw user agent string to the id of its :py:class:`UserAgent`"""
+
+    key_prefix = "pricewatcher:ua"
+
+    def resolve(self, ua_string: str) -> int:
+        """
+        :param ua_string: the user agent string as submitted by the http header
+        :return: the id of the matching :py:class:`UserAgent`
+        """
+        return self._resolve(ua_string, lambda: UserAgent.from_ua_string(ua_string).id)
+
+
+class GeoIPLocationResolver(CachedResolver):
+    """Map an ip address to the id of the :py:class:`GeoIPLocation` of its GeoIP network
+
+    The geoip database stores its records per network (e.g. a /24 block or the block of an ISP),
+    every address of a network resolves to the same location. The network is used as the cache
+    key, so the database is only queried once per network and not once per address.
+    """
+
+    key_prefix = "pricewatcher:geoip"
+
+    def resolve(self, ip_addr: str) -> int:
+        """
+        :param ip_addr: the ip address
+        :return: the id of the matching :py:class:`GeoIPLocation`
+        :raises: geoip2.errors.AddressNotFoundError, KeyError, AttributeError
+        """
+        entry = GeoIPLocation.lookup(ip_addr)
+        network = entry.traits.network
+
+        return self._resolve(
+            str(network),
+            lambda: GeoIPLocation.from_geoip_entry(str(network.network_address), entry).id,
+        )
+
+
+user_agent_resolver = UserAgentResolver(
+    settings.USER_AGENT_CACHE_SIZE, settings.USER_AGENT_CACHE_TIMEOUT
+)
+location_resolver = GeoIPLocationResolver(
+    settings.GEOIP_LOCATION_CACHE_SIZE, settings.GEOIP_LOCATION_CACHE_TIMEOUT
+)
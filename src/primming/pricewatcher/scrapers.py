@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Cache the responses of the scraper endpoints. The extension requests the scraper of a page on every
+visit of it, while the scrapers only change when they are edited in the admin. The minified and
+compressed responses are prepared when a page is saved, see :py:meth:`Page.prepare_scraper`.
+"""
+from typing import Optional
+from typing import Union
+
+from django.conf import settings
+from django.core.cache import cache
+
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.pagelists import EncodedResponse
+from primming.pricewatcher.urlindex import url_index
+from primming.utils.cache import LRUCache
+
+# the response for urls without a page
+NOT_FOUND = b""
+
+
+def encode_scraper(page: Page) -> EncodedResponse:
+    """the stored response of the scraper of the page, versioned by the hash of the scraper
+
+    Pages created or changed without :py:meth:`Page.save` (bulk_create, update, loaddata) lack the
+    minified and compressed scraper, it is prepared on the fly for them.
+    """
+    if not page.scraper_minified or not page.scraper_gzip:
+        page.prepare_scraper()
+    return EncodedResponse(
+        page.scraper_hash,
+        Page.scraper_body(page.scraper_minified),
+        bytes(page.scraper_gzip),
+        None if page.scraper_brotli is None else bytes(page.scraper_brotli),
+    )
+
+
+class ScraperCache:
+    """The encoded scraper responses by page id, kept in an in-process LRU in
+    front of the shared django cache. Urls are resolved to their page with the
+    :py:data:`~primming.pricewatcher.urlindex.url_index`, urls without a page get
+    :py:data:`NOT_FOUND`.
+
+    Entries are invalidated by the signal handlers in :py:mod:`primming.pricewatcher.signals`
+    whenever a page is saved or deleted. Other processes only drop their in-process entries once
+    they expire, hence the short timeout of the LRU.
+    """
+
+    key_prefix = "pricewatcher:scraper"
+
+    def __init__(self, maxsize: int, local_timeout: int, timeout: int):
+        """
+        :param maxsize: the number of pages in the in-process LRU
+        :param local_timeout: seconds an entry stays in the in-process LRU
+        :param timeout: seconds a scraper stays in the shared cache
+        """
+        self.timeout = timeout
+        self._local = LRUCache(maxsize, local_timeout)
+
+    def cache_key(self, page_id: int) -> str:
+        """the key in the shared cache"""
+        return "%s:%d" % (self.key_prefix, page_id)
+
+    @staticmethod
+    def load(page_id: int) -> Union[EncodedResponse, bytes]:
+        """the response for the page from the database"""
+        page = Page.objects.filter(id=page_id).only(*Page.SCRAPER_FIELDS).first()
+        if not page:
+            return NOT_FOUND
+        return encode_scraper(page)
+
+    def get_local(self, url: str) -> Optional[Union[EncodedResponse, bytes]]:
+        """the response for the url from the in-process caches, None if it isn't cached
+
+        Doesn't do any I/O, so it is safe to call from the event loop.
+        """
+        trie = url_index.get_local()
+        if trie is None:
+            return None
+        page_id = trie.resolve(url)
+        if page_id is None:
+            return NOT_FOUND
+        return self._local.get(page_id)
+
+    def fetch(self, url: str) -> Union[EncodedResponse, bytes]:
+        """the response for the url from the shared cache or the database"""
+        page_id = url_index.resolve(url)
+        if page_id is None:
+            return NOT_FOUND
+
+        cache_key = self.cache_key(page_id)
+        encoded = cache.get(cache_key)
+        if encoded is None:
+            encoded = self.load(page_id)
+            cache.set(cache_key, encoded, self.timeout)
+
+        self._local.set(page_id, encoded)
+        return encoded
+
+    def get(self, url: str) -> Union[EncodedResponse, bytes]:
+        """the response for the url, :py:data:`NOT_FOUND` if there is no page for it"""
+        encoded = self.get_local(url)
+        if encoded is None:
+            encoded = self.fetch(url)
+        return encoded
+
+    def prime(self) -> int:
+        """load the scrapers of the enabled pages into both caches, as many as the in-process LRU
+        holds
+
+        :returns: the number of scrapers loaded
+        """
+        pages = Page.objects.filter(enabled=True).only("id", *Page.SCRAPER_FIELDS)
+        entries = {}
+        for page in pages.order_by("id")[: self._local.maxsize]:
+            encoded = encode_scraper(page)
+            self._local.set(page.id, encoded)
+            entries[self.cache_key(page.id)] = encoded
+        cache.set_many(entries, self.timeout)
+        return len(entries)
+
+    def invalidate(self, page_id: int):
+        """drop the cached response of the page"""
+        self._local.delete(page_id)
+        cache.delete(self.cache_key(page_id))
+
+    def clear(self):
+        """drop the in-process cache"""
+        self._local.clear()
+
+
+class ScraperVersionCache:
+    """The encoded scraper responses by the hash of the scraper, kept in an
+    in-process LRU in front of the shared django cache.
+
+    The scraper of a hash never changes, so the entries are never invalidated. Unknown hashes are
+    cached for a short time only, since a page can get that scraper later on.
+    """
+
+    key_prefix = "pricewatcher:scraper-version"
+
+    def __init__(self, maxsize: int, timeout: int, negative_timeout: int):
+        """
+        :param maxsize: the number of scrapers in the in-process LRU
+        :param timeout: seconds a scraper stays in the shared cache
+        :param negative_timeout: seconds an unknown hash stays in the shared cache
+        """
+        self.timeout = timeout
+        self.negative_timeout = negative_timeout
+        self._local = LRUCache(maxsize)
+
+    def cache_key(self, scraper_hash: str) -> str:
+        """the key in the shared cache"""
+        return "%s:%s" % (self.key_prefix, scraper_hash)
+
+    @staticmethod
+    def load(scraper_hash: str) -> Union[EncodedResponse, bytes]:
+        """the response for the hash from the database"""
+        page = Page.objects.filter(scraper_hash=scraper_hash).only(*Page.SCRAPER_FIELDS).first()
+        if not page:
+            return NOT_FOUND
+        return encode_scraper(page)
+
+    def get_local(self, scraper_hash: str) -> Optional[Union[EncodedResponse, bytes]]:
+        """the response for the hash from the in-process LRU, None if it isn't cached there
+
+        Doesn't do any I/O, so it is safe to call from the event loop.
+        """
+        return self._local.get(scraper_hash)
+
+    def fetch(self, scraper_hash: str) -> Union[EncodedResponse, bytes]:
+        """the response for the hash from the shared cache or the database"""
+        cache_key = self.cache_key(scraper_hash)
+        encoded = cache.get(cache_key)
+        if encoded is None:
+            encoded = self.load(scraper_hash)
+            cache.set(cache_key, encoded, self.timeout if encoded else self.negative_timeout)
+
+        if encoded:
+            self._local.set(scraper_hash, encoded)
+        return encoded
+
+    def prime(self) -> int:
+        """load the scrapers of the enabled pages into both caches, as many as the in-process LRU
+        holds
+
+        :returns: the number of scrapers loaded
+        """
+        pages = Page.objects.filter(enabled=True).only(*Page.SCRAPER_FIELDS)
+        entries = {}
+        for page in pages.order_by("id")[: self._local.maxsize]:
+            if page.scraper_hash not in entries:
+                entries[page.scraper_hash] = encode_scraper(page)
+                self._local.set(page.scraper_hash, entries[page.scraper_hash])
+        cache.set_many(
+            {self.cache_key(scraper_hash): entry for scraper_hash, entry in entries.items()},
+            self.timeout,
+        )
+        return len(entries)
+
+    def get(self, scraper_hash: str) -> Union[EncodedResponse, bytes]:
+        """the response for the hash, :py:data:`NOT_FOUND` if no page has that scraper"""
+        encoded = self.get_local(scraper_hash)
+        if encoded is None:
+            encoded = self.fetch(scraper_hash)
+        return encoded
+
+    def clear(self):
+        """drop the in-process cache"""
+        self._local.clear()
+
+
+scraper_cache = ScraperCache(
+    settings.SCRAPER_CACHE_SIZE,
+    settings.SCRAPER_CACHE_LOCAL_TIMEOUT,
+    settings.SCRAPER_CACHE_TIMEOUT,
+)
+scraper_version_cache = ScraperVersionCache(
+    settings.SCRAPER_VERSION_CACHE_SIZE,
+    settings.SCRAPER_VERSION_CACHE_TIMEOUT,
+    settings.SCRAPER_VERSION_CACHE_NEGATIVE_TIMEOUT,
+)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Invalidate the caches of the pricewatcher when the data behind them changes and record the changes
+of the page lists. Connected in :py:meth:`primming.pricewatcher.apps.PricewatcherConfig.ready`.
+
+Bulk operations (``QuerySet.update()``, ``bulk_create()``) don't send signals. The cached responses
+expire on their own after such changes, the url index and the webstore redirects are only loaded
+again after the next change that does send a signal, and the changes of the page lists are not
+recorded.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from primming.pricewatcher.models import BrowserMake
+from primming.pricewatcher.models import BrowserRedirect
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PageList
+from primming.pricewatcher.models import PageListChange
+from primming.pricewatcher.pagelists import bundle_cache
+from primming.pricewatcher.pagelists import pagelist_cache
+from primming.pricewatcher.publisher import publisher
+from primming.pricewatcher.redirects import webstore_redirects
+from primming.pricewatcher.scrapers import scraper_cache
+from primming.pricewatcher.urlindex import url_index
+
+
+@receiver(pre_save, sender=Page)
+def remember_stored_page(sender, instance: Page, **kwargs):
+    """remember the url, enabled flag and scraper the page has in the database for the post_save
+    handlers"""
+    instance._stored = None
+    if instance.pk is not None:
+        stored = Page.objects.filter(pk=instance.pk).values("url", "enabled", "scraper_hash")
+        instance._stored = stored.first()
+
+
+@receiver(post_save, sender=Page)
+def update_saved_page(sender, instance: Page, **kwargs):
+    """drop the cached scraper of the page and move it to its new url in the url index"""
+    stored = getattr(instance, "_stored", None)
+    page_id, old_url, new_url = instance.pk, stored and stored["url"], instance.url
+
+    def update():
+        scraper_cache.invalidate(page_id)
+        if old_url != new_url:
+            url_index.update(page_id, old_url, new_url)
+
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Page)
+def update_deleted_page(sender, instance: Page, **kwargs):
+    """drop the cached scraper of the page and remove it from the url index"""
+    page_id, url = instance.pk, instance.url
+
+    def update():
+        scraper_cache.invalidate(page_id)
+        url_index.update(page_id, url, None)
+
+    transaction.on_commit(update)
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+@receiver(post_save, sender=PageList)
+@receiver(post_delete, sender=PageList)
+@receiver(m2m_changed, sender=PageList.pages.through)
+def invalidate_page_lists(sender, **kwargs):
+    """drop the cached page lists and scraper bundles, a page might be part of any of them, and
+    publish them again"""
+    transaction.on_commit(pagelist_cache.invalidate)
+    transaction.on_commit(bundle_cache.invalidate)
+    transaction.on_commit(publisher.schedule)
+
+
+@receiver(post_save, sender=Page)
+def record_page_change(sender, instance: Page, created: bool, **kwargs):
+    """record the change of the page in its lists if it was enabled, disabled or its url or
+    scraper changed"""
+    stored = getattr(instance, "_stored", None)
+    if created or stored is None:
+        return
+
+    if stored["enabled"] != instance.enabled:
+        action = PageListChange.Action.ADDED if instance.enabled else PageListChange.Action.REMOVED
+    elif stored["url"] != instance.url or stored["scraper_hash"] != instance.scraper_hash:
+        action = PageListChange.Action.CHANGED
+    else:
+        return
+    PageListChange.record(instance.lists.values_list("id", flat=True), [instance.pk], action)
+
+
+@receiver(pre_delete, sender=Page)
+def record_page_removal(sender, instance: Page, **kwargs):
+    """record the removal of a deleted page from its lists, its memberships are deleted without
+    a m2m_changed signal"""
+    PageListChange.record(
+        instance.lists.values_list("id", flat=True),
+        [instance.pk],
+        PageListChange.Action.REMOVED,
+    )
+
+
+@receiver(m2m_changed, sender=PageList.pages.through)
+def record_membership_change(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    """record pages added to or removed from lists, from either side of the relation"""
+    if action == "pre_clear":
+        related = instance.lists if reverse else instance.pages
+        instance._cleared = set(related.values_list("id", flat=True))
+        return
+    elif action == "post_clear":
+        pk_set = instance._cleared
+        change = PageListChange.Action.REMOVED
+    elif action == "post_add":
+        change = PageListChange.Action.ADDED
+    elif action == "post_remove":
+        change = PageListChange.Action.REMOVED
+    else:
+        return
+
+    if reverse:
+        PageListChange.record(pk_set, [instance.pk], change)
+    else:
+        PageListChange.record([instance.pk], pk_set, change)
+
+
+@receiver(post_save, sender=BrowserRedirect)
+@receiver(post_delete, sender=BrowserRedirect)
+@receiver(post_save, sender=BrowserMake)
+@receiver(post_delete, sender=BrowserMake)
+def invalidate_webstore_redirects(sender, **kwargs):
+    """drop the redirect table of all processes"""
+    transaction.on_commit(webstore_redirects.invalidate)
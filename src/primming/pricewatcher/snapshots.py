@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Immutable daily snapshots of the sample export, so the export of past days doesn't join the samples
+in the database again for every request.
+
+The samples of a day are written once the day is over, as compressed csv and json rows. An export
+of a date range is assembled from the files of its days, only the days without one (the current
+day) are queried. Clients which accept gzip get the compressed rows as they are stored, joined
+into a single gzip member (see :py:class:`primming.utils.compression.GzipJoin`).
+
+The persons are not snapshotted, their attributes change after they were created. The url of a
+sample is snapshotted as its page had it on the day the snapshot was written, while the export of
+days without one has the current url of the page.
+"""
+import csv
+import functools
+import json
+import logging
+import os
+import struct
+import tempfile
+import zlib
+from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from itertools import chain
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from django.conf import settings
+
+from primming.pricewatcher.api import SampleExportApiMixin
+from primming.pricewatcher.api import StreamingEchoBuffer
+from primming.pricewatcher.models import RawPriceReport
+from primming.pricewatcher.streams import PriceReportStream
+from primming.utils.asgi import buffered
+from primming.utils.compression import GZIP_HEADER
+from primming.utils.compression import DeflateFragment
+from primming.utils.compression import GzipJoin
+
+log = logging.getLogger(__name__)
+
+# the checksum and the length of the rows at the end of a snapshot
+FOOTER = struct.Struct("<IQ")
+
+
+class ExportFormat(NamedTuple):
+    """how the rows of the days are joined into the body of an export"""
+
+    extension: str
+    # before the rows of the first day, between the rows of two days and after the last rows
+    prefix: str
+    separator: str
+    suffix: str
+    # the body without any rows
+    empty: str
+
+
+class Snapshot(NamedTuple):
+    """the compressed rows of a day"""
+
+    path: Path
+    # of the compressed rows, without the footer
+    size: int
+    crc: int
+    length: int
+
+    @classmethod
+    def read(cls, path: Path) -> Optional["Snapshot"]:
+        """the snapshot stored in the file, None if there is none"""
+        try:
+            with path.open("rb") as f:
+                size = f.seek(0, os.SEEK_END) - FOOTER.size
+                if size < 0:
+                    # a day without samples
+                    return cls(path, 0, 0, 0)
+                f.seek(size)
+                return cls(path, size, *FOOTER.unpack(f.read(FOOTER.size)))
+        except FileNotFoundError:
+            return None
+
+    def chunks(self, first: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """the compressed rows from first up to end"""
+        chunk_size = settings.EXPORT_STREAM_CHUNK_SIZE
+        remaining = (self.size if end is None else end) - first
+        with self.path.open("rb") as f:
+            f.seek(first)
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise IOError("%s is shorter than expected" % self.path)
+                remaining -= len(chunk)
+                yield chunk
+
+
+# a snapshot of a day with samples, or the days from start to end to query
+Part = Union[Snapshot, Tuple[date, date]]
+
+
+def days(start: date, end: date) -> Iterator[date]:
+    """the days from start to end, both included"""
+    for offset in range((end - start).days + 1):
+        yield start + timedelta(days=offset)
+
+
+class SnapshotExport:
+    """The body of an export of a date range, assembled from the snapshots of its days.
+
+    Its length is only known if there is a snapshot for every day and the rows are sent as they
+    are stored, only then parts of the body can be requested (:py:meth:`chunks` with a range).
+    """
+
+    def __init__(
+        self,
+        snapshots: "ExportSnapshots",
+        content_type: str,
+        export_format: ExportFormat,
+        parts: List[Part],
+        gzipped: bool,
+    ):
+        """
+        :param snapshots: the snapshots, which query the days without one
+        :param content_type: the content type of the body
+        :param export_format: the format of the snapshots
+        :param parts: the snapshots with samples and the days to query, in order
+        :param gzipped: whether the body is sent gzip compressed
+        """
+        self.snapshots = snapshots
+        self.content_type = content_type
+        self.format = export_format
+        self.parts = parts
+        self.gzipped = gzipped
+
+    @functools.cached_property
+    def segments(self) -> Optional[List[Union[bytes, Snapshot]]]:
+        """the pieces of the gzipped body, None if some days are queried or it is decompressed
+
+        Joining the checksums of the snapshots takes a while for long ranges, hence the segments
+        are only computed once.
+        """
+        if not self.gzipped or any(not isinstance(part, Snapshot) for part in self.parts):
+            return None
+
+        join = GzipJoin()
+        segments = [GZIP_HEADER]
+        if not self.parts and self.format.empty:
+            segments.append(join.add_data(self.format.empty.encode("utf-8")))
+        for index, snapshot in enumerate(self.parts):
+            literal = self.format.separator if index else self.format.prefix
+            if literal:
+                segments.append(join.add_data(literal.encode("utf-8")))
+            segments.append(snapshot)
+            join.add(snapshot.crc, snapshot.length)
+        if self.parts and self.format.suffix:
+            segments.append(join.add_data(self.format.suffix.encode("utf-8")))
+        segments.append(join.trailer())
+        return segments
+
+    @staticmethod
+    def size(segment: Union[bytes, Snapshot]) -> int:
+        return segment.size if isinstance(segment, Snapshot) else len(segment)
+
+    @functools.cached_property
+    def length(self) -> Optional[int]:
+        """the length of the body, None if it isn't known in advance"""
+        if self.segments is None:
+            return None
+        return sum(self.size(segment) for segment in self.segments)
+
+    @functools.cached_property
+    def etag(self) -> Optional[str]:
+        """a strong ETag of the body if its length is known, the snapshots never change"""
+        if self.segments is None:
+            return None
+        # the trailer holds the checksum of the whole body
+        return '"%08x-%x"' % (zlib.crc32(self.segments[-1]), self.length)
+
+    def chunks(self, first: int = 0, last: Optional[int] = None) -> Iterator[bytes]:
+        """the body, or the bytes from first to last (both included) if its length is known"""
+        if self.segments is None:
+            yield from self.stream()
+            return
+
+        last = self.length - 1 if last is None else last
+        offset = 0
+        for segment in self.segments:
+            size = self.size(segment)
+            start = max(first - offset, 0)
+            end = min(last - offset + 1, size)
+            offset += size
+            if start >= end:
+                continue
+            if isinstance(segment, Snapshot):
+                yield from segment.chunks(start, end)
+            else:
+                yield segment[start:end]
+
+    def stream(self) -> Iterator[bytes]:
+        """the whole body, the separators are added once it is known whether the queried days
+        have any samples"""
+        join = GzipJoin() if self.gzipped else None
+        if join is not None:
+            yield GZIP_HEADER
+
+        def literal(text: str) -> Iterator[bytes]:
+            if text:
+                data = text.encode("utf-8")
+                yield data if join is None else join.add_data(data)
+
+        started = False
+        for part in self.parts:
+            chunks = self.part_chunks(part, join)
+            first_chunk = next(chunks, None)
+            if first_chunk is None:
+                continue
+            yield from literal(self.format.separator if started else self.format.prefix)
+            started = True
+            yield first_chunk
+            yield from chunks
+
+        yield from literal(self.format.suffix if started else self.format.empty)
+        if join is not None:
+            yield join.trailer()
+
+    def part_chunks(self, part: Part, join: Optional[GzipJoin]) -> Iterator[bytes]:
+        """the rows of the part, compressed if they are joined, nothing if there are none"""
+        if isinstance(part, Snapshot):
+            if join is not None:
+                yield from part.chunks()
+                join.add(part.crc, part.length)
+                return
+            decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+            for chunk in part.chunks():
+                yield decompressor.decompress(chunk)
+            return
+
+        rows = buffered(self.snapshots.rows(self.format, *part), settings.EXPORT_STREAM_CHUNK_SIZE)
+        if join is None:
+            yield from rows
+            return
+
+        first_chunk = next(rows, None)
+        if first_chunk is None:
+            return
+        fragment = DeflateFragment()
+        for chunk in chain([first_chunk], rows):
+            yield fragment.compress(chunk)
+        yield fragment.flush()
+        join.add(fragment.crc, fragment.length)
+
+
+class ExportSnapshots:
+    """Writes the daily snapshots of an export below the root directory:
+
+    * ``<name>/<yyyy-mm-dd>.csv.deflate``, the csv rows of the day without the header
+    * ``<name>/<yyyy-mm-dd>.json.deflate``, the json objects of the day, separated by commas
+
+    A file holds a :py:class:`primming.utils.compression.DeflateFragment` of the rows followed by
+    the checksum and the length of the rows (:py:data:`FOOTER`), the file of a day without
+    samples is empty. A day is only written once it is over and all of its reports were stored (see
+    :py:meth:`is_complete`), the files are never changed afterwards.
+    """
+
+    def __init__(self, exporter: SampleExportApiMixin, name: str, root: Optional[str]):
+        """
+        :param exporter: serializes the samples of a date range
+        :param name: the directory of the snapshots below the root
+        :param root: the directory of all snapshots, they are disabled if it is None
+        """
+        self.exporter = exporter
+        self.name = name
+        self.root = None if root is None else Path(root)
+
+    @property
+    def formats(self) -> Dict[str, ExportFormat]:
+        """the formats of the snapshots by their content type"""
+        header = csv.DictWriter(StreamingEchoBuffer(), self.exporter.csv_columns()).writeheader()
+        return {
+            self.exporter.MIME_TYPES_CSV[0]: ExportFormat("csv", header, "", "", ""),
+            self.exporter.MIME_TYPES_JSON[0]: ExportFormat("json", "[", ",", "]", "[]"),
+        }
+
+    def path(self, day: date, export_format: ExportFormat) -> Path:
+        name = "%s.%s.deflate" % (day.isoformat(), export_format.extension)
+        return self.root / self.name / name
+
+    def rows(self, export_format: ExportFormat, start: date, end: date) -> Iterator[str]:
+        """the serialized samples from start to end, without the prefix and suffix"""
+        samples = self.exporter.samples(start.isoformat(), end.isoformat())
+        if export_format.extension == "csv":
+            writer = csv.DictWriter(StreamingEchoBuffer(), self.exporter.csv_columns())
+            for sample in samples:
+                yield writer.writerow(sample)
+        else:
+            for index, sample in enumerate(samples):
+                yield ("," if index else "") + json.dumps(sample)
+
+    @staticmethod
+    def is_complete(day: date) -> bool:
+        """whether no more samples are added to the day
+
+        The samples are timestamped when the reports are received. Reports of the day may still
+        be waiting to be enriched (raw mode) or in the stream (stream mode), queued celery tasks
+        can't be checked, so the day is only complete settings.EXPORT_SNAPSHOT_DELAY seconds after
+        it ended. Days which are still incomplete by then are logged, their reports are stuck.
+        """
+        start = settings.PYTZ_ZONE.localize(datetime.combine(day, time()))
+        end = settings.PYTZ_ZONE.localize(datetime.combine(day + timedelta(days=1), time()))
+        delay = timedelta(seconds=settings.EXPORT_SNAPSHOT_DELAY)
+        if datetime.now(tz=settings.PYTZ_ZONE) < end + delay:
+            return False
+
+        if RawPriceReport.objects.filter(timestamp__gte=start, timestamp__lt=end).exists():
+            pending = "raw reports"
+        elif (
+            settings.PRICE_REPORT_INGEST_MODE == "stream"
+            and PriceReportStream().appended_between(start, end)
+        ):
+            pending = "reports in the stream"
+        else:
+            return True
+        log.warning("No snapshot of %s, there are still %s of the day", day, pending)
+        return False
+
+    def write(self, day: date) -> int:
+        """write the missing snapshots of the day
+
+        :returns: the number of files written
+        """
+        written = 0
+        for export_format in self.formats.values():
+            path = self.path(day, export_format)
+            if path.exists():
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    fragment = DeflateFragment()
+                    rows = self.rows(export_format, day, day)
+                    for chunk in buffered(rows, settings.EXPORT_STREAM_CHUNK_SIZE):
+                        f.write(fragment.compress(chunk))
+                    if fragment.length:
+                        f.write(fragment.flush())
+                        f.write(FOOTER.pack(fragment.crc, fragment.length))
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            written += 1
+        return written
+
+    def write_missing(self, days_back: int) -> int:
+        """write the snapshots of the completed days of the last days_back days which have none
+
+        :returns: the number of files written
+        """
+        today = datetime.now(tz=settings.PYTZ_ZONE).date()
+        written = 0
+        for day in days(today - timedelta(days=days_back), today):
+            if self.is_complete(day):
+                written += self.write(day)
+        log.info("Wrote %d export snapshots", written)
+        return written
+
+    def export(
+        self, content_type: str, start: date, end: date, gzipped: bool
+    ) -> Optional[SnapshotExport]:
+        """the export of the date range, None if there are no snapshots of the content type"""
+        export_format = self.formats.get(content_type)
+        if export_format is None:
+            return None
+
+        today = datetime.now(tz=settings.PYTZ_ZONE).date()
+        parts = []
+        for day in days(start, end):
+            snapshot = Snapshot.read(self.path(day, export_format))
+            if snapshot is not None:
+                if snapshot.length:
+                    parts.append(snapshot)
+                continue
+            # consecutive days without snapshots are queried together
+            if parts and not isinstance(parts[-1], Snapshot):
+                parts[-1] = (parts[-1][0], day)
+            else:
+                parts.append((day, day))
+            if day >= today:
+                # there are no samples after today, the rest is queried along with today
+                parts[-1] = (parts[-1][0], end)
+                break
+
+        return SnapshotExport(self, content_type, export_format, parts, gzipped)
+
+
+sample_snapshots = ExportSnapshots(
+    SampleExportApiMixin(), "samples", settings.EXPORT_SNAPSHOT_ROOT
+)
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Redis stream based ingestion of price reports, an alternative to one celery task per report.
+
+The web process appends each validated report to a stream, a consumer group worker (see the
+``consume_price_reports`` management command) reads them in batches and stores each batch with
+one transaction. Entries are only acknowledged after the transaction has been committed, entries
+of a crashed consumer or of a failed transaction stay pending and are reclaimed by the consumers
+after a while. Entries which were delivered too often are moved to a dead letter stream.
+"""
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from django.conf import settings
+from django.db import InterfaceError
+from django.db import OperationalError
+from django.db import close_old_connections
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from primming.pricewatcher.ingest import PriceReport
+from primming.pricewatcher.ingest import store_reports
+
+log = logging.getLogger(__name__)
+
+StreamEntry = Tuple[bytes, Mapping[bytes, bytes]]
+
+# errors of the connection rather than of the report, the entries are retried later
+UNAVAILABLE = (InterfaceError, OperationalError)
+
+
+class PriceReportStream:
+    """Append price reports to a redis stream and consume them in batches"""
+
+    FIELD = b"report"
+
+    def __init__(
+        self,
+        name: str = None,
+        group: str = None,
+        connection=None,
+    ):
+        """
+        :param name: the key of the stream, defaults to settings.PRICE_REPORT_STREAM
+        :param group: the consumer group, defaults to settings.PRICE_REPORT_STREAM_GROUP
+        :param connection: the redis connection, defaults to the one of the default cache
+        """
+        self.name = name or settings.PRICE_REPORT_STREAM
+        self.group = group or settings.PRICE_REPORT_STREAM_GROUP
+        self.redis = connection or get_redis_connection("default")
+
+    def append(
+        self,
+        uuid: str,
+        data: Sequence[Mapping],
+        user_agent: str,
+        remote_ip: str,
+        timestamp: datetime = None,
+    ) -> bytes:
+        """append a report to the stream
+
+        :returns: the id of the stream entry
+        """
+        timestamp = timestamp or datetime.now(tz=settings.PYTZ_ZONE)
+        report = json.dumps([uuid, data, user_agent, remote_ip, timestamp.isoformat()])
+        return self.redis.xadd(self.name, {self.FIELD: report})
+
+    def create_group(self):
+        """create the consumer group (and the stream) unless it exists already"""
+        try:
+            self.redis.xgroup_create(self.name, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def decode(self, entry: StreamEntry) -> Optional[PriceReport]:
+        """decode the report of a stream entry, None if it is malformed"""
+        entry_id, fields = entry
+        try:
+            uuid, data, user_agent, remote_ip, timestamp = json.loads(fields[self.FIELD])
+            return PriceReport(
+                uuid, data, user_agent, remote_ip, datetime.fromisoformat(timestamp)
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            log.error("Dropping malformed stream entry %s: %s", entry_id, e)
+            return None
+
+    def ack(self, entry_ids: Sequence[bytes]):
+        """acknowledge the entries and remove them from the stream"""
+        if not entry_ids:
+            return
+        pipe = self.redis.pipeline()
+        pipe.xack(self.name, self.group, *entry_ids)
+        pipe.xdel(self.name, *entry_ids)
+        pipe.execute()
+
+    def process(self, entries: Sequence[StreamEntry]) -> int:
+        """store the reports of the entries together and acknowledge them after the commit
+
+        If the batch cannot be stored, the reports are stored one by one so a single broken
+        report does not block the others. Malformed entries and reports which can't be stored at
+        all are logged and acknowledged, just like a failing celery task would be dropped. Entries
+        which failed because the database is unavailable are left pending, they are retried once
+        they are reclaimed.
+
+        :returns: the number of stored samples
+        """
+        reports = [(entry[0], self.decode(entry)) for entry in entries]
+        done = [entry_id for entry_id, report in reports if report is None]
+        valid = [(entry_id, report) for entry_id, report in reports if report is not None]
+
+        try:
+            count = store_reports(report for _, report in valid)
+            done.extend(entry_id for entry_id, _ in valid)
+        except UNAVAILABLE:
+            log.exception("Could not store batch of %d reports, leaving them pending", len(valid))
+            count = 0
+        except Exception:
+            log.exception("Could not store batch of %d reports, retrying one by one", len(valid))
+            count = 0
+            for entry_id, report in valid:
+                try:
+                    count += store_reports([report])
+                except UNAVAILABLE:
+                    log.exception("Could not store report %s, leaving the rest pending", entry_id)
+                    break
+                except Exception:
+                    log.exception("Dropping report %s of %s", entry_id, report.uuid)
+                done.append(entry_id)
+
+        self.ack(done)
+        return count
+
+    def oldest(self) -> Optional[datetime]:
+        """when the oldest entry still in the stream (not stored yet) was appended"""
+        entries = self.redis.xrange(self.name, count=1)
+        if not entries:
+            return None
+        milliseconds = int(entries[0][0].split(b"-")[0])
+        return datetime.fromtimestamp(milliseconds / 1000, tz=settings.PYTZ_ZONE)
+
+    def appended_between(self, start: datetime, end: datetime) -> bool:
+        """whether entries appended from start until before end are still in the stream"""
+        # the ids of the entries start with the milliseconds when they were appended
+        first = int(start.timestamp() * 1000)
+        last = int(end.timestamp() * 1000) - 1
+        return bool(self.redis.xrange(self.name, min=first, max=last, count=1))
+
+    def read(
+        self, consumer: str, count: int, block: int, pending: bool = False, after: bytes = b"0"
+    ) -> List:
+        """read up to count entries for the consumer
+
+        :param pending: read the entries delivered to this consumer but never acknowledged
+            instead of new ones
+        :param after: read the pending entries after this id
+        :param block: milliseconds to wait for new entries
+        """
+        response = self.redis.xreadgroup(
+            self.group,
+            consumer,
+            {self.name: after if pending else ">"},
+            count=count,
+            block=None if pending else block,
+        )
+        # pending entries which have been deleted in the meantime come without fields
+        return [entry for entry in response[0][1] if entry[1]] if response else []
+
+    def reclaim(self, consumer: str, min_idle: int, count: int) -> List[StreamEntry]:
+        """claim entries of other consumers which have been pending for at least min_idle ms"""
+        response = self.redis.xautoclaim(
+            self.name, self.group, consumer, min_idle, start_id="0-0", count=count
+        )
+        # redis >= 7 appends the ids of deleted entries
+        return [entry for entry in response[1] if entry[1] is not None]
+
+    def dead_letter(self, entries: Sequence[StreamEntry]) -> List[StreamEntry]:
+        """move the entries which were delivered too often to the dead letter stream
+
+        Entries fail again and again if the database is unavailable for a long time, or if
+        a report keeps failing with an error mistaken for that. The dead letters are kept in the
+        ``<name>:dead`` stream, so they can be appended again once the cause is fixed.
+
+        :returns: the other entries
+        """
+        if not entries:
+            return []
+        pipe = self.redis.pipeline()
+        for entry_id, _ in entries:
+            pipe.xpending_range(self.name, self.group, entry_id, entry_id, 1)
+        deliveries = {p["message_id"]: p["times_delivered"] for r in pipe.execute() for p in r}
+        max_deliveries = settings.PRICE_REPORT_STREAM_MAX_DELIVERIES
+
+        dead = [entry for entry in entries if deliveries.get(entry[0], 0) > max_deliveries]
+        if not dead:
+            return list(entries)
+        for entry_id, fields in dead:
+            log.error("Moving stream entry %s to the dead letters, delivered too often", entry_id)
+            self.redis.xadd(self.dead_letters, {**fields, b"id": entry_id})
+        self.ack([entry_id for entry_id, _ in dead])
+        return [entry for entry in entries if entry not in dead]
+
+    @property
+    def dead_letters(self) -> str:
+        """the key of the dead letter stream"""
+        return "%s:dead" % self.name
+
+    def consume(
+        self,
+        consumer: str,
+        batch_size: int = None,
+        block: int = None,
+        min_idle: int = None,
+        stop: threading.Event = None,
+    ):
+        """consume the stream until stop is set
+
+        :param consumer: the name of this consumer, must be unique within the group
+        :param batch_size: the maximum number of reports stored together
+        :param block: milliseconds to wait for new entries before checking for stale ones
+        :param min_idle: milliseconds after which entries of other consumers are reclaimed
+        :param stop: event to end the loop
+        """
+        batch_size = batch_size or settings.PRICE_REPORT_STREAM_BATCH_SIZE
+        block = block or settings.PRICE_REPORT_STREAM_BLOCK
+        min_idle = min_idle or settings.PRICE_REPORT_STREAM_RECLAIM_IDLE
+        stop = stop or threading.Event()
+
+        self.create_group()
+
+        # entries this consumer has read before it was restarted, each of them once
+        after = b"0"
+        while not stop.is_set():
+            entries = self.read(consumer, batch_size, block, pending=True, after=after)
+            if not entries:
+                break
+            after = entries[-1][0]
+            log.info("Processing %d pending entries", len(entries))
+            self._process(self.dead_letter(entries), block, stop)
+
+        while not stop.is_set():
+            entries = self.read(consumer, batch_size, block)
+            if not entries:
+                entries = self.dead_letter(self.reclaim(consumer, min_idle, batch_size))
+                if entries:
+                    log.info("Reclaimed %d stale entries", len(entries))
+            if entries:
+                count = self._process(entries, block, stop)
+                log.debug("Stored %d samples of %d reports", count, len(entries))
+
+    def _process(self, entries: Sequence[StreamEntry], block: int, stop: threading.Event) -> int:
+        """process the entries, wait a while if none of them could be stored"""
+        if not entries:
+            return 0
+        close_old_connections()
+        count = self.process(entries)
+        if not count:
+            # e.g. the database is unavailable, don't retry right away
+            stop.wait(block / 1000)
+        return count
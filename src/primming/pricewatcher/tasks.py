@@ -5,17 +5,16 @@
 # defined in file 'LICENSE', which is part of this source code package.
 import logging
 from datetime import datetime
+from datetime import timedelta
 from typing import Mapping
 from typing import Sequence
 
-import geoip2.errors
 from django.conf import settings
 
-from ecciuvo.price import clean_price
-from primming.pricewatcher.models import GeoIPLocation
-from primming.pricewatcher.models import Page
-from primming.pricewatcher.models import PriceSample
-from primming.pricewatcher.models import UserAgent
+from primming.pricewatcher.ingest import PriceReport
+from primming.pricewatcher.ingest import enrich_raw_reports
+from primming.pricewatcher.ingest import store_reports
+from primming.pricewatcher.models import PageListChange
 from primming.utils.celery import AutoRegisterTask
 
 log = logging.getLogger(__name__)
@@ -24,48 +23,56 @@ log = logging.getLogger(__name__)
 class PriceLoggerTask(AutoRegisterTask):
     """store the price samples submitted by the user"""
 
-    def _price_ok(self, price, scraped_page):
-        """check if the price makes sense"""
-        if not price or not isinstance(price, dict):
-            log.warning("Price is missing for: %s", scraped_page)
-            price_value = None
-        else:
-            price_value = price.get("value")
+    def run(self, uuid: str, data: Sequence[Mapping], user_agent: str, remote_ip: str):
+        """log the price samples as submitted by the extension
 
-        if not price_value:
-            log.warning("Price on %s could not be parsed: %s", scraped_page["url"], price)
-            return False
-        return True
+        The pages of the report are resolved with the in-process url index and the samples are
+        written with one multi-row insert, so a report costs a constant number of round trips to
+        the database.
+        """
+        count = store_reports([PriceReport(uuid, data, user_agent, remote_ip)])
+        log.info("Added %d samples for %s", count, uuid)
 
-    def run(self, uuid: str, data: Sequence[Mapping], user_agent: str, remote_ip: str):
-        """log the price sample as submitted by the extension"""
-        user_agent = UserAgent.from_ua_string(user_agent)
-        timestamp = datetime.now(tz=settings.PYTZ_ZONE)
-
-        try:
-            location = GeoIPLocation.from_ipaddress(remote_ip)
-        except (geoip2.errors.GeoIP2Error, KeyError, AttributeError):
-            location = None
-
-        for scraped_page in data:
-            try:
-                page = Page.objects.get(url=scraped_page["url"])
-
-                price = scraped_page.get("price")
-                if not self._price_ok(price, scraped_page):
-                    continue
-
-                price, currency = clean_price(price.get("value"), price.get("curr"))
-                sample = PriceSample(
-                    timestamp=timestamp,
-                    uuid=uuid,
-                    agent=user_agent,
-                    page=page,
-                    currency=currency,
-                    price=price,
-                    location=location,
-                )
-                sample.save()
-                log.info("Added sample: %s", sample)
-            except Page.DoesNotExist as e:
-                log.error("Got event for unknown page: ", e)
+
+class EnrichRawReportsTask(AutoRegisterTask):
+    """turn the raw reports stored by the "raw" ingest mode into price samples"""
+
+    def run(self, batch_size: int = None, max_batches: int = None):
+        """process batches of raw reports until there are none left or max_batches is reached"""
+        batch_size = batch_size or settings.RAW_REPORT_BATCH_SIZE
+        max_batches = max_batches or settings.RAW_REPORT_MAX_BATCHES
+
+        for _ in range(max_batches):
+            if enrich_raw_reports(batch_size) < batch_size:
+                break
+
+
+class PrunePageListChangesTask(AutoRegisterTask):
+    """delete the page list changes older than settings.PAGELIST_CHANGES_MAX_AGE"""
+
+    def run(self):
+        """extensions with an older revision of a list get the full list"""
+        max_age = timedelta(seconds=settings.PAGELIST_CHANGES_MAX_AGE)
+        PageListChange.prune(datetime.now(tz=settings.PYTZ_ZONE) - max_age)
+
+
+class PublishStaticTask(AutoRegisterTask):
+    """write the page lists and scraper bundles for the nginx proxy"""
+
+    def run(self):
+        # the publisher depends on the api, which depends on the tasks
+        from primming.pricewatcher.publisher import publisher
+
+        publisher.publish()
+
+
+class WriteExportSnapshotsTask(AutoRegisterTask):
+    """write the daily snapshots of the sample export for the days which are over"""
+
+    def run(self, days: int = None):
+        """look back days days for completed days without a snapshot"""
+        # the snapshots depend on the api, which depends on the tasks
+        from primming.pricewatcher.snapshots import sample_snapshots
+
+        if sample_snapshots.root is not None:
+            sample_snapshots.write_missing(days or settings.EXPORT_SNAPSHOT_DAYS)
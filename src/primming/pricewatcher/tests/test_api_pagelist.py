@@ -59,3 +59,13 @@ class PageListViewMixinTestCase(TestCase):
 
         self.assertTrue(self._containsPage(ld_1, self.page1))
         self.assertTrue(self._containsPage(ld_1, self.page2))
+
+    def test_serialize_list_without_hash(self):
+        """pages stored without Page.save get their scraper hash on the fly"""
+        Page.objects.filter(id=self.page1.id).update(scraper="$price=1", scraper_hash="")
+        ld_1 = plvam.serialize_list("list1")
+
+        scraper_hash = Page.hash_scraper("$price=1")
+        scrapers = {page["id"]: page["scraper"] for page in ld_1["pages"]}
+        self.assertIn("/%s" % scraper_hash, scrapers[self.page1.id])
+        self.assertEqual(Page.objects.get(id=self.page1.id).scraper_hash, scraper_hash)
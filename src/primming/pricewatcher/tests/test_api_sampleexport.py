@@ -4,6 +4,7 @@ from unittest import TestCase
 
 import pytest
 from django.conf import settings
+from django.test import override_settings
 
 from primming.pricewatcher.api import SampleExportApiMixin
 from primming.pricewatcher.models import Browser
@@ -225,6 +226,30 @@ class SampleExportApiMixinTestCase(TestCase):
             },
         )
 
+    @pytest.mark.django_db
+    def test_samples_chunked(self):
+        """
+        tests :py:class:`primming.pricewatcher.api.SampleExportApiMixin.rows` over several chunks
+        """
+        for day in range(1, 6):
+            self.sample.pk = None
+            self.sample.timestamp = datetime(2051, 7, day, 12, tzinfo=settings.PYTZ_ZONE)
+            self.sample.save()
+        # without a location
+        self.sample.pk = None
+        self.sample.location = None
+        self.sample.save()
+
+        with override_settings(SAMPLE_EXPORT_CHUNK_SIZE=2):
+            samples = list(self.testee.samples("2051-07-01", "2051-07-05"))
+
+        expected = PriceSample.objects.filter(timestamp__year=2051).order_by("id")
+        self.assertListEqual(
+            [sample["id"] for sample in samples], [sample.id for sample in expected]
+        )
+        self.assertDictEqual(samples[0], self.testee.serialize(expected[0]))
+        self.assertIsNone(samples[-1]["postal_code"])
+
     @pytest.mark.django_db
     def test_to_csv(self):
         """
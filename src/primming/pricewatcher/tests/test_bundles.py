@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import gzip
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from primming.pricewatcher.api import ScraperBundleApiMixin
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PageList
+from primming.pricewatcher.pagelists import bundle_cache
+from primming.utils.api.exceptions import NotFoundException
+
+
+class ScraperBundleTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.views.ScraperBundleView`"""
+
+    def setUp(self):
+        cache.clear()
+        bundle_cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page1 = Page.objects.create(
+                name="one", url="https://one.example.com/", scraper="1"
+            )
+            self.page2 = Page.objects.create(
+                name="two", url="https://two.example.com/", scraper="2"
+            )
+            self.page3 = Page.objects.create(
+                name="three", url="https://three.example.com/", scraper="3", enabled=False
+            )
+            self.list1 = PageList.objects.create(name="list1", default=True)
+            self.list1.pages.add(self.page1, self.page2, self.page3)
+
+    def test_serialize_bundle(self):
+        bundle = ScraperBundleApiMixin.serialize_bundle("list1")
+        self.assertEqual(bundle["list"], self.list1.id)
+        self.assertEqual(bundle["scrapers"], {str(self.page1.id): "1", str(self.page2.id): "2"})
+        self.assertEqual(ScraperBundleApiMixin.serialize_bundle(), bundle)
+        self.assertRaises(NotFoundException, ScraperBundleApiMixin.serialize_bundle, "list2")
+
+    def test_serialize_bundle_not_prepared(self):
+        # stored without Page.save, e.g. by loaddata
+        Page.objects.filter(id=self.page2.id).update(scraper="$price = 2", scraper_minified="")
+        bundle = ScraperBundleApiMixin.serialize_bundle("list1")
+        self.assertEqual(
+            bundle["scrapers"], {str(self.page1.id): "1", str(self.page2.id): "$price=2"}
+        )
+
+    def test_get(self):
+        response = self.client.get("/watcher/api/1.0/scrapers/list1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(len(response.json()["scrapers"]), 2)
+
+        version = bundle_cache.get("list1").version
+        location = "/watcher/api/1.0/scrapers/%s/list1" % version
+        self.assertEqual(response["Content-Location"], location)
+        self.assertEqual(response["ETag"], '"%s"' % version)
+        self.assertEqual(response["Cache-Control"], "max-age=900")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(location, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))["scrapers"]), 2)
+
+        response = self.client.get(location, HTTP_IF_NONE_MATCH='"%s"' % version)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_per_encoding(self):
+        """the identity and the gzipped bundle have different ETags, compared weakly"""
+        url = "/watcher/api/1.0/scrapers/list1"
+        version = self.client.get(url).get("ETag").strip('"')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], '"%s-gz"' % version)
+
+        # a cache must not answer with its gzipped body if the client doesn't accept it
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"%s-gz"' % version)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response)
+
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH='W/"%s-gz"' % version
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], '"%s-gz"' % version)
+
+    def test_default_list(self):
+        response = self.client.get("/watcher/api/1.0/scrapers/")
+        self.assertEqual(response.status_code, 200)
+        location = response["Content-Location"]
+        self.assertEqual(
+            location, "/watcher/api/1.0/scrapers/%s/" % bundle_cache.get(None).version
+        )
+        self.assertEqual(self.client.get(location).json(), response.json())
+
+    def test_outdated_version(self):
+        old = self.client.get("/watcher/api/1.0/scrapers/list1")["Content-Location"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page1.scraper = "one"
+            self.page1.save()
+
+        response = self.client.get(old)
+        self.assertEqual(response.status_code, 302)
+        self.assertNotEqual(response["Location"], old)
+        self.assertEqual(
+            self.client.get(response["Location"]).json()["scrapers"][str(self.page1.id)], "one"
+        )
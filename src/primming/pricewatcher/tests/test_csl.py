@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from django.test import SimpleTestCase
+
+from primming.pricewatcher.csl import CslSyntaxError
+from primming.pricewatcher.csl import minify
+
+SCRAPER = r"""
+// Desktop
+$title = trim(sizzle('h1[itemprop="name"]:first', 'textContent'))
+$price = $price or re(/:\s*(.*)/, 'i', sizzle('.price // not a comment'))  // a comment
+
+if (re(/(Wäsche\/Bademode|[/]Schuhe)/, "i", $breadcrumbs)) {
+  $searchtype = 'image'
+}
+$count = $a / 2 / $b
+$negative = - 1
+
+require $price, $title
+"""
+
+MINIFIED = r"""$title=trim(sizzle('h1[itemprop="name"]:first','textContent'))
+$price=$price or re(/:\s*(.*)/,'i',sizzle('.price // not a comment'))
+if (re(/(Wäsche\/Bademode|[/]Schuhe)/,"i",$breadcrumbs)){
+$searchtype='image'
+}
+$count=$a / 2 / $b
+$negative= - 1
+require $price,$title"""
+
+
+class MinifyTestCase(SimpleTestCase):
+    """tests for :func:`primming.pricewatcher.csl.minify`"""
+
+    def test_minify(self):
+        self.assertEqual(minify(SCRAPER), MINIFIED)
+        self.assertEqual(minify(SCRAPER.replace("\n", "\r\n")), MINIFIED)
+        self.assertEqual(minify(MINIFIED), MINIFIED)
+        self.assertEqual(minify(""), "")
+
+    def test_regex_after_keyword(self):
+        self.assertEqual(minify("return /a, ( b )/.test(x);"), "return /a, ( b )/.test(x);")
+        self.assertEqual(minify("$a = typeof /a b/"), "$a=typeof /a b/")
+        self.assertEqual(minify("$a = $b or /a, b/.test($c)"), "$a=$b or /a, b/.test($c)")
+
+    def test_regex_after_condition(self):
+        self.assertEqual(minify("if (x) /[ , ]+/.exec(y)"), "if (x)/[ , ]+/.exec(y)")
+        self.assertEqual(minify("while ($a) /a b/.exec($b)"), "while ($a)/a b/.exec($b)")
+        # a division after other parentheses
+        self.assertEqual(minify("$a = ($b) / 2 / $c"), "$a=($b)/ 2 / $c")
+
+    def test_undecided(self):
+        # a slash after a block is a regex literal if it can be one, a division otherwise
+        self.assertEqual(minify("{\n}/ 2"), "{\n}/ 2")
+        self.assertEqual(minify("{\n} /a b/.exec($b)"), "{\n}/a b/.exec($b)")
+
+    def test_syntax_errors(self):
+        for scraper, message in (
+            ("$a = 'text", "unterminated string on line 1"),
+            ('\n$a = "text\n"', "unterminated string on line 2"),
+            ("$a = re(/[a/, 'i', $b)", "unterminated regex on line 1"),
+            ("$a = trim(sizzle('a')\n", "unclosed '(' on line 1"),
+            ("if ($a) {\n$b = 1)\n}", "unbalanced ')' on line 2"),
+        ):
+            with self.assertRaisesMessage(CslSyntaxError, message):
+                minify(scraper)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import base64
+import json
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.test import override_settings
+from django_redis import get_redis_connection
+
+from primming.pricewatcher.api import SampleExportApiMixin
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PriceSample
+
+URL = "/watcher/api/1.0/export/samples"
+AUTHORIZATION = "Basic %s" % base64.b64encode(b"ait:boOk7laD7keLlgEe").decode("ascii")
+
+
+@override_settings(SAMPLE_EXPORT_CHUNK_SIZE=3, SAMPLE_EXPORT_CURSOR_GRACE=0)
+class ExportCursorTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.views.ExportSamplesSinceApiView`"""
+
+    def setUp(self):
+        cache.clear()
+        page = Page.objects.create(name="shop", url="https://shop.example.com/", scraper="1")
+        PriceSample.objects.bulk_create(
+            PriceSample(
+                timestamp=datetime(2051, 7, day, 12, tzinfo=settings.PYTZ_ZONE),
+                price=100 * day,
+                currency="EUR",
+                page=page,
+                uuid="60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE",
+            )
+            for day in range(1, 11)
+        )
+        self.ids = list(PriceSample.objects.order_by("id").values_list("id", flat=True))
+
+    def get(self, **params):
+        response = self.client.get(URL, params, HTTP_AUTHORIZATION=AUTHORIZATION)
+        if response.status_code == 200:
+            response.samples = json.loads(b"".join(response.streaming_content))
+        return response
+
+    def test_pages(self):
+        exported = []
+        params = {"limit": 4}
+        for _ in range(3):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 200)
+            exported.extend(sample["id"] for sample in response.samples)
+            params["since_id"] = response["X-Next-Since-Id"]
+
+        self.assertEqual(exported, self.ids)
+        self.assertEqual(response["X-Next-Since-Id"], str(self.ids[-1]))
+        self.assertFalse(response.has_header("Link"))
+
+    def test_link(self):
+        response = self.get(since_id=self.ids[1], limit=5)
+        self.assertEqual([sample["id"] for sample in response.samples], self.ids[2:7])
+        self.assertEqual(response["X-Next-Since-Id"], str(self.ids[6]))
+        self.assertIn("since_id=%d&limit=5>" % self.ids[6], response["Link"])
+        self.assertTrue(response["Link"].endswith('; rel="next"'))
+
+    def test_up_to_date(self):
+        response = self.get(since_id=self.ids[-1])
+        self.assertEqual(response.samples, [])
+        # the client keeps its cursor
+        self.assertEqual(response["X-Next-Since-Id"], str(self.ids[-1]))
+        self.assertFalse(response.has_header("Link"))
+
+    @override_settings(SAMPLE_EXPORT_CURSOR_GRACE=60)
+    def test_high_water_mark(self):
+        """samples are only exported once their ids were seen a while ago"""
+        redis = get_redis_connection("default")
+        redis.zadd(SampleExportApiMixin.id_observations_key, {self.ids[4]: time.time() - 90})
+        response = self.get()
+        self.assertEqual([sample["id"] for sample in response.samples], self.ids[:5])
+        self.assertEqual(response["X-Next-Since-Id"], str(self.ids[4]))
+        self.assertFalse(response.has_header("Link"))
+        # the newest id was noted for later requests
+        observations = redis.zrange(SampleExportApiMixin.id_observations_key, 0, -1)
+        self.assertEqual(observations, [str(self.ids[4]).encode(), str(self.ids[-1]).encode()])
+
+    @override_settings(SAMPLE_EXPORT_CURSOR_GRACE=60)
+    def test_high_water_mark_unknown(self):
+        """the client is asked to retry rather than sent an empty page after a cold start"""
+        response = self.get()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "60")
+
+        # seen only once, the time of the first observation counts
+        self.assertEqual(self.get().status_code, 503)
+        redis = get_redis_connection("default")
+        self.assertEqual(redis.zcard(SampleExportApiMixin.id_observations_key), 1)
+
+    def test_bad_request(self):
+        for params in ({"since_id": "x"}, {"since_id": -1}, {"limit": 0}, {"limit": 10 ** 9}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+    def test_authorization(self):
+        self.assertEqual(self.client.get(URL).status_code, 401)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import base64
+import io
+import json
+import unittest
+from datetime import datetime
+
+from django.conf import settings
+from django.test import TestCase
+from django.test import override_settings
+
+from primming.pricewatcher import api
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PriceSample
+from primming.registration.models import Person
+from primming.registration.models import PersonalAttribute
+
+if api.pyarrow is not None:
+    import pyarrow.parquet
+
+URL = "/watcher/api/1.0/export/%s/2051-07-01/2051-07-31"
+AUTHORIZATION = "Basic %s" % base64.b64encode(b"ait:boOk7laD7keLlgEe").decode("ascii")
+PARQUET = "application/vnd.apache.parquet"
+
+
+@unittest.skipIf(api.pyarrow is None, "pyarrow is not installed")
+class ExportParquetTestCase(TestCase):
+    """tests for the parquet export of :class:`primming.pricewatcher.api.SimpleRestAPISupport`"""
+
+    def setUp(self):
+        page = Page.objects.create(name="shop", url="https://shop.example.com/", scraper="1")
+        PriceSample.objects.bulk_create(
+            PriceSample(
+                timestamp=datetime(2051, 7, day, 12, tzinfo=settings.PYTZ_ZONE),
+                price=100 * day,
+                currency="EUR" if day % 2 else "USD",
+                page=page,
+                uuid="60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE",
+            )
+            for day in range(1, 11)
+        )
+
+    def get(self, kind="samples", url=URL):
+        response = self.client.get(
+            url % kind, HTTP_ACCEPT=PARQUET, HTTP_AUTHORIZATION=AUTHORIZATION
+        )
+        self.assertEqual(response["Content-Type"], PARQUET)
+        self.assertIn(".parquet", response["Content-Disposition"])
+        return pyarrow.parquet.ParquetFile(io.BytesIO(b"".join(response.streaming_content)))
+
+    @override_settings(EXPORT_PARQUET_ROW_GROUP_SIZE=4)
+    def test_samples(self):
+        parquet = self.get()
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+
+        table = parquet.read()
+        self.assertEqual(
+            table.column_names, [name for name, _ in api.SampleExportApiMixin.columns]
+        )
+        self.assertEqual(str(table.schema.field("price").type), "int64")
+        self.assertEqual(str(table.schema.field("timestamp").type), "timestamp[us, tz=UTC]")
+        self.assertEqual(
+            str(table.schema.field("currency").type),
+            "dictionary<values=string, indices=int32, ordered=0>",
+        )
+
+        rows = table.to_pylist()
+        self.assertEqual([row["price"] for row in rows], [100 * day for day in range(1, 11)])
+        self.assertEqual(rows[0]["currency"], "EUR")
+        self.assertEqual(rows[0]["timestamp"], datetime(2051, 7, 1, 12, tzinfo=settings.PYTZ_ZONE))
+
+    def test_empty(self):
+        table = self.get(url="/watcher/api/1.0/export/%s/2051-08-01/2051-08-31").read()
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(len(table.column_names), len(api.SampleExportApiMixin.columns))
+
+    def test_persons(self):
+        person = Person.objects.create(
+            uuid="60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE",
+            created=datetime(2051, 7, 1, 12, tzinfo=settings.PYTZ_ZONE),
+        )
+        PersonalAttribute.objects.create(person=person, name="age", value_int=42)
+
+        rows = self.get("persons").read().to_pylist()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["uuid"], person.uuid)
+        self.assertEqual(rows[0]["created"], person.created)
+        self.assertEqual(json.loads(rows[0]["age"]), {"value": 42, "display_name": None})
+
+    def test_other_formats(self):
+        response = self.client.get(
+            URL % "samples", HTTP_ACCEPT="text/csv", HTTP_AUTHORIZATION=AUTHORIZATION
+        )
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 11)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import base64
+import gzip
+import json
+import shutil
+import struct
+import tempfile
+import zlib
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
+
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PriceSample
+from primming.pricewatcher.models import RawPriceReport
+from primming.pricewatcher.snapshots import ExportSnapshots
+from primming.pricewatcher.snapshots import sample_snapshots
+from primming.pricewatcher.streams import PriceReportStream
+from primming.utils.compression import GZIP_HEADER
+from primming.utils.compression import DeflateFragment
+from primming.utils.compression import GzipJoin
+from primming.utils.compression import crc32_combine
+
+URL = "/watcher/api/1.0/export/samples/%s/%s"
+AUTHORIZATION = "Basic %s" % base64.b64encode(b"ait:boOk7laD7keLlgEe").decode("ascii")
+
+
+class GzipJoinTestCase(SimpleTestCase):
+    """tests for :class:`primming.utils.compression.GzipJoin`"""
+
+    def test_crc32_combine(self):
+        for first, second in ((b"abc", b"def"), (b"", b"x" * 1000), (b"x" * 70000, b"")):
+            self.assertEqual(
+                crc32_combine(zlib.crc32(first), zlib.crc32(second), len(second)),
+                zlib.crc32(first + second),
+            )
+
+    def test_join(self):
+        fragment = DeflateFragment()
+        compressed = fragment.compress(b"a" * 1000) + fragment.compress(b"b") + fragment.flush()
+
+        join = GzipJoin()
+        body = GZIP_HEADER + join.add_data(b"[")
+        body += compressed
+        join.add(fragment.crc, fragment.length)
+        body += join.add_data(b"]") + join.trailer()
+        self.assertEqual(gzip.decompress(body), b"[" + b"a" * 1000 + b"b]")
+        self.assertEqual(gzip.decompress(GZIP_HEADER + GzipJoin().trailer()), b"")
+
+
+class ExportSnapshotsTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.snapshots.ExportSnapshots` and the snapshots of
+    :class:`primming.pricewatcher.views.ExportSamplesApiView`"""
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(setattr, sample_snapshots, "root", sample_snapshots.root)
+        sample_snapshots.root = None
+
+        self.page = Page.objects.create(name="shop", url="https://shop.example.com/", scraper="1")
+        # no samples on the 3rd
+        self.create_samples(
+            settings.PYTZ_ZONE.localize(datetime(2051, 7, day, hour))
+            for day in (1, 2, 4)
+            for hour in (10, 12, 14)
+        )
+
+    def create_samples(self, timestamps):
+        PriceSample.objects.bulk_create(
+            PriceSample(
+                timestamp=timestamp,
+                price=100 + index,
+                currency="EUR",
+                page=self.page,
+                uuid="60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE",
+            )
+            for index, timestamp in enumerate(timestamps)
+        )
+
+    def get(self, start="2051-07-01", end="2051-07-04", accept="text/csv", **headers):
+        response = self.client.get(
+            URL % (start, end), HTTP_ACCEPT=accept, HTTP_AUTHORIZATION=AUTHORIZATION, **headers
+        )
+        response.body = b"".join(response.streaming_content) if response.streaming else b""
+        return response
+
+    def write(self):
+        sample_snapshots.root = self.root
+        for day in range(1, 5):
+            sample_snapshots.write(date(2051, 7, day))
+
+    def test_write(self):
+        self.write()
+        self.assertEqual(
+            sorted(str(path.relative_to(self.root)) for path in self.root.rglob("*")),
+            ["samples"]
+            + [
+                "samples/2051-07-0%d.%s.deflate" % (day, ext)
+                for day in range(1, 5)
+                for ext in ("csv", "json")
+            ],
+        )
+        self.assertEqual((self.root / "samples/2051-07-03.csv.deflate").stat().st_size, 0)
+        data = (self.root / "samples/2051-07-02.csv.deflate").read_bytes()
+        # the compressed rows and their checksum and length
+        rows = zlib.decompressobj(wbits=-zlib.MAX_WBITS).decompress(data[:-12])
+        self.assertEqual(data[-12:], struct.pack("<IQ", zlib.crc32(rows), len(rows)))
+        self.assertEqual(len(rows.splitlines()), 3)
+
+        # the snapshots are never changed
+        (self.root / "samples/2051-07-03.json.deflate").write_bytes(b"changed")
+        self.assertEqual(sample_snapshots.write(date(2051, 7, 3)), 0)
+        self.assertEqual((self.root / "samples/2051-07-03.json.deflate").read_bytes(), b"changed")
+
+    def test_export(self):
+        for accept in ("text/csv", "application/json"):
+            for start, end in (("2051-07-01", "2051-07-04"), ("2051-07-03", "2051-07-03")):
+                expected = self.get(start, end, accept).body
+                self.write()
+                response = self.get(start, end, accept, HTTP_ACCEPT_ENCODING="gzip, br")
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertEqual(int(response["Content-Length"]), len(response.body))
+                self.assertEqual(gzip.decompress(response.body), expected)
+
+                response = self.get(start, end, accept)
+                self.assertFalse(response.has_header("Content-Encoding"))
+                self.assertEqual(response.body, expected)
+                sample_snapshots.root = None
+
+        self.write()
+        self.assertEqual(len(json.loads(self.get(accept="application/json").body)), 9)
+
+    def test_missing_days(self):
+        expected = self.get().body
+        sample_snapshots.root = self.root
+        sample_snapshots.write(date(2051, 7, 2))
+        response = self.get(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertEqual(gzip.decompress(response.body), expected)
+        self.assertEqual(self.get().body, expected)
+
+    def test_range(self):
+        self.write()
+        full = self.get(HTTP_ACCEPT_ENCODING="gzip")
+        etag = full["ETag"]
+
+        response = self.get(HTTP_ACCEPT_ENCODING="gzip", HTTP_RANGE="bytes=10-99")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-99/%d" % len(full.body))
+        self.assertEqual(response.body, full.body[10:100])
+
+        response = self.get(
+            HTTP_ACCEPT_ENCODING="gzip", HTTP_RANGE="bytes=-20", HTTP_IF_RANGE=etag
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.body, full.body[-20:])
+
+        # the checksums of the snapshots are only joined once
+        export = sample_snapshots.export("text/csv", date(2051, 7, 1), date(2051, 7, 4), True)
+        self.assertIs(export.segments, export.segments)
+        self.assertEqual((export.length, export.etag), (len(full.body), etag))
+
+        response = self.get(HTTP_ACCEPT_ENCODING="gzip", HTTP_RANGE="bytes=%d-" % len(full.body))
+        self.assertEqual(response.status_code, 416)
+
+        # another version of the body, or several ranges
+        for headers in ({"HTTP_IF_RANGE": '"other"'}, {}):
+            response = self.get(HTTP_ACCEPT_ENCODING="gzip", HTTP_RANGE="bytes=0-1,5-6", **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.body, full.body)
+
+    def test_current_day(self):
+        now = datetime.now(tz=settings.PYTZ_ZONE)
+        yesterday = now - timedelta(days=1)
+        self.create_samples([yesterday, now, now])
+        start, end = yesterday.date().isoformat(), now.date().isoformat()
+        expected = self.get(start, end).body
+
+        sample_snapshots.root = self.root
+        sample_snapshots.write(yesterday.date())
+        response = self.get(start, end, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertFalse(response.has_header("Accept-Ranges"))
+        self.assertEqual(gzip.decompress(response.body), expected)
+        self.assertEqual(self.get(start, end).body, expected)
+        self.assertEqual(len(expected.splitlines()), 4)
+
+    def test_is_complete(self):
+        today = datetime.now(tz=settings.PYTZ_ZONE).date()
+        self.assertFalse(ExportSnapshots.is_complete(today))
+        self.assertTrue(ExportSnapshots.is_complete(date(2020, 1, 1)))
+
+        # raw reports of the day are still to be enriched
+        RawPriceReport.objects.create(
+            timestamp=settings.PYTZ_ZONE.localize(datetime(2020, 1, 1, 23)),
+            uuid="60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE",
+            user_agent="",
+            ip="127.0.0.1",
+            url="https://shop.example.com/",
+        )
+        with self.assertLogs("primming.pricewatcher.snapshots", "WARNING"):
+            self.assertFalse(ExportSnapshots.is_complete(date(2020, 1, 1)))
+        # a stuck report holds back its own day only
+        self.assertTrue(ExportSnapshots.is_complete(date(2020, 1, 2)))
+        self.assertTrue(ExportSnapshots.is_complete(date(2019, 12, 31)))
+
+    def test_is_complete_delay(self):
+        yesterday = (datetime.now(tz=settings.PYTZ_ZONE) - timedelta(days=1)).date()
+        with self.settings(EXPORT_SNAPSHOT_DELAY=0):
+            self.assertTrue(ExportSnapshots.is_complete(yesterday))
+        # reports of yesterday might still be queued
+        with self.settings(EXPORT_SNAPSHOT_DELAY=2 * 24 * 60 * 60):
+            self.assertFalse(ExportSnapshots.is_complete(yesterday))
+
+    @override_settings(PRICE_REPORT_INGEST_MODE="stream", PRICE_REPORT_STREAM="test:snapshots")
+    def test_is_complete_stream(self):
+        stream = PriceReportStream()
+        self.addCleanup(stream.redis.delete, stream.name)
+        stream.redis.delete(stream.name)
+        self.assertTrue(ExportSnapshots.is_complete(date(2020, 1, 1)))
+
+        # a report received at the end of the day is still in the stream
+        received = settings.PYTZ_ZONE.localize(datetime(2020, 1, 1, 23, 59))
+        stream.redis.xadd(stream.name, {b"report": b"[]"}, id=int(received.timestamp() * 1000))
+        self.assertEqual(stream.oldest(), received)
+        self.assertFalse(ExportSnapshots.is_complete(date(2020, 1, 1)))
+        self.assertTrue(ExportSnapshots.is_complete(date(2019, 12, 31)))
+        self.assertTrue(ExportSnapshots.is_complete(date(2020, 1, 2)))
+
+    @override_settings(EXPORT_SNAPSHOT_DELAY=0)
+    def test_command(self):
+        out = StringIO()
+        call_command("write_export_snapshots", "--root", str(self.root), "--days", "3", stdout=out)
+        # the days before today without samples
+        self.assertEqual(len(list(self.root.rglob("*.deflate"))), 6)
+        self.assertIn("Wrote 6 snapshots", out.getvalue())
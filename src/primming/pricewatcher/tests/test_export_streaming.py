@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import asyncio
+import base64
+from datetime import datetime
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
+
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PriceSample
+from primming.utils.asgi import ASGIHandler
+from primming.utils.asgi import StreamingSend
+from primming.utils.asgi import buffered
+
+URL = "/watcher/api/1.0/export/samples/2051-07-01/2051-07-31"
+AUTHORIZATION = "Basic %s" % base64.b64encode(b"ait:boOk7laD7keLlgEe").decode("ascii")
+
+
+class BufferedTestCase(SimpleTestCase):
+    """tests for :func:`primming.utils.asgi.buffered`"""
+
+    def test_buffered(self):
+        self.assertEqual(
+            list(buffered(["ab", "c", "de", "f", "ä"], 3)), [b"abc", b"def", "ä".encode()]
+        )
+        self.assertEqual(list(buffered(["abcd"], 3)), [b"abcd"])
+        self.assertEqual(list(buffered([], 3)), [])
+
+
+class ExportStreamingTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.views.ExportAPIViewBase` and
+    :class:`primming.utils.asgi.ASGIHandler`"""
+
+    def setUp(self):
+        page = Page.objects.create(name="shop", url="https://shop.example.com/", scraper="1")
+        PriceSample.objects.bulk_create(
+            PriceSample(
+                timestamp=datetime(2051, 7, day, 12, tzinfo=settings.PYTZ_ZONE),
+                price=100 * day,
+                currency="EUR",
+                page=page,
+                uuid="60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE",
+            )
+            for day in range(1, 11)
+        )
+
+    def test_streaming(self):
+        response = self.client.get(URL, HTTP_ACCEPT="text/csv", HTTP_AUTHORIZATION=AUTHORIZATION)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertTrue(lines[0].startswith("id,timestamp,url,price"))
+
+    @override_settings(EXPORT_STREAM_CHUNK_SIZE=500)
+    def test_asgi(self):
+        sent = []
+        request_read = False
+
+        async def receive():
+            nonlocal request_read
+            if not request_read:
+                request_read = True
+                return {"type": "http.request"}
+            # the client stays connected
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": URL,
+            "query_string": b"",
+            "server": ("testserver", 80),
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", AUTHORIZATION.encode("ascii")),
+            ],
+        }
+        async_to_sync(ASGIHandler())(scope, receive, send)
+
+        self.assertEqual(sent[0]["type"], "http.response.start")
+        self.assertEqual(sent[0]["status"], 200)
+        bodies = [message.get("body", b"") for message in sent[1:]]
+        # the samples are sent in several chunks and a final empty message
+        self.assertGreater(len(bodies), 2)
+        self.assertEqual(bodies[-1], b"")
+        self.assertFalse(sent[-1].get("more_body", False))
+        self.assertEqual(len(b"".join(bodies).decode("utf-8")[1:-1].split("},{")), 10)
+
+    def test_disconnect(self):
+        closed = []
+        sent = []
+
+        def parts():
+            for part in range(100):
+                yield b"%d" % part
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        response = StreamingHttpResponse(parts())
+        response.close = lambda: closed.append(True)
+        async_to_sync(ASGIHandler().send_response)(response, StreamingSend(send, receive))
+
+        # stopped early, but the response is finished and closed anyway
+        self.assertLess(len(sent), 10)
+        self.assertEqual(sent[-1], {"type": "http.response.body"})
+        self.assertEqual(closed, [True])
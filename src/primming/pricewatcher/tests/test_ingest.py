@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+
+from primming.pricewatcher.ingest import PriceReport
+from primming.pricewatcher.ingest import enrich_raw_reports
+from primming.pricewatcher.ingest import store_raw_reports
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PriceSample
+from primming.pricewatcher.models import RawPriceReport
+from primming.pricewatcher.resolvers import location_resolver
+from primming.pricewatcher.resolvers import user_agent_resolver
+from primming.pricewatcher.urlindex import url_index
+
+CHROME = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/94.0.4606.81 Safari/537.36"
+)
+FIREFOX = "Mozilla/5.0 (X11; Linux x86_64; rv:93.0) Gecko/20100101 Firefox/93.0"
+UUID = "60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE"
+
+
+class RawReportIngestTestCase(TestCase):
+    """tests for the two phase "raw" ingest mode of :mod:`primming.pricewatcher.ingest`"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        user_agent_resolver.clear()
+        location_resolver.clear()
+        url_index.clear()
+        self.page1 = Page.objects.create(name="action0.com", url="https://action0.com")
+        self.page2 = Page.objects.create(name="action1.com", url="https://action1.com")
+
+    def test_store_and_enrich(self):
+        """tests for :func:`primming.pricewatcher.ingest.enrich_raw_reports`"""
+        timestamp = datetime(2021, 7, 2, 14, tzinfo=settings.PYTZ_ZONE)
+        data = [
+            {"url": "https://action0.com", "price": {"value": "12,99 €"}},
+            {"url": "https://action1.com", "price": {"value": "3,50"}},
+            {"url": "https://unknown.com", "price": {"value": "1,00"}},
+            {"url": "https://action1.com", "price": None},
+        ]
+        reports = [
+            PriceReport(UUID, data, CHROME, "127.0.0.1", timestamp),
+            PriceReport(UUID, data[:1], FIREFOX, "127.0.0.1", timestamp),
+        ]
+
+        self.assertEqual(store_raw_reports(reports), 5)
+        self.assertEqual(PriceSample.objects.count(), 0)
+
+        self.assertEqual(enrich_raw_reports(batch_size=3), 3)
+        self.assertEqual(enrich_raw_reports(batch_size=3), 2)
+        self.assertEqual(enrich_raw_reports(batch_size=3), 0)
+
+        self.assertFalse(RawPriceReport.objects.exists())
+        samples = PriceSample.objects.order_by("id")
+        self.assertEqual(
+            [(s.page_id, s.price, s.timestamp) for s in samples],
+            [
+                (self.page1.id, 1299, timestamp),
+                (self.page2.id, 350, timestamp),
+                (self.page1.id, 1299, timestamp),
+            ],
+        )
+        self.assertNotEqual(samples[0].agent_id, samples[2].agent_id)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from primming.pricewatcher.api import PageListViewApiMixin
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PageList
+from primming.pricewatcher.models import PageListChange
+from primming.pricewatcher.pagelists import pagelist_cache
+
+ADDED = PageListChange.Action.ADDED
+REMOVED = PageListChange.Action.REMOVED
+CHANGED = PageListChange.Action.CHANGED
+
+
+class PageListChangeTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.models.PageListChange` and its signal handlers"""
+
+    def setUp(self):
+        self.page1 = Page.objects.create(name="one", url="https://one.example.com/")
+        self.page2 = Page.objects.create(name="two", url="https://two.example.com/")
+        self.list1 = PageList.objects.create(name="list1", default=True)
+
+    def changes(self):
+        return list(PageListChange.objects.order_by("id").values_list("page_id", "action"))
+
+    def test_membership(self):
+        self.list1.pages.add(self.page1, self.page2)
+        self.list1.pages.remove(self.page1)
+        self.page2.lists.clear()
+        self.page1.lists.add(self.list1)
+
+        self.assertEqual(
+            self.changes(),
+            [
+                (self.page1.id, ADDED),
+                (self.page2.id, ADDED),
+                (self.page1.id, REMOVED),
+                (self.page2.id, REMOVED),
+                (self.page1.id, ADDED),
+            ],
+        )
+
+    def test_page(self):
+        self.list1.pages.add(self.page1)
+        PageListChange.objects.all().delete()
+
+        self.page1.name = "renamed"
+        self.page1.save()
+        self.assertEqual(self.changes(), [])
+
+        self.page1.url = "https://one.example.com/new"
+        self.page1.save()
+        self.page1.enabled = False
+        self.page1.save()
+        self.page1.enabled = True
+        self.page1.save()
+        self.page1.scraper = "price = 1"
+        self.page1.save()
+        self.page1.delete()
+
+        self.assertEqual(
+            [action for _, action in self.changes()], [CHANGED, REMOVED, ADDED, CHANGED, REMOVED]
+        )
+
+    def test_prune(self):
+        self.list1.pages.add(self.page1)
+        self.list1.pages.add(self.page2)
+        first, second = PageListChange.objects.order_by("id")
+        PageListChange.objects.filter(id=first.id).update(
+            timestamp=timezone.now() - timedelta(days=60)
+        )
+
+        PageListChange.prune(timezone.now() - timedelta(days=30))
+
+        self.list1.refresh_from_db()
+        self.assertEqual(self.list1.pruned_revision, first.id)
+        self.assertEqual(self.changes(), [(self.page2.id, ADDED)])
+        self.assertEqual(self.list1.revision, second.id)
+
+
+class SerializeChangesTestCase(TestCase):
+    """tests for :meth:`primming.pricewatcher.api.PageListViewApiMixin.serialize_changes`"""
+
+    def setUp(self):
+        self.page1 = Page.objects.create(name="one", url="https://one.example.com/")
+        self.page2 = Page.objects.create(name="two", url="https://two.example.com/")
+        self.page3 = Page.objects.create(name="three", url="https://three.example.com/")
+        self.list1 = PageList.objects.create(name="list1", default=True)
+        self.list1.pages.add(self.page1, self.page2)
+        # the delta is only sent while it is smaller than the list
+        self.list1.pages.add(
+            *(
+                Page.objects.create(name=str(i), url="https://%d.example.com/" % i)
+                for i in range(4)
+            )
+        )
+        self.revision = PageListViewApiMixin.serialize_list("list1")["revision"]
+
+    def test_delta(self):
+        self.list1.pages.add(self.page3)
+        self.page1.url = "https://one.example.com/new"
+        self.page1.save()
+        self.list1.pages.remove(self.page2)
+        # added and removed again, the client never knew it
+        self.list1.pages.remove(self.page3)
+
+        data = PageListViewApiMixin.serialize_changes("list1", self.revision)
+        self.assertEqual(data["since"], self.revision)
+        self.assertEqual(data["revision"], self.list1.revision)
+        self.assertEqual(data["added"], [])
+        self.assertEqual([page["url"] for page in data["changed"]], [self.page1.url])
+        self.assertEqual(data["removed"], [self.page2.id, self.page3.id])
+
+        self.list1.pages.add(self.page3)
+        data = PageListViewApiMixin.serialize_changes("list1", data["revision"])
+        self.assertEqual([page["id"] for page in data["added"]], [self.page3.id])
+        self.assertEqual(data["removed"], [])
+
+    def test_unchanged(self):
+        data = PageListViewApiMixin.serialize_changes("list1", self.revision)
+        self.assertEqual(data["revision"], self.revision)
+        self.assertEqual((data["added"], data["changed"], data["removed"]), ([], [], []))
+
+    def test_full(self):
+        self.list1.pages.add(self.page3)
+        revision = self.list1.revision
+
+        # unknown, in the future and pruned revisions get the full list
+        for since in (0, revision + 1, self.revision):
+            if since == self.revision:
+                PageList.objects.filter(id=self.list1.id).update(pruned_revision=revision)
+            data = PageListViewApiMixin.serialize_changes("list1", since)
+            self.assertNotIn("since", data)
+            self.assertEqual(data["revision"], revision)
+            self.assertEqual(len(data["pages"]), 7)
+
+
+class PageListViewChangesTestCase(TestCase):
+    """tests for the ``since`` parameter of :class:`primming.pricewatcher.views.PageListView`"""
+
+    def setUp(self):
+        cache.clear()
+        pagelist_cache.clear()
+        self.page1 = Page.objects.create(name="one", url="https://one.example.com/")
+        self.page2 = Page.objects.create(name="two", url="https://two.example.com/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.list1 = PageList.objects.create(name="list1", default=True)
+            self.list1.pages.add(self.page1)
+
+    def test_since(self):
+        revision = self.client.get("/watcher/api/1.0/urllist/list1/").json()["revision"]
+
+        response = self.client.get("/watcher/api/1.0/urllist/list1/?since=%d" % revision)
+        self.assertEqual(response.json()["added"], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.list1.pages.add(self.page2)
+
+        response = self.client.get("/watcher/api/1.0/urllist/list1/?since=%d" % revision)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([page["id"] for page in response.json()["added"]], [self.page2.id])
+
+    def test_too_many(self):
+        revision = self.list1.revision
+        self.list1.pages.remove(self.page1)
+        self.list1.pages.add(self.page2)
+
+        data = PageListViewApiMixin.serialize_changes("list1", revision)
+        self.assertEqual([page["url"] for page in data["pages"]], [self.page2.url])
+
+    def test_invalid(self):
+        response = self.client.get("/watcher/api/1.0/urllist/list1/?since=latest")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PageList
+from primming.pricewatcher.pagelists import pagelist_cache
+
+
+class PageListCacheTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.pagelists.PageListCache`"""
+
+    def setUp(self):
+        cache.clear()
+        pagelist_cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page1 = Page.objects.create(name="one", url="https://one.example.com/")
+            self.page2 = Page.objects.create(name="two", url="https://two.example.com/")
+            self.list1 = PageList.objects.create(name="list1", default=True)
+            self.list1.pages.add(self.page1)
+
+    @staticmethod
+    def urls(page_list):
+        return [page["url"] for page in json.loads(page_list.body)["pages"]]
+
+    def test_cached(self):
+        with self.assertNumQueries(3):
+            page_list = pagelist_cache.get(None)
+        self.assertEqual(self.urls(page_list), [self.page1.url])
+        self.assertEqual(pagelist_cache.get("list1"), page_list)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(pagelist_cache.get(None), page_list)
+
+        # served from the shared cache by other processes
+        pagelist_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(pagelist_cache.get(None), page_list)
+
+    def test_invalidate(self):
+        etag = pagelist_cache.get("list1").etag
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.list1.pages.add(self.page2)
+        page_list = pagelist_cache.get("list1")
+        self.assertNotEqual(page_list.etag, etag)
+        self.assertEqual(self.urls(page_list), [self.page1.url, self.page2.url])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page2.enabled = False
+            self.page2.save()
+        self.assertEqual(self.urls(pagelist_cache.get("list1")), [self.page1.url])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page1.delete()
+        self.assertEqual(self.urls(pagelist_cache.get("list1")), [])
+
+    def test_invalidate_default(self):
+        pagelist_cache.get(None)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PageList.objects.create(name="list2", default=True).pages.add(self.page2)
+
+        self.assertEqual(self.urls(pagelist_cache.get(None)), [self.page2.url])
+
+
+class PageListViewTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.views.PageListView`"""
+
+    def setUp(self):
+        cache.clear()
+        pagelist_cache.clear()
+        page = Page.objects.create(name="one", url="https://one.example.com/")
+        PageList.objects.create(name="list1", default=True).pages.add(page)
+
+    def test_etag(self):
+        response = self.client.get("/watcher/api/1.0/urllist/list1/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pages"][0]["url"], "https://one.example.com/")
+        self.assertEqual(response["Cache-Control"], "max-age=900")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/watcher/api/1.0/urllist/list1/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get("/watcher/api/1.0/urllist/list1/", HTTP_IF_NONE_MATCH='"old"')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import gzip
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PageList
+from primming.pricewatcher.publisher import StaticPublisher
+
+
+class StaticPublisherTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.publisher.StaticPublisher`"""
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        self.publisher = StaticPublisher(str(self.root), 0)
+
+        self.page1 = Page.objects.create(name="one", url="https://one.example.com/", scraper="1")
+        self.list1 = PageList.objects.create(name="list1", default=True)
+        self.list1.pages.add(self.page1)
+        PageList.objects.create(name="no/such/url")
+
+    def files(self):
+        return sorted(str(path.relative_to(self.root)) for path in self.root.rglob("*"))
+
+    def read(self, name):
+        data = (self.root / name).read_bytes()
+        self.assertEqual(gzip.decompress((self.root / (name + ".gz")).read_bytes()), data)
+        return json.loads(data)
+
+    def test_publish(self):
+        self.assertEqual(self.publisher.publish(), 14)
+
+        bundle = self.read("scrapers/default.json")
+        self.assertEqual(bundle["scrapers"], {str(self.page1.id): "1"})
+        version = [name for name in self.files() if len(name) == len("scrapers/") + 40][0]
+        self.assertEqual(
+            set(self.files()),
+            {
+                "scrapers",
+                "scrapers/default.json",
+                "scrapers/default.json.gz",
+                "scrapers/list-list1.json",
+                "scrapers/list-list1.json.gz",
+                version,
+                version + "/default.json",
+                version + "/default.json.gz",
+                version + "/list-list1.json",
+                version + "/list-list1.json.gz",
+                "urllist",
+                "urllist/default.json",
+                "urllist/default.json.gz",
+                "urllist/list-list1.json",
+                "urllist/list-list1.json.gz",
+                "scraper",
+                "scraper/%s.json" % self.page1.scraper_hash,
+                "scraper/%s.json.gz" % self.page1.scraper_hash,
+            },
+        )
+        self.assertEqual(self.read("urllist/list-list1.json")["pages"][0]["url"], self.page1.url)
+        self.assertEqual(self.read("scraper/%s.json" % self.page1.scraper_hash), {"csl": "1"})
+
+    def test_unchanged(self):
+        self.publisher.publish()
+        mtime = (self.root / "urllist/default.json").stat().st_mtime_ns
+
+        self.assertEqual(self.publisher.publish(), 0)
+        self.assertEqual((self.root / "urllist/default.json").stat().st_mtime_ns, mtime)
+
+    def test_prune(self):
+        self.publisher.publish()
+        old_version = [name for name in self.files() if len(name) == len("scrapers/") + 40][0]
+
+        self.page1.scraper = "2"
+        self.page1.save()
+        PageList.objects.filter(name="list1").update(default=None)
+        self.publisher.publish()
+
+        # the outdated bundle version and the default list are gone
+        self.assertFalse([name for name in self.files() if name.startswith(old_version)])
+        self.assertNotIn("urllist/default.json", self.files())
+        self.assertEqual(
+            self.read("scrapers/list-list1.json")["scrapers"], {str(self.page1.id): "2"}
+        )
+        self.assertEqual(len([name for name in self.files() if name.count("/") == 2]), 2)
+
+    def test_schedule_disabled(self):
+        StaticPublisher(None, 0).schedule()
+        self.assertIsNone(cache.get(StaticPublisher.pending_key))
+
+    def test_command(self):
+        out = StringIO()
+        call_command("publish_static", "--root", str(self.root), stdout=out)
+        self.assertIn("14 files changed", out.getvalue())
+        self.assertTrue((self.root / "urllist/list-list1.json.gz").exists())
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.test import TestCase
+from user_agents import parse as uaparse
+
+from primming.pricewatcher.models import BrowserMake
+from primming.pricewatcher.models import BrowserRedirect
+from primming.pricewatcher.redirects import BROWSER_FAMILIES
+from primming.pricewatcher.redirects import browser_family
+from primming.pricewatcher.redirects import local_browser_family
+from primming.pricewatcher.redirects import webstore_redirects
+
+WINDOWS = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+MAC = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+BLINK = "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+CHROME = WINDOWS + BLINK
+FIREFOX = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0"
+
+USER_AGENTS = [
+    CHROME,
+    MAC + BLINK,
+    "Mozilla/5.0 (X11; Linux x86_64) " + BLINK,
+    "Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) " + BLINK,
+    WINDOWS + BLINK + " Edg/120.0.2210.91",
+    WINDOWS + BLINK + " OPR/106.0.0.0",
+    MAC + BLINK + " OPR/106.0.0.0 (Edition std-1)",
+    WINDOWS + BLINK + " Vivaldi/6.5",
+    WINDOWS + BLINK.replace("Chrome", "HeadlessChrome"),
+    WINDOWS + BLINK.replace(" Safari", " YaBrowser/24.1.0.0 Safari"),
+    WINDOWS + BLINK + " Edge/18.19045",
+    FIREFOX,
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0 Waterfox/1",
+    MAC + "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+    "Mozilla/5.0 (Linux; Android 10; K) " + BLINK.replace(" Safari", " Mobile Safari"),
+    "Mozilla/5.0 (Linux; Android 10; K) " + BLINK,
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Windows NT 10.0; WOW64; Trident/7.0; rv:11.0) like Gecko",
+    "curl/8.0",
+    "",
+]
+
+
+class BrowserFamilyTestCase(SimpleTestCase):
+    """tests for :func:`primming.pricewatcher.redirects.browser_family`"""
+
+    def test_same_as_parser(self):
+        for user_agent in USER_AGENTS:
+            self.assertEqual(
+                browser_family(user_agent), uaparse(user_agent).browser.family, user_agent
+            )
+
+    def test_common_browsers_matched(self):
+        for user_agent in USER_AGENTS[:7] + USER_AGENTS[11:14]:
+            self.assertTrue(BROWSER_FAMILIES.fullmatch(user_agent), user_agent)
+
+    def test_local(self):
+        """only the parsed user agents are left to a thread"""
+        self.assertEqual(local_browser_family(USER_AGENTS[0]), "Chrome")
+        user_agent = USER_AGENTS[-3] + " test_local"
+        self.assertIsNone(local_browser_family(user_agent))
+        self.assertEqual(browser_family(user_agent), "IE")
+        self.assertEqual(local_browser_family(user_agent), "IE")
+
+
+class RedirectToWebstoreTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.views.RedirectToWebstore`"""
+
+    def setUp(self):
+        cache.clear()
+        webstore_redirects.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chrome = BrowserRedirect.objects.create(
+                browser_make=BrowserMake.objects.create(name="Chrome"),
+                url="https://chrome.example.com/",
+                default=True,
+            )
+            self.firefox = BrowserRedirect.objects.create(
+                browser_make=BrowserMake.objects.create(name="Firefox"),
+                url="https://firefox.example.com/",
+            )
+
+    def test_redirect(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/watcher/webstore", HTTP_USER_AGENT=FIREFOX)
+        self.assertRedirects(response, self.firefox.url, fetch_redirect_response=False)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/watcher/webstore", HTTP_USER_AGENT="curl/8.0")
+        self.assertRedirects(response, self.chrome.url, fetch_redirect_response=False)
+
+    def test_invalidate(self):
+        self.client.get("/watcher/webstore", HTTP_USER_AGENT=FIREFOX)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.firefox.url = "https://firefox.example.com/new"
+            self.firefox.save()
+
+        response = self.client.get("/watcher/webstore", HTTP_USER_AGENT=FIREFOX)
+        self.assertRedirects(response, self.firefox.url, fetch_redirect_response=False)
+
+    def test_no_default(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chrome.delete()
+
+        response = self.client.get("/watcher/webstore", HTTP_USER_AGENT=CHROME)
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+
+from primming.pricewatcher.models import GeoIPLocation
+from primming.pricewatcher.models import UserAgent
+from primming.pricewatcher.resolvers import GeoIPLocationResolver
+from primming.pricewatcher.resolvers import UserAgentResolver
+
+CHROME = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/94.0.4606.81 Safari/537.36"
+)
+FIREFOX = "Mozilla/5.0 (X11; Linux x86_64; rv:93.0) Gecko/20100101 Firefox/93.0"
+IP_ADDRESS = "216.160.83.56"
+
+
+class UserAgentResolverTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.resolvers.UserAgentResolver`"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.resolver = UserAgentResolver(maxsize=10, timeout=60)
+
+    def test_resolve(self):
+        """tests for :func:`primming.pricewatcher.resolvers.UserAgentResolver.resolve`"""
+        with self.captureOnCommitCallbacks(execute=True):
+            chrome_id = self.resolver.resolve(CHROME)
+            self.assertEqual(UserAgent.objects.get(id=chrome_id).browser.name, "Chrome")
+            self.assertNotEqual(self.resolver.resolve(FIREFOX), chrome_id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver.resolve(CHROME), chrome_id)
+
+        stats = self.resolver.stats()
+        self.assertEqual((stats["local_hits"], stats["shared_hits"], stats["misses"]), (1, 0, 2))
+        self.assertEqual(stats["size"], 2)
+
+    def test_resolve_shared(self):
+        """a value resolved by another process is taken from the shared cache"""
+        with self.captureOnCommitCallbacks(execute=True):
+            chrome_id = UserAgentResolver(maxsize=10, timeout=60).resolve(CHROME)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver.resolve(CHROME), chrome_id)
+
+        self.assertEqual(self.resolver.stats()["shared_hits"], 1)
+        self.assertEqual(self.resolver.stats()["misses"], 0)
+
+    def test_rollback(self):
+        """the ids of rows which were rolled back are not cached"""
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.resolver.resolve(CHROME)
+            raise RuntimeError
+
+        self.assertFalse(UserAgent.objects.exists())
+        self.assertIsNone(cache.get(self.resolver.cache_key(CHROME)))
+        with self.captureOnCommitCallbacks(execute=True):
+            chrome_id = self.resolver.resolve(CHROME)
+        self.assertEqual(UserAgent.objects.get().id, chrome_id)
+        self.assertEqual(self.resolver.stats()["misses"], 2)
+
+
+class GeoIPLocationResolverTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.resolvers.GeoIPLocationResolver`"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.resolver = GeoIPLocationResolver(maxsize=10, timeout=60)
+
+    def test_resolve_network(self):
+        """all addresses of a network resolve to the same location"""
+        network = GeoIPLocation.lookup(IP_ADDRESS).traits.network
+        with self.captureOnCommitCallbacks(execute=True):
+            location_id = self.resolver.resolve(IP_ADDRESS)
+        location = GeoIPLocation.objects.get(id=location_id)
+        self.assertEqual(location.ip, str(network.network_address))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver.resolve(str(network[-1])), location_id)
+
+        stats = self.resolver.stats()
+        self.assertEqual((stats["local_hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_resolve_expired(self):
+        """expired entries are resolved again"""
+        resolver = GeoIPLocationResolver(maxsize=10, timeout=0)
+        location_id = resolver.resolve(IP_ADDRESS)
+        cache.clear()
+
+        self.assertEqual(resolver.resolve(IP_ADDRESS), location_id)
+        self.assertEqual(resolver.stats()["misses"], 2)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import gzip
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import RequestFactory
+from django.test import TestCase
+
+from primming.pricewatcher.api import PageListViewApiMixin
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.pagelists import EncodedResponse
+from primming.pricewatcher.scrapers import NOT_FOUND
+from primming.pricewatcher.scrapers import scraper_cache
+from primming.pricewatcher.scrapers import scraper_version_cache
+from primming.pricewatcher.urlindex import url_index
+from primming.pricewatcher.views import ScraperView
+from primming.pricewatcher.views import encoded_response
+from primming.utils.api.exceptions import NotFoundException
+
+
+class ScraperCacheTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.scrapers.ScraperCache`"""
+
+    def setUp(self):
+        cache.clear()
+        scraper_cache.clear()
+        url_index.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page = Page.objects.create(
+                name="shop", url="https://shop.example.com/", scraper="price = $('.price')"
+            )
+
+    def test_cached(self):
+        # the url index and the scraper
+        with self.assertNumQueries(2):
+            body = scraper_cache.get(" https://shop.example.com/\n")
+        self.assertEqual(json.loads(body.body), {"csl": "price=$('.price')"})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(scraper_cache.get("https://shop.example.com/"), body)
+            # any url of the shop
+            self.assertEqual(scraper_cache.get("http://www.shop.example.com/item/1?id=2"), body)
+
+        # served from the shared cache by other processes
+        scraper_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(scraper_cache.get("https://shop.example.com/"), body)
+
+    def test_not_found(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(scraper_cache.get("https://unknown.example.com/"), NOT_FOUND)
+        with self.assertNumQueries(0):
+            self.assertEqual(scraper_cache.get("https://unknown.example.com/"), NOT_FOUND)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(name="new", url="https://unknown.example.com/", scraper="x")
+        self.assertEqual(
+            json.loads(scraper_cache.get("https://unknown.example.com/").body), {"csl": "x"}
+        )
+
+    def test_most_specific(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(name="sale", url="https://shop.example.com/sale/", scraper="sale")
+
+        self.assertEqual(
+            json.loads(scraper_cache.get("https://shop.example.com/sale/item").body),
+            {"csl": "sale"},
+        )
+        self.assertEqual(
+            json.loads(scraper_cache.get("https://shop.example.com/salesman").body),
+            {"csl": "price=$('.price')"},
+        )
+
+    def test_invalidate_on_save(self):
+        scraper_cache.get("https://shop.example.com/")
+
+        self.page.scraper = "price = $('#price')"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.save()
+
+        body = scraper_cache.get("https://shop.example.com/")
+        self.assertEqual(json.loads(body.body), {"csl": "price=$('#price')"})
+
+    def test_invalidate_on_url_change(self):
+        scraper_cache.get("https://shop.example.com/")
+
+        self.page.url = "https://shop.example.com/new"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.save()
+
+        self.assertEqual(scraper_cache.get("https://shop.example.com/"), NOT_FOUND)
+        self.assertNotEqual(scraper_cache.get("https://shop.example.com/new"), NOT_FOUND)
+
+    def test_invalidate_on_delete(self):
+        scraper_cache.get("https://shop.example.com/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.delete()
+
+        self.assertEqual(scraper_cache.get("https://shop.example.com/"), NOT_FOUND)
+
+
+class ScraperViewTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.views.ScraperView`"""
+
+    def setUp(self):
+        cache.clear()
+        scraper_cache.clear()
+        url_index.clear()
+        Page.objects.create(name="shop", url="https://shop.example.com/", scraper="price = 1")
+
+    def test_get(self):
+        for _ in range(2):
+            response = self.client.get(
+                "/watcher/api/1.0/scraper/analyze", {"url": "https://shop.example.com/"}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "application/json")
+            self.assertEqual(response["Cache-Control"], "max-age=86400")
+            self.assertEqual(response.json(), {"csl": "price=1"})
+
+    def test_invalid_url(self):
+        response = self.client.get("/watcher/api/1.0/scraper/analyze", {"url": "http://[::1"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_compressed(self):
+        response = self.client.get(
+            "/watcher/api/1.0/scraper/analyze",
+            {"url": "https://shop.example.com/"},
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), {"csl": "price=1"})
+
+    def test_brotli(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        encoded = EncodedResponse("1", b"{}", b"gzipped", b"brotli")
+        response = encoded_response(request, encoded)
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(response.content, b"brotli")
+
+        # brotli isn't installed
+        response = encoded_response(request, encoded._replace(brotli=None))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_quality(self):
+        encoded = EncodedResponse("1", b"{}", b"gzipped", b"brotli")
+        for accept_encoding, content_encoding in (
+            ("gzip;q=0, br;q=0", None),
+            ("gzip, br;q=0", "gzip"),
+            ("gzip;q=1.0, br;q=0.5", "gzip"),
+            ("br;q=0.5, gzip;q=0.5", "br"),
+            ("*", "br"),
+            ("*;q=0, gzip", "gzip"),
+            ("identity, gzip;q=x", None),
+        ):
+            request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+            response = encoded_response(request, encoded)
+            self.assertEqual(response.get("Content-Encoding"), content_encoding, accept_encoding)
+
+    def test_not_found(self):
+        self.assertRaises(
+            NotFoundException,
+            ScraperView().response_for_url,
+            RequestFactory().get("/"),
+            "https://unknown.example.com/",
+        )
+
+
+class ScraperVersionViewTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.views.ScraperVersionView`"""
+
+    def setUp(self):
+        cache.clear()
+        scraper_version_cache.clear()
+        self.page = Page.objects.create(name="shop", url="https://shop.example.com/", scraper="1")
+
+    def test_minified(self):
+        self.page.scraper = "// the price\r\n$price = trim(sizzle('.price', 'textContent'))\r\n"
+        self.page.save(update_fields=["scraper"])
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.scraper_minified, "$price=trim(sizzle('.price','textContent'))")
+        self.assertEqual(
+            json.loads(gzip.decompress(self.page.scraper_gzip)),
+            {"csl": self.page.scraper_minified},
+        )
+
+    def test_invalid(self):
+        self.page.scraper = "$price = sizzle('.price)"
+        with self.assertRaisesMessage(ValidationError, "unterminated string on line 1"):
+            self.page.full_clean()
+
+        # saved anyway, but sent as it is
+        self.page.save()
+        self.assertEqual(self.page.scraper_minified, self.page.scraper)
+
+    def test_hash(self):
+        self.assertEqual(self.page.scraper_hash, hashlib.sha1(b"1").hexdigest())
+
+        self.page.scraper = "2"
+        self.page.save(update_fields=["scraper"])
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.scraper_hash, hashlib.sha1(b"2").hexdigest())
+
+    def test_get(self):
+        url = PageListViewApiMixin._serialize_page(self.page)["scraper"]
+        self.assertEqual(url, "/watcher/api/1.0/scraper/%s" % self.page.scraper_hash)
+
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {"csl": "1"})
+            self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_found(self):
+        url = "/watcher/api/1.0/scraper/%s" % hashlib.sha1(b"2").hexdigest()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        # the scraper of an unknown hash might show up later on
+        self.page.scraper = "2"
+        self.page.save()
+        scraper_version_cache.clear()
+        cache.clear()
+        self.assertEqual(self.client.get(url).json(), {"csl": "2"})
+
+    def test_not_prepared(self):
+        # stored without Page.save, e.g. by loaddata
+        Page.objects.filter(id=self.page.id).update(
+            scraper="$price = 2 // two", scraper_minified="", scraper_gzip=b"", scraper_brotli=None
+        )
+        url = PageListViewApiMixin._serialize_page(Page.objects.get(id=self.page.id))["scraper"]
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(gzip.decompress(response.content)), {"csl": "$price=2"})
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase
+from django.test import override_settings
+
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PriceSample
+from primming.pricewatcher.resolvers import location_resolver
+from primming.pricewatcher.resolvers import user_agent_resolver
+from primming.pricewatcher.streams import PriceReportStream
+from primming.pricewatcher.urlindex import url_index
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:93.0) Gecko/20100101 Firefox/93.0"
+UUID = "60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE"
+
+
+class PriceReportStreamTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.streams.PriceReportStream`"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        user_agent_resolver.clear()
+        location_resolver.clear()
+        url_index.clear()
+        self.page = Page.objects.create(name="action0.com", url="https://action0.com")
+        self.stream = PriceReportStream(name="test:pricewatcher:reports", group="test")
+        self.stream.redis.delete(self.stream.name, self.stream.dead_letters)
+        self.stream.create_group()
+
+    def tearDown(self) -> None:
+        self.stream.redis.delete(self.stream.name, self.stream.dead_letters)
+
+    def _append(self, value: str):
+        data = [{"url": "https://action0.com", "price": {"value": value}}]
+        self.stream.append(UUID, data, USER_AGENT, "127.0.0.1")
+
+    def test_process_batch(self):
+        """entries are stored together and acknowledged afterwards"""
+        self._append("1,00")
+        self._append("2,00")
+        self.stream.redis.xadd(self.stream.name, {b"report": b"not json"})
+
+        entries = self.stream.read("consumer", count=10, block=10)
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(self.stream.process(entries), 2)
+
+        self.assertEqual(sorted(PriceSample.objects.values_list("price", flat=True)), [100, 200])
+        self.assertEqual(self.stream.redis.xpending(self.stream.name, "test")["pending"], 0)
+        self.assertEqual(self.stream.redis.xlen(self.stream.name), 0)
+
+    def test_reclaim(self):
+        """entries of a crashed consumer are reclaimed by another one"""
+        self._append("1,00")
+        self.assertEqual(len(self.stream.read("crashed", count=10, block=10)), 1)
+
+        self.assertEqual(self.stream.read("other", count=10, block=10), [])
+
+        reclaimed = self.stream.reclaim("other", min_idle=0, count=10)
+        self.assertEqual(len(reclaimed), 1)
+        self.assertEqual(self.stream.read("crashed", count=10, block=10, pending=True), [])
+        self.assertEqual(self.stream.process(reclaimed), 1)
+
+    def test_database_unavailable(self):
+        """entries stay pending while the database is unavailable"""
+        self._append("1,00")
+        self._append("2,00")
+        self.stream.redis.xadd(self.stream.name, {b"report": b"not json"})
+        entries = self.stream.read("consumer", count=10, block=10)
+
+        with mock.patch(
+            "primming.pricewatcher.streams.store_reports", side_effect=OperationalError
+        ):
+            self.assertEqual(self.stream.process(entries), 0)
+        # only the malformed entry is gone
+        self.assertEqual(self.stream.redis.xpending(self.stream.name, "test")["pending"], 2)
+        self.assertEqual(self.stream.redis.xlen(self.stream.name), 2)
+
+        reclaimed = self.stream.reclaim("other", min_idle=0, count=10)
+        self.assertEqual(self.stream.process(reclaimed), 2)
+        self.assertEqual(self.stream.redis.xpending(self.stream.name, "test")["pending"], 0)
+
+    @override_settings(PRICE_REPORT_STREAM_MAX_DELIVERIES=3)
+    def test_dead_letter(self):
+        """a report which keeps failing ends up in the dead letters instead of blocking"""
+        self._append("1,00")
+        # read before the consumer was restarted
+        self.assertEqual(len(self.stream.read("consumer", count=10, block=10)), 1)
+
+        stop = threading.Event()
+        with mock.patch(
+            "primming.pricewatcher.streams.store_reports", side_effect=OperationalError
+        ) as store_reports:
+            consumer = threading.Thread(
+                target=self.stream.consume,
+                args=("consumer",),
+                kwargs={"block": 10, "min_idle": 1, "stop": stop},
+            )
+            consumer.start()
+            try:
+                for _ in range(500):
+                    if self.stream.redis.xlen(self.stream.dead_letters):
+                        break
+                    stop.wait(0.01)
+            finally:
+                stop.set()
+                consumer.join()
+
+        # the 2nd and 3rd delivery, the first one was read by the crashed consumer
+        self.assertEqual(store_reports.call_count, 2)
+        self.assertEqual(self.stream.redis.xlen(self.stream.name), 0)
+        self.assertEqual(self.stream.redis.xpending(self.stream.name, "test")["pending"], 0)
+        ((_, fields),) = self.stream.redis.xrange(self.stream.dead_letters)
+        self.assertIn(b"report", fields)
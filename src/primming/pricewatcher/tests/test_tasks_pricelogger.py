@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PriceSample
+from primming.pricewatcher.resolvers import location_resolver
+from primming.pricewatcher.resolvers import user_agent_resolver
+from primming.pricewatcher.tasks import PriceLoggerTask
+from primming.pricewatcher.urlindex import url_index
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/94.0.4606.81 Safari/537.36"
+)
+UUID = "60DD7B0D-4C03-4AD9-A61A-B2FD5D98F4FE"
+
+
+class PriceLoggerTaskTestCase(TestCase):
+    """tests for :class:`primming.pricewatcher.tasks.PriceLoggerTask`"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        user_agent_resolver.clear()
+        location_resolver.clear()
+        url_index.clear()
+        self.page1 = Page.objects.create(name="action0.com", url="https://action0.com")
+        self.page2 = Page.objects.create(name="action1.com", url="https://action1.com")
+
+    def test_run(self):
+        """tests for :func:`primming.pricewatcher.tasks.PriceLoggerTask.run`"""
+        data = [
+            {"url": "https://action0.com", "price": {"value": "12,99 €", "curr": "EUR"}},
+            {"url": "https://action1.com", "price": {"value": "$ 3.50", "curr": "$"}},
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            PriceLoggerTask().run(UUID, data, USER_AGENT, "127.0.0.1")
+
+        statements = [q["sql"] for q in ctx.captured_queries]
+        page_select = "FROM %s" % connection.ops.quote_name(Page._meta.db_table)
+        sample_insert = "INSERT INTO %s" % connection.ops.quote_name(PriceSample._meta.db_table)
+        self.assertEqual(len([s for s in statements if page_select in s]), 1)
+        self.assertEqual(len([s for s in statements if s.startswith(sample_insert)]), 1)
+
+        samples = PriceSample.objects.order_by("id")
+        self.assertEqual(
+            [(s.page_id, s.price, s.currency, s.uuid) for s in samples],
+            [(self.page1.id, 1299, "EUR", UUID), (self.page2.id, 350, "USD", UUID)],
+        )
+        self.assertEqual(samples[0].agent_id, samples[1].agent_id)
+        self.assertIsNone(samples[0].location)
+
+    def test_run_skips_invalid(self):
+        """invalid rows of a report are skipped, the others are stored"""
+        data = [
+            {"url": "https://unknown.com", "price": {"value": "12,99"}},
+            {"url": "https://action0.com", "price": None},
+            {"url": "https://action0.com", "price": {"value": "free"}},
+            {"url": "https://action0.com", "price": {"value": "0,00"}},
+            {"url": "https://action1.com", "price": {"value": "7,00"}},
+        ]
+
+        PriceLoggerTask().run(UUID, data, USER_AGENT, "127.0.0.1")
+
+        self.assertEqual(
+            list(PriceSample.objects.values_list("page_id", "price")), [(self.page2.id, 700)]
+        )
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.test import TestCase
+
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.urlindex import UrlTrie
+from primming.pricewatcher.urlindex import normalize_url
+from primming.pricewatcher.urlindex import url_index
+
+
+class NormalizeUrlTestCase(SimpleTestCase):
+    """tests for :func:`primming.pricewatcher.urlindex.normalize_url`"""
+
+    def test_normalize(self):
+        for url in (
+            "https://shop.example.com/item?a=1&b=2",
+            "http://www.Shop.Example.com/item/?b=2&a=1#top",
+            "https://shop.example.com:443/item?a=1&b=2&",
+            " shop.example.com/item?b=2&a=1\n",
+        ):
+            self.assertEqual(normalize_url(url), "shop.example.com/item?a=1&b=2", url)
+
+        self.assertEqual(normalize_url("https://shop.example.com:8080/"), "shop.example.com:8080")
+        self.assertEqual(normalize_url("https://shop.example.com/Item"), "shop.example.com/Item")
+
+
+class UrlTrieTestCase(SimpleTestCase):
+    """tests for :class:`primming.pricewatcher.urlindex.UrlTrie`"""
+
+    def setUp(self):
+        self.trie = UrlTrie()
+        self.trie.add("https://example.com/", 1)
+        self.trie.add("https://www.example.com/shop", 2)
+        self.trie.add("https://example.com/shop/item?id=1", 3)
+
+    def test_resolve(self):
+        self.assertEqual(self.trie.resolve("https://example.com/about"), 1)
+        self.assertEqual(self.trie.resolve("https://de.example.com/"), 1)
+        self.assertEqual(self.trie.resolve("https://example.com/shopping"), 1)
+        self.assertEqual(self.trie.resolve("https://example.com/shop/"), 2)
+        self.assertEqual(self.trie.resolve("https://example.com/shop/item?id=2"), 2)
+        self.assertEqual(self.trie.resolve("https://example.com/shop/item?id=1"), 3)
+        self.assertIsNone(self.trie.resolve("https://example.org/"))
+        self.assertIsNone(self.trie.resolve("https://com/"))
+
+    def test_invalid_url(self):
+        self.assertIsNone(self.trie.resolve("http://[::1"))
+
+    def test_shared_url(self):
+        self.trie.add("http://example.com", 0)
+        self.assertEqual(self.trie.resolve("https://example.com/"), 0)
+
+        self.trie.remove("http://example.com", 0)
+        self.assertEqual(self.trie.resolve("https://example.com/"), 1)
+
+    def test_remove(self):
+        self.trie.remove("https://example.com/shop/item?id=1", 3)
+        self.assertEqual(self.trie.resolve("https://example.com/shop/item?id=1"), 2)
+        self.assertNotIn(
+            "/item", self.trie.children["com"].children["example"].children["/shop"].children
+        )
+
+        self.trie.remove("https://example.com/shop", 2)
+        self.trie.remove("https://example.com/", 1)
+        self.assertEqual(self.trie.children, {})
+
+        # unknown urls are ignored
+        self.trie.remove("https://example.org/", 1)
+
+
+class UrlIndexTestCase(TestCase):
+    """tests for :data:`primming.pricewatcher.urlindex.url_index`"""
+
+    def setUp(self):
+        cache.clear()
+        url_index.clear()
+        self.page = Page.objects.create(name="shop", url="https://shop.example.com/")
+
+    def test_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(url_index.resolve("https://shop.example.com/item"), self.page.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(url_index.resolve("https://shop.example.com/item"), self.page.id)
+            self.assertIsNotNone(url_index.get_local())
+
+    def test_update(self):
+        url_index.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.url = "https://other.example.com/"
+            self.page.save()
+        with self.assertNumQueries(0):
+            self.assertIsNone(url_index.resolve("https://shop.example.com/item"))
+            self.assertEqual(url_index.resolve("https://other.example.com/item"), self.page.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.delete()
+        self.assertIsNone(url_index.get_local().resolve("https://other.example.com/item"))
+
+    def test_other_process(self):
+        url_index.get()
+        # a page created by another process, which started a new generation
+        Page.objects.create(name="new", url="https://new.example.com/")
+        cache.set(url_index.generation_key, 1, None)
+        self.assertIsNone(url_index.resolve("https://new.example.com/"))
+
+        # shows up once the generation is checked again
+        url_index._checked = 0
+
+        self.assertIsNotNone(url_index.resolve("https://new.example.com/"))
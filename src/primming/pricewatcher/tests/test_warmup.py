@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.test import TestCase
+
+from primming.pricewatcher import warmup
+from primming.pricewatcher.models import BrowserMake
+from primming.pricewatcher.models import BrowserRedirect
+from primming.pricewatcher.models import Page
+from primming.pricewatcher.models import PageList
+from primming.pricewatcher.pagelists import bundle_cache
+from primming.pricewatcher.pagelists import pagelist_cache
+from primming.pricewatcher.redirects import webstore_redirects
+from primming.pricewatcher.scrapers import scraper_cache
+from primming.pricewatcher.scrapers import scraper_version_cache
+from primming.pricewatcher.urlindex import url_index
+from primming.utils.asgi import Lifespan
+
+
+class WarmUpTestCase(TestCase):
+    """tests for :func:`primming.pricewatcher.warmup.warm_up`"""
+
+    def setUp(self):
+        cache.clear()
+        for cached in (
+            pagelist_cache,
+            bundle_cache,
+            scraper_cache,
+            scraper_version_cache,
+            url_index,
+            webstore_redirects,
+        ):
+            cached.clear()
+
+        self.page = Page.objects.create(name="shop", url="https://shop.example.com/", scraper="1")
+        PageList.objects.create(name="list1", default=True).pages.add(self.page)
+        BrowserRedirect.objects.create(
+            browser_make=BrowserMake.objects.create(name="Chrome"),
+            url="https://chrome.example.com/",
+            default=True,
+        )
+
+    def test_warm_up(self):
+        durations = warmup.warm_up()
+        self.assertEqual([name for name, _ in durations], [name for name, _ in warmup.STEPS])
+
+        self.assertIsNotNone(pagelist_cache.get_local(None))
+        self.assertIsNotNone(pagelist_cache.get_local("list1"))
+        self.assertIsNotNone(bundle_cache.get_local("list1"))
+        self.assertIsNotNone(webstore_redirects.get_local())
+        self.assertEqual(
+            scraper_cache.get_local("https://shop.example.com/").version, self.page.scraper_hash
+        )
+        self.assertIsNotNone(scraper_version_cache.get_local(self.page.scraper_hash))
+
+        # the warmed up caches answer without a query
+        with self.assertNumQueries(0):
+            response = self.client.get("/watcher/api/1.0/urllist/list1")
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(
+                "/watcher/api/1.0/scraper/analyze", {"url": "https://shop.example.com/"}
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_failing_step(self):
+        def fail():
+            raise ValueError("fails")
+
+        steps = warmup.STEPS
+        warmup.STEPS = [("fails", fail), *steps]
+        try:
+            with self.assertLogs(warmup.log, "ERROR"):
+                durations = warmup.warm_up()
+        finally:
+            warmup.STEPS = steps
+        self.assertEqual(len(durations), len(steps))
+
+
+class LifespanTestCase(SimpleTestCase):
+    """tests for :class:`primming.utils.asgi.Lifespan`"""
+
+    def test_lifespan(self):
+        calls = []
+        sent = []
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        def fail():
+            raise ValueError("fails")
+
+        lifespan = Lifespan(None, [fail, lambda: calls.append("hook")])
+        with self.assertLogs("primming.utils.asgi", "ERROR"):
+            async_to_sync(lifespan)({"type": "lifespan"}, receive, send)
+        self.assertEqual(calls, ["hook"])
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+
+    def test_other_scopes(self):
+        scopes = []
+
+        async def application(scope, receive, send):
+            scopes.append(scope["type"])
+
+        async_to_sync(Lifespan(application, [self.fail]))({"type": "http"}, None, None)
+        self.assertEqual(scopes, ["http"])
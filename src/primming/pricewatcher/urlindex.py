@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Resolve the urls the extension sends (of any product of a shop) to the observed pages. The urls of
+the pages are kept in an in-process trie keyed by host and path, a url belongs to the page with
+the longest matching prefix.
+"""
+import threading
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+
+from primming.pricewatcher.models import Page
+
+# ports which are left out of the normalized urls
+DEFAULT_PORTS = (80, 443)
+
+
+def normalize_url(url: str) -> str:
+    """the url without what doesn't tell pages apart: the scheme, a "www." prefix, the default
+    port, a trailing slash, the fragment and the order of the query parameters
+
+    e.g. ``https://www.Shop.example.com:443/item/?b=2&a=1#top`` becomes
+    ``shop.example.com/item?a=1&b=2``
+    """
+    url = url.strip()
+    if "//" not in url:
+        # no scheme, "shop.example.com/item" would be parsed as a path
+        url = "//" + url
+    parts = urlsplit(url)
+
+    host = (parts.hostname or "").rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in DEFAULT_PORTS:
+        host = "%s:%d" % (host, port)
+
+    query = "&".join(sorted(param for param in parts.query.split("&") if param))
+    return "%s%s%s" % (host, parts.path.rstrip("/"), "?" + query if query else "")
+
+
+def url_segments(url: str) -> List[str]:
+    """the keys of the url in the trie: the labels of the host from the top level domain down,
+    the segments of the path and the query
+
+    A page on ``example.com`` therefore matches ``shop.example.com`` as well, a page on
+    ``example.com/shop`` matches ``example.com/shop/item`` but not ``example.com/shopping``.
+    """
+    location, _, query = normalize_url(url).partition("?")
+    host, _, path = location.partition("/")
+    segments = host.split(".")[::-1]
+    segments.extend("/" + segment for segment in path.split("/") if segment)
+    if query:
+        segments.append("?" + query)
+    return segments
+
+
+class UrlTrie:
+    """The ids of the pages by the segments of their urls, see :py:func:`url_segments`"""
+
+    __slots__ = ("children", "pages")
+
+    def __init__(self):
+        self.children: Dict[str, UrlTrie] = {}
+        self.pages: Set[int] = set()
+
+    def add(self, url: str, page_id: int):
+        node = self
+        for segment in url_segments(url):
+            node = node.children.setdefault(segment, UrlTrie())
+        node.pages.add(page_id)
+
+    def remove(self, url: str, page_id: int):
+        """remove the page from the url, and the nodes that are left empty"""
+        segments = url_segments(url)
+        path = [self]
+        for segment in segments:
+            node = path[-1].children.get(segment)
+            if node is None:
+                return
+            path.append(node)
+
+        path[-1].pages.discard(page_id)
+        for depth in range(len(segments), 0, -1):
+            if path[depth].pages or path[depth].children:
+                break
+            del path[depth - 1].children[segments[depth - 1]]
+
+    def resolve(self, url: str) -> Optional[int]:
+        """the page of the longest prefix of the url, the lowest id if several pages share it,
+        None for urls which can't be parsed"""
+        try:
+            segments = url_segments(url)
+        except ValueError:
+            # e.g. "http://[::1", urlsplit rejects unbalanced brackets
+            return None
+
+        best = None
+        node = self
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.pages:
+                best = node.pages
+        return min(best) if best else None
+
+
+class UrlIndex:
+    """The trie of the urls of all pages, loaded from the database on first use.
+
+    Saving or deleting a page updates the trie of the process in place and starts a new
+    generation in the shared cache (see :py:mod:`primming.pricewatcher.signals`). Other processes
+    check the generation every check_interval seconds and load the trie again if it changed.
+    """
+
+    generation_key = "pricewatcher:urlindex:generation"
+
+    def __init__(self, check_interval: float):
+        """
+        :param check_interval: seconds between the checks of the generation
+        """
+        self.check_interval = check_interval
+        self._trie = None
+        self._generation = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load() -> UrlTrie:
+        """the trie of the urls of all pages in the database"""
+        trie = UrlTrie()
+        for page_id, url in Page.objects.values_list("id", "url").iterator():
+            trie.add(url, page_id)
+        return trie
+
+    def get_local(self) -> Optional[UrlTrie]:
+        """the trie if it is loaded and up to date, None otherwise
+
+        Doesn't do any I/O, so it is safe to call from the event loop.
+        """
+        if self._trie is not None and time.monotonic() - self._checked < self.check_interval:
+            return self._trie
+        return None
+
+    def get(self) -> UrlTrie:
+        """the up to date trie, loaded from the database if needed"""
+        trie = self.get_local()
+        if trie is not None:
+            return trie
+
+        generation = cache.get_or_set(self.generation_key, time.time_ns, None)
+        with self._lock:
+            if self._trie is None or self._generation != generation:
+                self._trie = self.load()
+                self._generation = generation
+            self._checked = time.monotonic()
+            return self._trie
+
+    def resolve(self, url: str) -> Optional[int]:
+        """the id of the page the url belongs to, None if there is none"""
+        return self.get().resolve(url)
+
+    def update(self, page_id: int, old_url: Optional[str], new_url: Optional[str]):
+        """move the page from its old url to the new one, either of them can be None for pages
+        which were created or deleted
+
+        The trie of the process is updated right away, it is still loaded again once the new
+        generation is seen, since other processes might have changed pages in the meantime.
+        """
+        cache.set(self.generation_key, time.time_ns(), None)
+        with self._lock:
+            if self._trie is None:
+                return
+            if old_url is not None:
+                self._trie.remove(old_url, page_id)
+            if new_url is not None:
+                self._trie.add(new_url, page_id)
+
+    def clear(self):
+        """drop the trie of the process"""
+        with self._lock:
+            self._trie = None
+            self._generation = None
+
+
+url_index = UrlIndex(settings.URL_INDEX_CHECK_INTERVAL)
@@ -29,9 +29,12 @@ from django.urls import re_path
 from primming.constants import UUID_PATTERN
 from primming.pricewatcher.views import ExportPersonsApiView
 from primming.pricewatcher.views import ExportSamplesApiView
+from primming.pricewatcher.views import ExportSamplesSinceApiView
 from primming.pricewatcher.views import IsRegisteredView
 from primming.pricewatcher.views import PageListView
 from primming.pricewatcher.views import RedirectToWebstore
+from primming.pricewatcher.views import ScraperBundleView
+from primming.pricewatcher.views import ScraperVersionView
 from primming.pricewatcher.views import ScraperView
 from primming.pricewatcher.views import SubmitPriceReport
 
@@ -44,10 +47,22 @@ urlpatterns = [
     re_path(r"api/1.0/prices/(?P<uuid>" + UUID_PATTERN + ")?", SubmitPriceReport.as_view()),
     re_path(r"api/1.0/surveyed/(?P<uuid>" + UUID_PATTERN + ")?", IsRegisteredView.as_view()),
     path(r"api/1.0/scraper/analyze", ScraperView.as_view()),
+    re_path(
+        r"api/1.0/scraper/(?P<scraper_hash>[0-9a-f]{40})$",
+        ScraperVersionView.as_view(),
+        name="scraper-version",
+    ),
+    re_path(
+        r"api/1.0/scrapers/(?P<version>[0-9a-f]{40})/(?P<list_name>\w*)$",
+        ScraperBundleView.as_view(),
+        name="scraper-bundle-version",
+    ),
+    re_path(r"api/1.0/scrapers/(?P<list_name>\w*)$", ScraperBundleView.as_view()),
     re_path(
         r"api/1.0/export/samples/(?P<start>\d{4}-\d{2}-\d{2})/(?P<end>\d{4}-\d{2}-\d{2})/?",
         ExportSamplesApiView.as_view(),
     ),
+    path("api/1.0/export/samples", ExportSamplesSinceApiView.as_view()),
     re_path(
         r"api/1.0/export/persons/(?P<start>\d{4}-\d{2}-\d{2})/(?P<end>\d{4}-\d{2}-\d{2})/?",
         ExportPersonsApiView.as_view(),
@@ -4,6 +4,11 @@
 # Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
 # defined in file 'LICENSE', which is part of this source code package.
 import logging
+import re
+from typing import Iterable
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
 
 from asgiref.sync import sync_to_async
 from basicauth.decorators import basic_auth_required
@@ -12,24 +17,111 @@ from django.http import HttpRequest
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
 from django.http import JsonResponse
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from user_agents import parse as uaparse
 
 from primming.pricewatcher.api import PageListViewApiMixin
 from primming.pricewatcher.api import PersonsExportApiMixin
 from primming.pricewatcher.api import SampleExportApiMixin
+from primming.pricewatcher.api import ScraperBundleApiMixin
 from primming.pricewatcher.api import SubmitPriceReportApiMixin
 from primming.pricewatcher.api import UserRegistrationAPIMixin
-from primming.pricewatcher.models import BrowserRedirect
-from primming.pricewatcher.models import Page
+from primming.pricewatcher.pagelists import EncodedResponse
+from primming.pricewatcher.pagelists import bundle_cache
+from primming.pricewatcher.pagelists import pagelist_cache
+from primming.pricewatcher.redirects import browser_family
+from primming.pricewatcher.redirects import local_browser_family
+from primming.pricewatcher.redirects import webstore_redirects
+from primming.pricewatcher.scrapers import NOT_FOUND
+from primming.pricewatcher.scrapers import scraper_cache
+from primming.pricewatcher.scrapers import scraper_version_cache
+from primming.pricewatcher.snapshots import SnapshotExport
+from primming.pricewatcher.snapshots import sample_snapshots
 from primming.utils.api.django.views import AsyncView
 from primming.utils.api.django.views import SyncView
 from primming.utils.api.exceptions import BadRequestException
 from primming.utils.api.exceptions import NotFoundException
+from primming.utils.asgi import buffered
 
 log = logging.getLogger(__name__)
 
+# the quality of a content coding of the Accept-Encoding header, e.g. "gzip;q=0.5"
+QUALITY = re.compile(r"q=([01](?:\.\d{0,3})?)$")
+# a single range of bytes, other ranges are ignored and the whole body is sent
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def encoding_quality(accept_encoding: str, coding: str) -> float:
+    """the quality of the content coding in the Accept-Encoding header, 0 if it isn't accepted
+
+    Codings which aren't listed get the quality of "*", elements with a malformed quality are
+    ignored.
+    """
+    qualities = {}
+    for element in accept_encoding.lower().split(","):
+        name, _, params = element.partition(";")
+        quality = 1.0
+        if params.strip():
+            match = QUALITY.fullmatch(params.replace(" ", ""))
+            if match is None:
+                continue
+            quality = float(match.group(1))
+        qualities.setdefault(name.strip(), quality)
+    return qualities.get(coding, qualities.get("*", 0.0))
+
+
+def byte_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """the first and last byte of the requested range, None if the whole body is sent
+
+    The range is not satisfiable if the first byte is after the last one.
+    """
+    match = BYTE_RANGE.fullmatch((header or "").strip())
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # the last bytes of the body
+        return max(length - int(last), 0), length - 1
+    if last and int(last) < int(first):
+        return None
+    return int(first), min(int(last), length - 1) if last else length - 1
+
+
+def encoded_response(request: HttpRequest, encoded: EncodedResponse) -> HttpResponse:
+    """the response for a cached response body, compressed if the client accepts it
+
+    Each encoding of the body is a representation of its own with an ETag of its own, e.g.
+    ``"<hash>-gz"``, so a cache never takes a compressed body for the identity one or the other
+    way round. Compare ``If-None-Match`` with the ETag of the response, which
+    :py:func:`django.utils.cache.get_conditional_response` does with the weak comparison.
+    """
+    etag = encoded.etag
+    if encoded.gzipped is None:
+        response = HttpResponse(encoded.body, content_type="application/json")
+    else:
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        gzip_quality = encoding_quality(accept_encoding, "gzip")
+        brotli_quality = encoding_quality(accept_encoding, "br")
+        if encoded.brotli is not None and brotli_quality and brotli_quality >= gzip_quality:
+            response = HttpResponse(encoded.brotli, content_type="application/json")
+            response["Content-Encoding"] = "br"
+            etag = '"%s-br"' % encoded.version
+        elif gzip_quality:
+            response = HttpResponse(encoded.gzipped, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+            etag = '"%s-gz"' % encoded.version
+        else:
+            response = HttpResponse(encoded.body, content_type="application/json")
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+    response["ETag"] = etag
+    return response
+
 
 class PageListView(PageListViewApiMixin, AsyncView):
     """
@@ -38,11 +130,73 @@ class PageListView(PageListViewApiMixin, AsyncView):
 
     async def get(
         self, request: HttpRequest, list_name: str = None, uuid: str = None, **kwargs
-    ) -> JsonResponse:
-        """ """
+    ) -> HttpResponse:
+        """send the list, or a 304 if the extension has the current version of it already
+
+        With the ``since`` parameter only the changes since that revision of the list are sent,
+        see :py:meth:`PageListViewApiMixin.serialize_changes`.
+        """
+        since = request.GET.get("since")
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                raise BadRequestException("Parameter 'since' is not a revision.")
+
+        # hits of the in-process cache are served without leaving the event loop
+        page_list = pagelist_cache.get_local(list_name, since)
+        if page_list is None:
+            page_list = await sync_to_async(pagelist_cache.fetch)(list_name, since)
+
+        response = encoded_response(request, page_list)
+        response["Cache-Control"] = "max-age=%d" % settings.CACHE_CONTROL_PAGELIST_TIMEOUT
+
+        not_modified = get_conditional_response(request, etag=response["ETag"], response=response)
+        if not_modified is not None:
+            log.debug("List of pages not modified (%s:%s)", uuid, list_name)
+            return not_modified
+
         log.debug("Sending list of pages (%s:%s)", uuid, list_name)
-        data = await sync_to_async(self.serialize_list)(name=list_name)
-        return JsonResponse(data)
+        return response
+
+
+class ScraperBundleView(ScraperBundleApiMixin, AsyncView):
+    """
+    Endpoint for the extension to fetch the scrapers of all pages of a list at once
+
+    The bundle is versioned by its content hash. The unversioned url (``scrapers/<list>``, the
+    default list without a name) answers with the current bundle and its versioned url
+    (``scrapers/<version>/<list>``) as Content-Location. The content of a versioned url never
+    changes and can be cached forever, outdated versions are redirected to the current one.
+    """
+
+    async def get(
+        self, request: HttpRequest, list_name: str = None, version: str = None, **kwargs
+    ) -> HttpResponse:
+        """send the bundle, or a 304 if the extension has the current version of it already"""
+        # hits of the in-process cache are served without leaving the event loop
+        bundle = bundle_cache.get_local(list_name or None)
+        if bundle is None:
+            bundle = await sync_to_async(bundle_cache.fetch)(list_name or None)
+
+        location = reverse(
+            "scraper-bundle-version", kwargs={"version": bundle.version, "list_name": list_name}
+        )
+        if version is None:
+            cache_control = "max-age=%d" % settings.CACHE_CONTROL_PAGELIST_TIMEOUT
+        elif version == bundle.version:
+            cache_control = (
+                "public, max-age=%d, immutable" % settings.CACHE_CONTROL_IMMUTABLE_TIMEOUT
+            )
+        else:
+            return HttpResponseRedirect(location)
+
+        response = encoded_response(request, bundle)
+        response["Content-Location"] = location
+        response["Cache-Control"] = cache_control
+
+        not_modified = get_conditional_response(request, etag=response["ETag"], response=response)
+        return response if not_modified is None else not_modified
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -82,27 +236,123 @@ class ExportAPIViewBase(SyncView):
     """ """
 
     filename_base = "export"
+    # the daily snapshots of the export, see primming.pricewatcher.snapshots
+    snapshots = None
 
-    def get(self, request: HttpRequest, start: str, end: str) -> HttpResponse:
-        """Handle GET requests"""
-        samples = self.samples(start, end)
+    def export_response(
+        self, request: HttpRequest, samples: Iterable[Mapping], filename: str
+    ) -> StreamingHttpResponse:
+        """the samples in the format the client accepts, as a download"""
         accept = request.META.get("HTTP_ACCEPT")
         mime_type, data = self.negotiate(samples, accept)
-        response = HttpResponse(data, content_type=mime_type)
-        response.streaming = True
-        response["Content-Disposition"] = "attachment; filename=%s_%s-%s.%s" % (
-            self.filename_base,
-            start,
-            end,
-            mime_type.split("/")[-1],
+        # streamed by primming.utils.asgi.ASGIHandler, without blocking the event loop
+        response = StreamingHttpResponse(
+            buffered(data, settings.EXPORT_STREAM_CHUNK_SIZE), content_type=mime_type
+        )
+        # e.g. "parquet" for "application/vnd.apache.parquet"
+        response["Content-Disposition"] = "attachment; filename=%s.%s" % (
+            filename,
+            mime_type.split("/")[-1].split(".")[-1],
+        )
+        return response
+
+    def snapshot_response(
+        self, request: HttpRequest, export: SnapshotExport, filename: str
+    ) -> HttpResponse:
+        """the export assembled from the snapshots, a part of it if a range is requested"""
+        length = export.length
+        content_range = None
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if length is not None and (if_range is None or if_range == export.etag):
+            content_range = byte_range(request.META.get("HTTP_RANGE"), length)
+
+        if content_range is None:
+            response = StreamingHttpResponse(export.chunks(), content_type=export.content_type)
+        else:
+            first, last = content_range
+            if first > last:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = "bytes */%d" % length
+                return response
+            response = StreamingHttpResponse(
+                export.chunks(first, last), content_type=export.content_type, status=206
+            )
+            response["Content-Range"] = "bytes %d-%d/%d" % (first, last, length)
+            length = last - first + 1
+
+        if length is not None:
+            response["Content-Length"] = length
+            response["Accept-Ranges"] = "bytes"
+            response["ETag"] = export.etag
+        if export.gzipped:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        response["Content-Disposition"] = "attachment; filename=%s.%s" % (
+            filename,
+            export.content_type.split("/")[-1],
         )
         return response
 
+    def get(self, request: HttpRequest, start: str, end: str) -> HttpResponse:
+        """Handle GET requests"""
+        filename = "%s_%s-%s" % (self.filename_base, start, end)
+        if self.snapshots is not None and self.snapshots.root is not None:
+            start_day, end_day = self._validate_date_range(start, end)
+            export = self.snapshots.export(
+                self.content_type(request.META.get("HTTP_ACCEPT")),
+                start_day,
+                end_day,
+                encoding_quality(request.META.get("HTTP_ACCEPT_ENCODING", ""), "gzip") > 0,
+            )
+            if export is not None:
+                return self.snapshot_response(request, export, filename)
+
+        samples = self.samples(start, end)
+        return self.export_response(request, samples, filename)
+
 
 @method_decorator(basic_auth_required, name="dispatch")
 class ExportSamplesApiView(SampleExportApiMixin, ExportAPIViewBase):
 
     filename_base = "samples"
+    snapshots = sample_snapshots
+
+
+@method_decorator(basic_auth_required, name="dispatch")
+class ExportSamplesSinceApiView(SampleExportApiMixin, ExportAPIViewBase):
+    """
+    Incremental export of the samples in the order of their ids, for clients which keep a copy:
+    ``export/samples?since_id=<cursor>&limit=<page size>``
+
+    The cursor for the next page is sent in the ``X-Next-Since-Id`` header, along with a ``Link``
+    to the next page if there might be more samples. A client saves the cursor to fetch only the
+    samples added since then on its next run. The newest samples are held back for
+    settings.SAMPLE_EXPORT_CURSOR_GRACE seconds, see
+    :py:meth:`primming.pricewatcher.api.SampleExportApiMixin.high_water_mark`. Until the
+    committed samples are known, e.g. right after a deployment, the answer is a 503 with a
+    ``Retry-After`` header rather than an empty page.
+    """
+
+    filename_base = "samples"
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Handle GET requests"""
+        since_id = request.GET.get("since_id")
+        limit = request.GET.get("limit")
+        samples, next_since_id, more = self.samples_since(since_id, limit)
+
+        response = self.export_response(
+            request, samples, "%s_since-%s" % (self.filename_base, since_id or 0)
+        )
+        response["X-Next-Since-Id"] = str(next_since_id)
+        if more:
+            query = request.GET.copy()
+            query["since_id"] = next_since_id
+            response["Link"] = '<%s?%s>; rel="next"' % (
+                request.build_absolute_uri(request.path),
+                query.urlencode(),
+            )
+        return response
 
 
 @method_decorator(basic_auth_required, name="dispatch")
@@ -114,29 +364,28 @@ class ExportPersonsApiView(PersonsExportApiMixin, ExportAPIViewBase):
 class RedirectToWebstore(AsyncView):
     """Redirect the user to the extension store based on their browser make."""
 
-    def redirect_for_browser(self, user_agent: str):
-        """ """
-        ua = uaparse(user_agent)
-        browser_make = ua.browser.family
-
-        # get redirect for the browser make
-        redirect = BrowserRedirect.objects.filter(
-            browser_make__name=browser_make,
-            type=BrowserRedirect.RedirectPurpose.ADDON_WEBSTORE,
-        ).first()
-
-        # get the default fallback
-        if not redirect:
-            redirect = BrowserRedirect.objects.get(
-                type=BrowserRedirect.RedirectPurpose.ADDON_WEBSTORE, default=True
-            )
+    @staticmethod
+    def redirect_for_browser(family: str) -> str:
+        """the webstore url for the browser family
 
-        return redirect.url
+        :raises NotFoundException: if there is neither a redirect for the browser nor a default
+        """
+        url = webstore_redirects.get().url_for_family(family)
+        if url is None:
+            raise NotFoundException("No webstore for '%s'" % family)
+        return url
 
     async def get(self, request: HttpRequest):
 
-        url = await sync_to_async(self.redirect_for_browser)(request.META["HTTP_USER_AGENT"])
-        return HttpResponseRedirect(url)
+        user_agent = request.META.get("HTTP_USER_AGENT", "")
+        # the user agents of uncommon browsers are parsed off the event loop, once per process
+        family = local_browser_family(user_agent)
+        if family is None:
+            family = await sync_to_async(browser_family)(user_agent)
+        # the table is only loaded once per process and after changes
+        if webstore_redirects.get_local() is None:
+            await sync_to_async(webstore_redirects.get)()
+        return HttpResponseRedirect(self.redirect_for_browser(family))
 
 
 class ScraperView(AsyncView):
@@ -144,25 +393,57 @@ class ScraperView(AsyncView):
     without the ciuvo API at the cost of maintaining the scrapers here.
     """
 
-    def response_for_url(self, url: str) -> HttpResponse:
-        """
-        Produce the scraper response for the given URL
-
-        TODO: caching
-        """
-        page = Page.objects.filter(url=url.strip()).first()
-        if not page:
+    @staticmethod
+    def response_for_body(
+        request: HttpRequest, url: str, encoded: EncodedResponse
+    ) -> HttpResponse:
+        """the scraper response for the cached body of the url"""
+        if encoded == NOT_FOUND:
             log.info("Could not find page with url: %s", url)
             raise NotFoundException("No scraper found for '%s'" % url)
 
-        response = JsonResponse({"csl": page.scraper})
+        response = encoded_response(request, encoded)
         response["Cache-Control"] = "max-age=%d" % settings.CACHE_CONTROL_SCRAPER_TIMEOUT
         return response
 
+    def response_for_url(self, request: HttpRequest, url: str) -> HttpResponse:
+        """
+        Produce the scraper response for the given URL
+        """
+        return self.response_for_body(request, url, scraper_cache.get(url))
+
     async def get(self, request: HttpRequest) -> HttpResponse:
 
         url = request.GET.get("url")
         if not url:
             raise BadRequestException("Parameter 'url' is missing.")
 
-        return await sync_to_async(self.response_for_url)(url)
+        # hits of the in-process cache are served without leaving the event loop
+        encoded = scraper_cache.get_local(url)
+        if encoded is None:
+            encoded = await sync_to_async(scraper_cache.fetch)(url)
+        return self.response_for_body(request, url, encoded)
+
+
+class ScraperVersionView(AsyncView):
+    """
+    Endpoint for a scraper by its content hash, the page lists reference the scrapers of their
+    pages by these urls. The content of an url never changes and can be cached forever.
+    """
+
+    async def get(self, request: HttpRequest, scraper_hash: str) -> HttpResponse:
+        """send the scraper, or a 304 if the extension has it already"""
+        # hits of the in-process cache are served without leaving the event loop
+        encoded = scraper_version_cache.get_local(scraper_hash)
+        if encoded is None:
+            encoded = await sync_to_async(scraper_version_cache.fetch)(scraper_hash)
+        if encoded == NOT_FOUND:
+            raise NotFoundException("No scraper with hash '%s'" % scraper_hash)
+
+        response = encoded_response(request, encoded)
+        response["Cache-Control"] = (
+            "public, max-age=%d, immutable" % settings.CACHE_CONTROL_IMMUTABLE_TIMEOUT
+        )
+
+        not_modified = get_conditional_response(request, etag=response["ETag"], response=response)
+        return response if not_modified is None else not_modified
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2019 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Warm up a fresh worker before it accepts requests, see :py:class:`primming.utils.asgi.Lifespan`.
+Otherwise the first requests after a deploy or a restart of a worker load the url resolver, the
+geoip database and the hot datasets of the extension endpoints into the worker.
+"""
+import logging
+import time
+from typing import Callable
+from typing import List
+from typing import Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from geoip2.errors import AddressNotFoundError
+
+from primming.pricewatcher.models import GeoIPLocation
+from primming.pricewatcher.models import PageList
+from primming.pricewatcher.pagelists import bundle_cache
+from primming.pricewatcher.pagelists import pagelist_cache
+from primming.pricewatcher.redirects import webstore_redirects
+from primming.pricewatcher.scrapers import scraper_cache
+from primming.pricewatcher.scrapers import scraper_version_cache
+from primming.pricewatcher.urlindex import url_index
+from primming.utils.api.exceptions import NotFoundException
+
+log = logging.getLogger(__name__)
+
+
+def warm_url_resolver():
+    """import the url patterns with their views and compile the patterns for reverse()"""
+    get_resolver().reverse_dict
+
+
+def warm_geoip():
+    """page the search tree of the geoip database in"""
+    try:
+        GeoIPLocation.lookup(settings.WARM_UP_IP_ADDRESS)
+    except AddressNotFoundError:
+        pass
+
+
+def warm_page_lists():
+    """the default list and all named lists with their scraper bundles"""
+    for name in [None, *PageList.objects.values_list("name", flat=True)]:
+        try:
+            pagelist_cache.get(name)
+            bundle_cache.get(name)
+        except NotFoundException:
+            # there is no default list
+            pass
+
+
+def warm_scrapers():
+    """the url index and the scrapers of the enabled pages"""
+    url_index.get()
+    scraper_cache.prime()
+    scraper_version_cache.prime()
+
+
+def warm_webstore_redirects():
+    webstore_redirects.get()
+
+
+# the steps by name, in order
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("url resolver", warm_url_resolver),
+    ("geoip", warm_geoip),
+    ("page lists", warm_page_lists),
+    ("scrapers", warm_scrapers),
+    ("webstore redirects", warm_webstore_redirects),
+]
+
+
+def warm_up() -> List[Tuple[str, float]]:
+    """run all steps, a failing step is logged and skipped
+
+    :returns: the names of the steps which succeeded with their durations in seconds
+    """
+    durations = []
+    started = time.perf_counter()
+    try:
+        for name, step in STEPS:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                log.exception("Warm-up step %s failed", name)
+                continue
+            duration = time.perf_counter() - step_started
+            log.info("Warm-up step %s took %.1fms", name, duration * 1000)
+            durations.append((name, duration))
+    finally:
+        # the connections of the warm-up thread aren't closed at the end of a request
+        connections.close_all()
+
+    log.info("Warm-up took %.1fms", (time.perf_counter() - started) * 1000)
+    return durations
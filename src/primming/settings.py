@@ -129,6 +129,90 @@ SESSION_CACHE_ALIAS = "default"
 
 CACHE_CONTROL_SCRAPER_TIMEOUT = 24 * 60 * 60  # 1 day
 
+CACHE_CONTROL_PAGELIST_TIMEOUT = 15 * 60  # 15 minutes, the list is revalidated with its ETag
+CACHE_CONTROL_IMMUTABLE_TIMEOUT = 365 * 24 * 60 * 60  # 1 year for content addressed urls
+
+# name -> page list response cache of the page list endpoint, invalidated when a list changes
+PAGELIST_CACHE_SIZE = 256  # entries of the in-process LRU, one per list and requested revision
+PAGELIST_CACHE_LOCAL_TIMEOUT = 60  # other processes see changes of a list after this many seconds
+PAGELIST_CACHE_TIMEOUT = 24 * 60 * 60  # 1 day in the shared cache
+
+# directory the page lists and scraper bundles are published to for the nginx proxy, see
+# primming.pricewatcher.publisher, publishing is disabled if it is not set
+STATIC_PUBLISH_ROOT = os.environ.get("PRIMMING_PUBLISH_ROOT")
+STATIC_PUBLISH_DELAY = 10  # seconds to wait for further changes before publishing
+
+# changes of the page lists are kept this long for the delta sync of the page list endpoint
+PAGELIST_CHANGES_MAX_AGE = 30 * 24 * 60 * 60  # 30 days
+
+# url -> page trie, used by the scraper endpoint and the price report ingestion
+URL_INDEX_CHECK_INTERVAL = (
+    60  # other processes see changes of the page urls after this many seconds
+)
+
+# page -> scraper response cache of the scraper endpoint, invalidated when a page changes
+SCRAPER_CACHE_SIZE = 4096  # entries of the in-process LRU
+SCRAPER_CACHE_LOCAL_TIMEOUT = 60  # other processes see changes of a page after this many seconds
+SCRAPER_CACHE_TIMEOUT = 60 * 60  # 1 hour in the shared cache
+
+# scraper hash -> scraper response cache of the content addressed scraper endpoint
+SCRAPER_VERSION_CACHE_SIZE = 4096  # entries of the in-process LRU
+SCRAPER_VERSION_CACHE_TIMEOUT = 24 * 60 * 60  # 1 day in the shared cache
+SCRAPER_VERSION_CACHE_NEGATIVE_TIMEOUT = 60  # hashes without a page
+
+# browser make -> webstore url table of the webstore redirect
+WEBSTORE_REDIRECT_CHECK_INTERVAL = 60  # other processes see changes after this many seconds
+BROWSER_FAMILY_CACHE_SIZE = 4096  # user agent -> browser family entries of the in-process LRU
+
+# load the hot datasets into a worker before it accepts requests, see primming.pricewatcher.warmup
+WARM_UP_ON_STARTUP = True
+WARM_UP_IP_ADDRESS = "8.8.8.8"  # looked up to page the geoip database in
+
+# user agent string -> UserAgent id cache used by the price report ingestion
+USER_AGENT_CACHE_SIZE = 4096  # entries of the in-process LRU
+USER_AGENT_CACHE_TIMEOUT = 7 * 24 * 60 * 60  # 1 week in the shared cache
+
+# GeoIP network -> GeoIPLocation id cache, expire daily to pick up updates of the geoip database
+GEOIP_LOCATION_CACHE_SIZE = 16384  # entries of the in-process LRU
+GEOIP_LOCATION_CACHE_TIMEOUT = 24 * 60 * 60  # 1 day
+
+# How the submitted price reports are handed over for storage:
+# - "celery": one celery task per report
+# - "stream": append to a redis stream, stored in batches by the consume_price_reports command
+# - "raw": store the reports unprocessed, EnrichRawReportsTask turns them into samples periodically
+PRICE_REPORT_INGEST_MODE = "celery"
+PRICE_REPORT_STREAM = "pricewatcher:reports"
+PRICE_REPORT_STREAM_GROUP = "pricewatcher"
+PRICE_REPORT_STREAM_BATCH_SIZE = 500  # reports stored together
+PRICE_REPORT_STREAM_BLOCK = 2000  # ms to wait for new reports
+PRICE_REPORT_STREAM_RECLAIM_IDLE = 5 * 60 * 1000  # ms until reports of dead consumers are claimed
+# deliveries after which a report is moved to the dead letter stream <PRICE_REPORT_STREAM>:dead
+PRICE_REPORT_STREAM_MAX_DELIVERIES = 10
+RAW_REPORT_BATCH_SIZE = 1000  # raw reports enriched together
+RAW_REPORT_MAX_BATCHES = 50  # batches per run of the enrichment task
+
+# the sample export reads this many rows per query
+SAMPLE_EXPORT_CHUNK_SIZE = 5000
+# samples per page of the incremental sample export (export/samples?since_id=)
+SAMPLE_EXPORT_PAGE_SIZE = 10000
+SAMPLE_EXPORT_MAX_PAGE_SIZE = 100000
+# seconds until the transactions storing samples have committed, the incremental export only
+# moves the cursor past ids seen at least this long ago
+SAMPLE_EXPORT_CURSOR_GRACE = 60
+# the exports are sent in chunks of this many bytes
+EXPORT_STREAM_CHUNK_SIZE = 64 * 1024
+# rows per row group of the parquet exports, which are held in memory while they are written
+EXPORT_PARQUET_ROW_GROUP_SIZE = 100000
+EXPORT_PARQUET_COMPRESSION = "zstd"
+
+# directory of the daily snapshots of the sample export, see primming.pricewatcher.snapshots, the
+# exports are always queried if it is not set
+EXPORT_SNAPSHOT_ROOT = os.environ.get("PRIMMING_EXPORT_SNAPSHOT_ROOT")
+EXPORT_SNAPSHOT_DAYS = 7  # past days the snapshot task writes missing snapshots for
+# seconds after the end of a day until its snapshots are written, reports received before
+# midnight may still be queued as celery tasks or in the stream
+EXPORT_SNAPSHOT_DELAY = 6 * 60 * 60
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -5,6 +5,7 @@
 # defined in file 'LICENSE', which is part of this source code package.
 import asyncio
 
+from django.http import HttpResponse
 from django.http import HttpResponseBadRequest
 from django.http import HttpResponseNotFound
 from django.utils.decorators import classonlymethod
@@ -12,24 +13,52 @@ from django.views.generic import View
 
 from primming.utils.api.exceptions import BadRequestException
 from primming.utils.api.exceptions import NotFoundException
+from primming.utils.api.exceptions import ServiceUnavailableException
+
+
+def service_unavailable(e: ServiceUnavailableException) -> HttpResponse:
+    """a 503 response telling the client when to try again"""
+    response = HttpResponse(str(e), status=503)
+    response["Retry-After"] = str(e.retry_after)
+    return response
 
 
 class SyncView(View):
     """A view that allows to raise exceptions for 40x responses"""
 
     def dispatch(self, request, *args, **kwargs):
-        """allow to return 4xx responses via exceptions"""
+        """allow to return 4xx and 503 responses via exceptions"""
         try:
             return super().dispatch(request, *args, **kwargs)
         except BadRequestException as e:
             return HttpResponseBadRequest(str(e))
         except NotFoundException as e:
             return HttpResponseNotFound(str(e))
+        except ServiceUnavailableException as e:
+            return service_unavailable(e)
 
 
 class AsyncView(SyncView):
     """view with async support"""
 
+    def dispatch(self, request, *args, **kwargs):
+        """allow to return 4xx and 503 responses via exceptions from async handlers as well"""
+        response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            return self._await_response(response)
+        return response
+
+    @staticmethod
+    async def _await_response(coroutine):
+        try:
+            return await coroutine
+        except BadRequestException as e:
+            return HttpResponseBadRequest(str(e))
+        except NotFoundException as e:
+            return HttpResponseNotFound(str(e))
+        except ServiceUnavailableException as e:
+            return service_unavailable(e)
+
     @classonlymethod
     def as_view(cls, **kwargs):
         """
@@ -13,3 +13,14 @@ class NotFoundException(Exception):
     """Because django has an exception for 404 but not for others"""
 
     pass
+
+
+class ServiceUnavailableException(Exception):
+    """The answer isn't known yet, the client should ask again in a while"""
+
+    def __init__(self, message: str, retry_after: int):
+        """
+        :param retry_after: seconds after which the client may try again
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2021 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+ASGI helpers for running django under hypercorn.
+"""
+import asyncio
+import logging
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import Sequence
+from typing import Union
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+
+log = logging.getLogger(__name__)
+
+
+def buffered(parts: Iterable[Union[str, bytes]], size: int) -> Iterator[bytes]:
+    """join the parts into encoded chunks of at least size bytes, the last one is smaller
+
+    Sending every line of an export on its own costs far more than the line itself.
+    """
+    buffer = []
+    length = 0
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+class StreamingSend:
+    """The send callable of a connection which can wait for the client to disconnect"""
+
+    def __init__(self, send: Callable, receive: Callable):
+        self.send = send
+        self.receive = receive
+
+    async def __call__(self, message):
+        await self.send(message)
+
+    async def disconnected(self):
+        """wait until the client disconnected, the request body has been read already"""
+        while (await self.receive())["type"] != "http.disconnect":
+            pass
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """The django ASGI handler, sending streaming responses without blocking the event loop.
+
+    Django 3.2 iterates the content of a streaming response in the event loop, where the
+    database can't be used. This handler advances the iterator in the thread of the sync views
+    instead, one part at a time, and sends each part before it asks for the next one. The server
+    only takes the next part once the previous one was written to the client (backpressure), so
+    a slow client doesn't pile the response up in memory. The iteration stops once the client
+    disconnected.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await super().__call__(scope, receive, StreamingSend(send, receive))
+
+    @staticmethod
+    def response_headers(response):
+        """the headers and cookies of the response, as django sends them"""
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            headers.append((b"Set-Cookie", c.output(header="").encode("ascii").strip()))
+        return headers
+
+    async def send_response(self, response, send: StreamingSend):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": self.response_headers(response),
+            }
+        )
+        disconnected = asyncio.ensure_future(send.disconnected())
+        try:
+            parts = iter(response)
+            while not disconnected.done():
+                part = await sync_to_async(next, thread_sensitive=True)(parts, None)
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body"})
+        finally:
+            disconnected.cancel()
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application() -> ASGIHandler:
+    """the ASGI application of django, with the :py:class:`ASGIHandler`"""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
+
+
+class Lifespan:
+    """Answers the ASGI lifespan protocol, which django 3.2 doesn't support, for the wrapped
+    application and runs the startup hooks on startup.
+
+    The server only accepts connections once the startup is complete, so the hooks can warm up
+    the worker. They are synchronous and run one after the other in the thread of the sync
+    views, a failing hook is logged and doesn't keep the worker from starting.
+    """
+
+    def __init__(self, application: Callable, on_startup: Sequence[Callable[[], None]] = ()):
+        """
+        :param application: the ASGI application handling all other connections
+        :param on_startup: the hooks to run on startup
+        """
+        self.application = application
+        self.on_startup = on_startup
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await self.application(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                for hook in self.on_startup:
+                    try:
+                        await sync_to_async(hook)()
+                    except Exception:
+                        log.exception("Startup hook %s failed", hook.__qualname__)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -4,5 +4,84 @@
 # Copyright 2021 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
 # defined in file 'LICENSE', which is part of this source code package.
 """
-
+In-process caching helpers, used in front of the shared django cache for hot lookups.
 """
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Hashable
+from typing import Mapping
+from typing import Optional
+
+
+class LRUCache:
+    """A thread-safe, size bounded least-recently-used cache.
+
+    If a timeout (in seconds) is given, entries older than that are treated as missing.
+    ``None`` cannot be stored since :py:meth:`get` uses it to signal a miss.
+    """
+
+    def __init__(self, maxsize: int = 1024, timeout: Optional[float] = None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Hashable) -> Optional[Any]:
+        """get the value for the key, dropping it if it is expired. Requires the lock."""
+        try:
+            value, expires = self._data[key]
+        except KeyError:
+            return None
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """get the value for the key and mark it as recently used, None if it is not cached"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """get the value for the key without updating the usage order or the counters"""
+        with self._lock:
+            return self._lookup(key)
+
+    def set(self, key: Hashable, value: Any):
+        """store the value, evicting the least recently used entry if the cache is full"""
+        expires = time.monotonic() + self.timeout if self.timeout is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """remove the key from the cache if it is present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """remove all entries and reset the counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Mapping[str, int]:
+        """the hit/miss counters and the current size of the cache"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+    def __len__(self):
+        return len(self._data)
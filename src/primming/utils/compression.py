@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# vim: set formatoptions+=l tw=99:
+#
+# Copyright 2021 Ciuvo GmbH. All rights reserved. This file is subject to the terms and conditions
+# defined in file 'LICENSE', which is part of this source code package.
+"""
+Compress response bodies ahead of time, so they can be sent as they are. Brotli is optional, the
+bodies are only gzipped if the brotli package isn't installed.
+
+Bodies joined from pieces compressed ahead of time are built with :py:class:`GzipJoin`.
+"""
+import functools
+import gzip
+import struct
+import zlib
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def gzip_compress(body: bytes) -> bytes:
+    """the gzipped body, the same for the same body (without a timestamp)"""
+    return gzip.compress(body, mtime=0)
+
+
+def brotli_compress(body: bytes) -> Optional[bytes]:
+    """the brotli compressed body, None if brotli isn't installed"""
+    if brotli is None:
+        return None
+    return brotli.compress(body, mode=brotli.MODE_TEXT)
+
+
+def compress(body: bytes) -> Tuple[bytes, Optional[bytes]]:
+    """the gzip and brotli compressed body, see :py:func:`brotli_compress`"""
+    return gzip_compress(body), brotli_compress(body)
+
+
+# a gzip member is the header, one deflate stream and the trailer, without a name or a timestamp
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+# the final (empty) block of a deflate stream
+DEFLATE_FINAL_BLOCK = b"\x03\x00"
+
+
+def _gf2_matrix_times(matrix: List[int], vector: int) -> int:
+    result = 0
+    for row in matrix:
+        if not vector:
+            break
+        if vector & 1:
+            result ^= row
+        vector >>= 1
+    return result
+
+
+def _gf2_matrix_square(matrix: List[int]) -> List[int]:
+    return [_gf2_matrix_times(matrix, row) for row in matrix]
+
+
+@functools.lru_cache(maxsize=None)
+def _zeros_operator(power: int) -> Tuple[int, ...]:
+    """the operator which appends 2 ** power zero bytes to a crc32"""
+    if power:
+        return tuple(_gf2_matrix_square(list(_zeros_operator(power - 1))))
+    # the operator for one zero bit, squared three times
+    operator = [0xEDB88320] + [1 << n for n in range(31)]
+    for _ in range(3):
+        operator = _gf2_matrix_square(operator)
+    return tuple(operator)
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    """the crc32 of two pieces of data from their checksums, see zlib's crc32_combine"""
+    # append length2 zero bytes to crc1
+    power = 0
+    while length2 > 0:
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(_zeros_operator(power), crc1)
+        length2 >>= 1
+        power += 1
+    return crc1 ^ crc2
+
+
+class DeflateFragment:
+    """Compresses data into a piece of a deflate stream, which can be joined with other fragments
+    into a single gzip member by :py:class:`GzipJoin`. The fragment ends on a byte boundary, but
+    isn't the end of the stream.
+    """
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        self.crc = 0
+        self.length = 0
+
+    def compress(self, data: bytes) -> bytes:
+        self.crc = zlib.crc32(data, self.crc)
+        self.length += len(data)
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def deflate_fragment(data: bytes) -> bytes:
+    """the data as a single :py:class:`DeflateFragment`"""
+    fragment = DeflateFragment()
+    return fragment.compress(data) + fragment.flush()
+
+
+class GzipJoin:
+    """Joins deflate fragments into a single gzip member: the :py:data:`GZIP_HEADER`, the
+    fragments, which are added along with the checksum and length of their data, and the
+    :py:meth:`trailer`.
+
+    Unlike several concatenated gzip members, the result is decompressed entirely by all clients.
+    """
+
+    def __init__(self):
+        self.crc = 0
+        self.length = 0
+
+    def add(self, crc: int, length: int):
+        """add the checksum and length of the data of the next fragment"""
+        self.crc = crc32_combine(self.crc, crc, length)
+        self.length += length
+
+    def add_data(self, data: bytes) -> bytes:
+        """the fragment of the data, which is added"""
+        self.add(zlib.crc32(data), len(data))
+        return deflate_fragment(data)
+
+    def trailer(self) -> bytes:
+        """the end of the deflate stream and the gzip trailer"""
+        return DEFLATE_FINAL_BLOCK + struct.pack("<II", self.crc, self.length & 0xFFFFFFFF)